@@ -5,11 +5,13 @@ from django.db import models
 from django.core.exceptions import ValidationError
 from django.conf import settings
 from io import BytesIO
-from PIL import Image
 import base64
 import os
+from functools import lru_cache
 from django.contrib.auth.models import BaseUserManager
 
+from marketplace.imaging import ImageRejected, inspect_image, open_image
+
 
 class UserManager(BaseUserManager):
     def create_user(self, email, full_name, password=None, **extra_fields):
@@ -77,29 +79,37 @@ class User(AbstractUser):
 
     def save(self, *args, **kwargs):
         """Override save method to store the avatar as binary data with validations."""
-        if self.avatar:
+        # Only a new upload is validated and converted; stored bytes are kept as they are
+        if self.avatar and hasattr(self.avatar, 'read'):
             self.validate_image(self.avatar)
             self.avatar = self.convert_image_to_binary(self.avatar)
         super().save(*args, **kwargs)
 
     def convert_image_to_binary(self, image_field):
         """Converts the uploaded image to binary format (WEBP)."""
-        image = Image.open(image_field).convert("RGBA")
-        img_byte_arr = BytesIO()
-        image.save(img_byte_arr, format='WEBP')
-        img_byte_arr.seek(0)
-        return img_byte_arr.read()
-
-    def validate_image(self, image_field):
-        """Validates if the uploaded file is an image and meets the size and dimension requirements."""
         try:
-            image = Image.open(image_field)
-            image.verify()
-        except (IOError, ValueError):
+            with open_image(image_field, settings.IMAGE_MAX_PIXELS) as image:
+                image = image.convert("RGBA")
+                img_byte_arr = BytesIO()
+                image.save(img_byte_arr, format='WEBP')
+        except (ImageRejected, OSError, ValueError):
             raise ValidationError("The uploaded file is not a valid image.")
+        return img_byte_arr.getvalue()
+
+    def validate_image(self, image_field):
+        """Validates the uploaded image from its size and header, without decoding it."""
+        image_field.seek(0, os.SEEK_END)
+        image_size = image_field.tell()
+        image_field.seek(0)
+        max_size = 5 * 1024 * 1024  # 5 MB
+
+        if image_size > max_size:
+            raise ValidationError("The image cannot be larger than 5 MB.")
 
-        image = Image.open(image_field)
-        width, height = image.size
+        try:
+            _, width, height = inspect_image(image_field, settings.IMAGE_MAX_PIXELS)
+        except ImageRejected as e:
+            raise ValidationError(str(e))
         min_width, min_height = 100, 100
         max_width, max_height = 1000, 1000
 
@@ -108,22 +118,21 @@ class User(AbstractUser):
         if width > max_width or height > max_height:
             raise ValidationError(f"The image cannot exceed {max_width}x{max_height} pixels.")
 
-        image_field.seek(0, os.SEEK_END)
-        image_size = image_field.tell()
-        max_size = 5 * 1024 * 1024  # 5 MB
-
-        if image_size > max_size:
-            raise ValidationError("The image cannot be larger than 5 MB.")
-
     def get_avatar_url(self):
         """Returns the avatar as a base64-encoded webp data URI. Falls back to default avatar."""
         if self.avatar:
             return f"data:image/webp;base64,{base64.b64encode(self.avatar).decode('utf-8')}"
 
-        default_path = os.path.join(settings.BASE_DIR, 'accounts', 'defaults', 'default_avatar.webp')
-        if os.path.exists(default_path):
-            with open(default_path, 'rb') as f:
-                default_avatar = f.read()
-                return f"data:image/webp;base64,{base64.b64encode(default_avatar).decode('utf-8')}"
-        return None
+        return default_avatar_url()
+
+
+@lru_cache(maxsize=1)
+def default_avatar_url():
+    """Default avatar as a base64 data URI, read from disk only once per process."""
+    default_path = os.path.join(settings.BASE_DIR, 'accounts', 'defaults', 'default_avatar.webp')
+    if os.path.exists(default_path):
+        with open(default_path, 'rb') as f:
+            default_avatar = f.read()
+            return f"data:image/webp;base64,{base64.b64encode(default_avatar).decode('utf-8')}"
+    return None
 
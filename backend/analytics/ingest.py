@@ -0,0 +1,247 @@
+# analytics/ingest.py
+
+import csv
+import io
+import json
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import DataError, IntegrityError, close_old_connections, connection, transaction
+from rest_framework.exceptions import ValidationError
+
+from .models import AnalyticsEvent
+
+logger = logging.getLogger(__name__)
+
+
+EVENT_TYPES = frozenset(choice for choice, _ in AnalyticsEvent.TYPE_CHOICES)
+MAX_SESSION_LENGTH = 64
+# product_id é bigint
+MAX_PRODUCT_ID = 2 ** 63 - 1
+MAX_PROPERTIES_BYTES = 2048
+# Relógios de clientes não são fiáveis: fora desta janela o evento é rejeitado
+MAX_EVENT_AGE = timedelta(days=7)
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+# Erros de dados (o lote nunca vai ser aceite) face a erros de ligação
+REJECTED_ERRORS = (DataError, IntegrityError, ValueError)
+
+# Ordem das colunas nas linhas do buffer e no COPY
+COLUMNS = ('type', 'product_id', 'user_id', 'session', 'occurred_at', 'received_at', 'properties')
+
+
+def _invalid(line, detail):
+    raise ValidationError({'line': line, 'detail': detail})
+
+
+def _storable(value):
+    # O PostgreSQL recusa NUL em text/jsonb e surrogates soltos (UTF-8 inválido)
+    if isinstance(value, str):
+        try:
+            value.encode('utf-8')
+        except UnicodeEncodeError:
+            return False
+        return '\x00' not in value
+    if isinstance(value, dict):
+        return all(_storable(key) and _storable(item) for key, item in value.items())
+    if isinstance(value, list):
+        return all(_storable(item) for item in value)
+    return True
+
+
+def parse_events(body, user_id=None, received_at=None, limit=None):
+    """
+    Valida um corpo NDJSON ({"type", "product", "session", "ts", "props"} por
+    linha, "ts" em milissegundos epoch) e devolve as linhas prontas para o
+    buffer. Um evento inválido rejeita o lote inteiro, com o número da linha.
+    """
+    limit = limit or settings.ANALYTICS_MAX_EVENTS_PER_REQUEST
+    received_at = received_at or datetime.now(dt_timezone.utc)
+    oldest, newest = received_at - MAX_EVENT_AGE, received_at + MAX_CLOCK_SKEW
+    rows = []
+    for number, line in enumerate(body.splitlines(), 1):
+        if not line.strip():
+            continue
+        if len(rows) >= limit:
+            raise ValidationError({'detail': f"At most {limit} events per request."})
+        try:
+            event = json.loads(line)
+        except ValueError:
+            _invalid(number, "Invalid JSON.")
+        if not isinstance(event, dict) or event.get('type') not in EVENT_TYPES:
+            _invalid(number, f"'type' must be one of: {', '.join(sorted(EVENT_TYPES))}.")
+
+        product = event.get('product')
+        if product is not None and (type(product) is not int or not 0 < product <= MAX_PRODUCT_ID):
+            _invalid(number, "'product' must be a product id.")
+        session = event.get('session', '')
+        if not isinstance(session, str) or len(session) > MAX_SESSION_LENGTH or not _storable(session):
+            _invalid(number, f"'session' must be a string of at most {MAX_SESSION_LENGTH} characters.")
+
+        timestamp = event.get('ts')
+        if timestamp is None:
+            occurred_at = received_at
+        else:
+            if type(timestamp) not in (int, float):
+                _invalid(number, "'ts' must be a timestamp in milliseconds.")
+            try:
+                occurred_at = datetime.fromtimestamp(timestamp / 1000, dt_timezone.utc)
+            except (OverflowError, OSError, ValueError):
+                occurred_at = None
+            if occurred_at is None or not oldest <= occurred_at <= newest:
+                _invalid(number, "'ts' is out of range.")
+
+        properties = event.get('props') or {}
+        if not isinstance(properties, dict) or not _storable(properties):
+            _invalid(number, "'props' must be an object.")
+        try:
+            # NaN/Infinity não são JSON válido para o jsonb
+            properties = json.dumps(properties, separators=(',', ':'), allow_nan=False)
+        except ValueError:
+            _invalid(number, "'props' must be valid JSON.")
+        if len(properties) > MAX_PROPERTIES_BYTES:
+            _invalid(number, f"'props' must be at most {MAX_PROPERTIES_BYTES} bytes.")
+
+        rows.append((event['type'], product, user_id, session, occurred_at, received_at, properties))
+    return rows
+
+
+def write_events(rows):
+    """
+    Grava as linhas com COPY (um round-trip por lote); noutras bases de
+    dados usa bulk_create.
+    """
+    if not rows:
+        return 0
+    if connection.vendor != 'postgresql':
+        AnalyticsEvent.objects.bulk_create([
+            AnalyticsEvent(**dict(zip(COLUMNS, row), properties=json.loads(row[-1]))) for row in rows
+        ])
+        return len(rows)
+
+    stream = io.StringIO()
+    csv.writer(stream, quoting=csv.QUOTE_NONNUMERIC).writerows(rows)
+    stream.seek(0)
+    # O copy_expert não passa pela conversão de erros do Django (DataError, ...)
+    with transaction.atomic(), connection.cursor() as cursor, connection.wrap_database_errors:
+        # O csv escreve None como "": FORCE_NULL devolve-os a NULL nas FKs
+        cursor.copy_expert(
+            f"COPY {AnalyticsEvent._meta.db_table} ({', '.join(COLUMNS)}) "
+            "FROM STDIN WITH (FORMAT csv, FORCE_NULL (product_id, user_id))",
+            stream,
+        )
+    return len(rows)
+
+
+class EventBuffer:
+    """
+    Buffer limitado em memória entre os pedidos e o writer. Quando está
+    cheio, `offer` recusa o lote inteiro e o pedido responde 429, em vez de
+    a memória crescer sem limite ou de se perderem eventos já aceites.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.events = deque()
+        self.writer = None
+        self.accepted = 0
+        self.rejected = 0
+        self.written = 0
+        self.dropped = 0
+
+    def offer(self, rows):
+        with self.condition:
+            if len(self.events) + len(rows) > settings.ANALYTICS_BUFFER_SIZE:
+                self.rejected += len(rows)
+                return False
+            self.events.extend(rows)
+            self.accepted += len(rows)
+            self.condition.notify()
+        if settings.BACKGROUND_TASKS_ASYNC:
+            self.start_writer()
+        else:
+            self.drain()
+        return True
+
+    def take(self, limit):
+        with self.condition:
+            count = min(limit, len(self.events))
+            return [self.events.popleft() for _ in range(count)]
+
+    def requeue(self, rows):
+        # Um lote que falhou volta para a frente do buffer
+        with self.condition:
+            self.events.extendleft(reversed(rows))
+
+    def drain(self):
+        total = 0
+        while True:
+            rows = self.take(settings.ANALYTICS_WRITE_BATCH)
+            if not rows:
+                return total
+            try:
+                written = write_events(rows)
+            except REJECTED_ERRORS as e:
+                logger.warning(f"Analytics batch rejected ({e}); writing its {len(rows)} events one by one.")
+                written = self.write_each(rows)
+            except Exception:
+                # Erro de ligação: o lote volta ao buffer e é repetido
+                self.requeue(rows)
+                raise
+            total += written
+            with self.condition:
+                self.written += written
+
+    def write_each(self, rows):
+        """
+        Grava linha a linha um lote que a base de dados recusou e descarta
+        só as linhas recusadas: devolvê-las ao buffer repeti-las-ia para
+        sempre e bloquearia a ingestão.
+        """
+        written = 0
+        for index, row in enumerate(rows):
+            try:
+                written += write_events([row])
+            except REJECTED_ERRORS as e:
+                logger.error(f"Dropping analytics event {row!r}: {e}")
+                with self.condition:
+                    self.dropped += 1
+            except Exception:
+                self.requeue(rows[index:])
+                raise
+        return written
+
+    def start_writer(self):
+        with self.condition:
+            if self.writer is None or not self.writer.is_alive():
+                self.writer = threading.Thread(target=self.run, name='analytics-writer', daemon=True)
+                self.writer.start()
+
+    def run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.events)
+            close_old_connections()
+            try:
+                self.drain()
+            except Exception as e:
+                logger.error(f"Error writing analytics events: {e}", exc_info=True)
+                time.sleep(1)
+
+    def stats(self):
+        with self.condition:
+            return {
+                'buffered': len(self.events),
+                'capacity': settings.ANALYTICS_BUFFER_SIZE,
+                'accepted': self.accepted,
+                'rejected': self.rejected,
+                'written': self.written,
+                'dropped': self.dropped,
+            }
+
+
+event_buffer = EventBuffer()
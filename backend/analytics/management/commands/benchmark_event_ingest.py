@@ -0,0 +1,71 @@
+# analytics/management/commands/benchmark_event_ingest.py
+
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory, override_settings
+
+from analytics.ingest import event_buffer, parse_events, write_events
+from analytics.views import EventIngestView
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede o débito da ingestão de eventos num só processo: validação do NDJSON, "
+        "escrita com COPY e o endpoint completo. Tudo corre numa transação revertida no fim."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=100000, help="Total de eventos gerados.")
+        parser.add_argument('--per-request', type=int, default=500, help="Eventos por pedido NDJSON.")
+        parser.add_argument('--write-batch', type=int, default=5000, help="Eventos por COPY.")
+
+    def generate(self, count):
+        now = int(time.time() * 1000)
+        types = ['impression'] * 8 + ['click'] * 3 + ['checkout_start']
+        return [
+            json.dumps({
+                'type': random.choice(types),
+                'product': random.randint(1, 5000),
+                'session': f'session-{random.randint(1, 2000)}',
+                'ts': now - random.randint(0, 60000),
+                'props': {'position': random.randint(1, 24), 'list': 'catalog'},
+            })
+            for _ in range(count)
+        ]
+
+    def report(self, label, events, elapsed):
+        self.stdout.write(f"{label:<28} {events:>9} events  {elapsed:8.3f}s  {events / elapsed:>12,.0f} events/s")
+
+    def handle(self, *args, **options):
+        total, per_request, write_batch = options['events'], options['per_request'], options['write_batch']
+        lines = self.generate(total)
+        bodies = ['\n'.join(lines[i:i + per_request]) for i in range(0, total, per_request)]
+
+        started = time.perf_counter()
+        rows = [row for body in bodies for row in parse_events(body, limit=per_request)]
+        self.report("parse + validate", total, time.perf_counter() - started)
+
+        view = EventIngestView.as_view()
+        factory = RequestFactory()
+        with transaction.atomic():
+            started = time.perf_counter()
+            for i in range(0, total, write_batch):
+                write_events(rows[i:i + write_batch])
+            self.report(f"COPY ({write_batch}/batch)", total, time.perf_counter() - started)
+
+            # Endpoint completo (DRF + validação + buffer), com o writer no próprio processo
+            with override_settings(BACKGROUND_TASKS_ASYNC=False, ANALYTICS_MAX_EVENTS_PER_REQUEST=per_request):
+                started = time.perf_counter()
+                for body in bodies:
+                    request = factory.post('/api/analytics/events/', body, content_type='application/x-ndjson')
+                    response = view(request)
+                    if response.status_code != 202:
+                        raise RuntimeError(f"Unexpected response {response.status_code}: {response.data}")
+                self.report(f"endpoint ({per_request}/request)", total, time.perf_counter() - started)
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS(f"Done; buffer stats: {event_buffer.stats()}"))
@@ -0,0 +1,41 @@
+# analytics/models.py
+
+from django.conf import settings
+from django.contrib.postgres.indexes import BrinIndex
+from django.db import models
+
+from marketplace.models import Product
+
+
+class AnalyticsEvent(models.Model):
+    """
+    Evento enviado pelo frontend (impressões, cliques, início de checkout).
+    Escrito em lote pelo writer de analytics.ingest; as FKs não têm
+    constraint para que a ingestão não dependa de produtos/utilizadores
+    ainda existirem.
+    """
+    IMPRESSION = 'impression'
+    CLICK = 'click'
+    CHECKOUT_START = 'checkout_start'
+    TYPE_CHOICES = [
+        (IMPRESSION, 'Impression'),
+        (CLICK, 'Click'),
+        (CHECKOUT_START, 'Checkout start'),
+    ]
+
+    type = models.CharField(max_length=20, choices=TYPE_CHOICES)
+    product = models.ForeignKey(Product, on_delete=models.DO_NOTHING, null=True, db_constraint=False, related_name='+')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, null=True, db_constraint=False, related_name='+')
+    session = models.CharField(max_length=64, blank=True)
+    occurred_at = models.DateTimeField()
+    received_at = models.DateTimeField()
+    properties = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        indexes = [
+            # Tabela só de inserções por ordem de chegada: BRIN é minúsculo e quase não pesa na escrita
+            BrinIndex(fields=['received_at'], name='analytics_event_received_brin'),
+        ]
+
+    def __str__(self):
+        return f"{self.type} #{self.pk} at {self.occurred_at}"
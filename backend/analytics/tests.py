@@ -0,0 +1,83 @@
+# analytics/tests.py
+
+import json
+import time
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from .ingest import event_buffer, parse_events
+from .models import AnalyticsEvent
+
+
+def ndjson(*events):
+    return '\n'.join(json.dumps(event) for event in events)
+
+
+@override_settings(BACKGROUND_TASKS_ASYNC=False)
+class EventIngestTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('analytics-events')
+
+    def post(self, body):
+        return self.client.post(self.url, body, content_type='application/x-ndjson')
+
+    def test_batch_is_validated_and_copied(self):
+        user = User.objects.create_user(email='buyer@example.com', full_name='Buyer')
+        self.client.force_authenticate(user)
+        now = int(time.time() * 1000)
+        body = ndjson(
+            {'type': 'impression', 'product': 7, 'session': 's1', 'ts': now, 'props': {'list': 'a,"b"'}},
+            {'type': 'checkout_start', 'session': ''},
+        ) + '\n\n'
+
+        response = self.post(body)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['accepted'], 2)
+
+        impression, checkout = AnalyticsEvent.objects.order_by('id')
+        self.assertEqual((impression.product_id, impression.user_id, impression.session), (7, user.pk, 's1'))
+        self.assertEqual(impression.properties, {'list': 'a,"b"'})
+        self.assertAlmostEqual(impression.occurred_at.timestamp() * 1000, now, delta=1)
+        self.assertEqual((checkout.product_id, checkout.session, checkout.properties), (None, '', {}))
+
+    def test_invalid_line_rejects_whole_batch(self):
+        response = self.post(ndjson({'type': 'click'}, {'type': 'purchase'}))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['line'], '2')
+        response = self.post(ndjson({'type': 'click', 'ts': 0}))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(AnalyticsEvent.objects.exists())
+
+    def test_values_postgres_cannot_store_are_rejected(self):
+        for event in (
+            {'type': 'click', 'product': 10 ** 30},
+            {'type': 'click', 'session': 'a\x00b'},
+            {'type': 'click', 'props': {'k': '\x00'}},
+            {'type': 'click', 'props': {'k': '\ud800'}},
+        ):
+            self.assertEqual(self.post(ndjson(event)).status_code, 400, event)
+        self.assertEqual(self.post('{"type": "click", "props": {"k": NaN}}').status_code, 400)
+        self.assertEqual(self.post(ndjson({'type': 'click'})).status_code, 202)
+
+    def test_rejected_batch_drops_only_bad_rows(self):
+        good = parse_events(ndjson({'type': 'click', 'product': 1}, {'type': 'click', 'product': 2}))
+        bad = ('click', 10 ** 30, None, '', good[0][4], good[0][5], '{}')
+        dropped = event_buffer.stats()['dropped']
+        with self.assertLogs('analytics.ingest', 'ERROR'):
+            self.assertTrue(event_buffer.offer([good[0], bad, good[1]]))
+        self.assertEqual(sorted(AnalyticsEvent.objects.values_list('product_id', flat=True)), [1, 2])
+        self.assertEqual(event_buffer.stats()['buffered'], 0)
+        self.assertEqual(event_buffer.stats()['dropped'], dropped + 1)
+
+    @override_settings(ANALYTICS_BUFFER_SIZE=2)
+    def test_full_buffer_applies_backpressure(self):
+        rejected = event_buffer.stats()['rejected']
+        response = self.post(ndjson(*[{'type': 'click'}] * 3))
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(event_buffer.stats()['rejected'], rejected + 3)
+        self.assertEqual(self.post(ndjson({'type': 'click'})).status_code, 202)
@@ -0,0 +1,8 @@
+# analytics/urls.py
+
+from django.urls import path
+from .views import EventIngestView
+
+urlpatterns = [
+    path('events/', EventIngestView.as_view(), name='analytics-events'),
+]
@@ -0,0 +1,30 @@
+# analytics/views.py
+
+from rest_framework import status
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .ingest import event_buffer, parse_events
+
+
+class EventIngestView(APIView):
+    """
+    Recebe eventos do frontend em NDJSON (um evento JSON por linha). Os
+    eventos são validados e entregues ao buffer; a escrita na base de dados
+    acontece no writer em segundo plano.
+    """
+    permission_classes = [AllowAny]
+    # O corpo é lido diretamente de request.body, sem parsers do DRF
+    parser_classes = []
+
+    def post(self, request):
+        user_id = request.user.pk if request.user.is_authenticated else None
+        rows = parse_events(request.body.decode('utf-8', errors='replace'), user_id=user_id)
+        if not event_buffer.offer(rows):
+            return Response(
+                {'detail': "Event buffer is full, retry later."},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={'Retry-After': '1'},
+            )
+        return Response({'accepted': len(rows)}, status=status.HTTP_202_ACCEPTED)
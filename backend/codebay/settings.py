@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     'rest_framework_simplejwt',  # JWT Authentication
     "allauth",
@@ -55,6 +56,7 @@ INSTALLED_APPS = [
     'payments',
     'storage',
     'chat',
+    'analytics',
     'corsheaders',
     
 ]
@@ -75,6 +77,53 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Paginação do catálogo (marketplace.pagination)
+CATALOG_PAGE_SIZE = int(os.getenv("CATALOG_PAGE_SIZE", 24))
+CATALOG_MAX_PAGE_SIZE = int(os.getenv("CATALOG_MAX_PAGE_SIZE", 100))
+
+
+# Cache (marketplace.cache). A geração do catálogo vive no PostgreSQL, por
+# isso um bump invalida as respostas de todos os workers mesmo com o
+# local-memory (cada processo aquece o seu). Um backend partilhado evita
+# repetir o trabalho por worker, ex: CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# e CACHE_LOCATION=redis://redis:6379/0.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", "codebay"),
+    }
+}
+CATALOG_CACHE_TIMEOUT = int(os.getenv("CATALOG_CACHE_TIMEOUT", 300))
+
+# Tendências: peso de cada evento, meia-vida da pontuação e buffer de visualizações
+# (as visualizações são gravadas em lote, nunca uma escrita por pedido)
+TRENDING_SALE_WEIGHT = float(os.getenv("TRENDING_SALE_WEIGHT", 10))
+TRENDING_VIEW_WEIGHT = float(os.getenv("TRENDING_VIEW_WEIGHT", 0.1))
+TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", 72))
+TRENDING_VIEW_FLUSH_SIZE = int(os.getenv("TRENDING_VIEW_FLUSH_SIZE", 200))
+TRENDING_VIEW_FLUSH_SECONDS = int(os.getenv("TRENDING_VIEW_FLUSH_SECONDS", 30))
+
+# Recomendações: número de vizinhos guardados por produto
+RECOMMENDATIONS_TOP_K = int(os.getenv("RECOMMENDATIONS_TOP_K", 12))
+
+# Tarefas em segundo plano (índice de semelhantes, notificações). Com False
+# correm logo a seguir ao commit, no próprio pedido (útil em testes).
+BACKGROUND_TASKS_ASYNC = os.getenv("BACKGROUND_TASKS_ASYNC", "True") == "True"
+
+# Notificações aos utilizadores com o produto na wishlist (marketplace.notifications)
+NOTIFICATIONS_BATCH_SIZE = int(os.getenv("NOTIFICATIONS_BATCH_SIZE", 1000))
+NOTIFICATIONS_RETENTION_DAYS = int(os.getenv("NOTIFICATIONS_RETENTION_DAYS", 90))
+# Stream SSE: 'postgres' (LISTEN/NOTIFY, todos os workers) ou 'local' (um só processo)
+NOTIFICATIONS_STREAM_BACKEND = os.getenv("NOTIFICATIONS_STREAM_BACKEND", "postgres")
+NOTIFICATIONS_STREAM_HEARTBEAT = int(os.getenv("NOTIFICATIONS_STREAM_HEARTBEAT", 15))
+NOTIFICATIONS_STREAM_TIMEOUT = int(os.getenv("NOTIFICATIONS_STREAM_TIMEOUT", 300))
+
+# Ingestão de eventos do frontend (analytics.ingest): capacidade do buffer por
+# processo (acima dela o endpoint responde 429), eventos por COPY e por pedido
+ANALYTICS_BUFFER_SIZE = int(os.getenv("ANALYTICS_BUFFER_SIZE", 50000))
+ANALYTICS_WRITE_BATCH = int(os.getenv("ANALYTICS_WRITE_BATCH", 5000))
+ANALYTICS_MAX_EVENTS_PER_REQUEST = int(os.getenv("ANALYTICS_MAX_EVENTS_PER_REQUEST", 1000))
+
 from datetime import timedelta
 
 SIMPLE_JWT = {
@@ -262,6 +311,44 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Produtos semelhantes (marketplace.similarity): ficheiro de vizinhos lido por mmap
+SIMILAR_PRODUCTS_INDEX = os.getenv("SIMILAR_PRODUCTS_INDEX", str(BASE_DIR / 'var' / 'similar_products.idx'))
+SIMILAR_PRODUCTS_TOP_K = int(os.getenv("SIMILAR_PRODUCTS_TOP_K", 12))
+SIMILAR_PRODUCTS_BUDGET_MS = float(os.getenv("SIMILAR_PRODUCTS_BUDGET_MS", 25))
+# Alterações de produtos agrupadas durante este intervalo (segundos) num só
+# recálculo incremental; 0 deixa-as para build_similar_products --changed.
+# Os recálculos de todos os workers e do comando são serializados por um
+# flock em <SIMILAR_PRODUCTS_INDEX>.lock
+SIMILAR_PRODUCTS_REFRESH_DELAY = float(os.getenv("SIMILAR_PRODUCTS_REFRESH_DELAY", 60))
+
+# Limite de píxeis de qualquer imagem recebida (uploads de produtos e avatares):
+# acima dele é rejeitada pelo cabeçalho, antes de ser descodificada
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", 64_000_000))
+
+# Processamento de imagens (marketplace.media_pipeline): tentativas por imagem e
+# tempo após o qual uma reserva de um worker que morreu volta à fila
+MEDIA_PROCESSING_MAX_ATTEMPTS = int(os.getenv("MEDIA_PROCESSING_MAX_ATTEMPTS", 3))
+MEDIA_PROCESSING_LEASE_SECONDS = int(os.getenv("MEDIA_PROCESSING_LEASE_SECONDS", 300))
+# Processos do pool de Pillow (1 = no próprio worker) e imagens do mesmo
+# produto processadas em simultâneo, para um upload grande não atrasar os outros
+MEDIA_PROCESSING_WORKERS = int(os.getenv("MEDIA_PROCESSING_WORKERS", min(4, os.cpu_count() or 1)))
+MEDIA_PROCESSING_PER_PRODUCT = int(os.getenv("MEDIA_PROCESSING_PER_PRODUCT", 2))
+# Variantes responsivas de cada imagem (srcset): larguras e formatos, do
+# preferido para o fallback (avif, webp, jpeg)
+MEDIA_IMAGE_VARIANT_WIDTHS = [int(width) for width in os.getenv("MEDIA_IMAGE_VARIANT_WIDTHS", "320,640,1200").split(",")]
+MEDIA_IMAGE_VARIANT_FORMATS = os.getenv("MEDIA_IMAGE_VARIANT_FORMATS", "webp,jpeg").split(",")
+
+# Redimensionamento a pedido (/media/resize/<id>/<w>x<h>.<fmt>): só estes
+# tamanhos/extensões, numa cache em disco limitada (LRU). Com um prefixo em
+# MEDIA_RESIZE_ACCEL_REDIRECT o nginx serve o ficheiro (location internal).
+# avif só funciona com um Pillow com encoder AVIF; sem ele esses pedidos dão 404
+MEDIA_RESIZE_SIZES = os.getenv("MEDIA_RESIZE_SIZES", "160x160,320x180,320x320,640x360,640x640,1200x675").split(",")
+MEDIA_RESIZE_FORMATS = os.getenv("MEDIA_RESIZE_FORMATS", "webp,jpg").split(",")
+MEDIA_RESIZE_CACHE_DIR = os.getenv("MEDIA_RESIZE_CACHE_DIR", str(BASE_DIR / 'var' / 'resize-cache'))
+MEDIA_RESIZE_CACHE_MAX_BYTES = int(os.getenv("MEDIA_RESIZE_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+MEDIA_RESIZE_MAX_AGE = int(os.getenv("MEDIA_RESIZE_MAX_AGE", 365 * 24 * 3600))
+MEDIA_RESIZE_ACCEL_REDIRECT = os.getenv("MEDIA_RESIZE_ACCEL_REDIRECT", "")
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
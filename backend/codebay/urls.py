@@ -20,6 +20,8 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf.urls.static import static
 
+from marketplace.views import MediaResizeView
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("accounts/", include("allauth.urls")),
@@ -28,6 +30,9 @@ urlpatterns = [
     path("api/payments/", include("payments.urls")),
     path('api/storage/', include('storage.urls')),
     path('api/chat/', include('chat.urls')),
+    path('api/analytics/', include('analytics.urls')),
+    # Antes do static() de MEDIA_URL, que apanharia /media/resize/ em DEBUG
+    path('media/resize/<int:pk>/<int:width>x<int:height>.<str:extension>', MediaResizeView.as_view(), name='media-resize'),
 ]
 
 # Configuração de arquivos estáticos em DEBUG 
@@ -14,6 +14,7 @@ from .models import (
     Media,
     Wishlist
 )
+from .media_pipeline import schedule_media_processing
 from storage.models import ProjectFile
 
 
@@ -62,8 +63,8 @@ class RatingAdmin(admin.ModelAdmin):
 
 @admin.register(Media)
 class MediaAdmin(admin.ModelAdmin):
-    list_display = ('product_info', 'media_preview', 'type', 'is_primary', 'created_at')
-    list_filter = ('type', 'is_primary', 'product__seller')
+    list_display = ('product_info', 'media_preview', 'type', 'is_primary', 'status', 'created_at')
+    list_filter = ('type', 'is_primary', 'status', 'product__seller')
     search_fields = ('product__title',)
     list_editable = ('is_primary',)
     readonly_fields = ('media_preview',)
@@ -111,6 +112,11 @@ class MediaAdmin(admin.ModelAdmin):
         self.message_user(request, f"{queryset.count()} media items set as primary.")
     make_primary.short_description = "Mark selected as primary"
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if obj.status == Media.PROCESSING:
+            schedule_media_processing()
+
 
 
 @admin.register(Wishlist)
@@ -0,0 +1,100 @@
+# marketplace/cache.py
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import BigIntegerField
+from django.db.models.expressions import RawSQL
+from rest_framework.response import Response
+
+
+# Geração do catálogo: sequência no PostgreSQL, partilhada por todos os
+# workers. As respostas podem ficar num cache local a cada processo (ex:
+# LocMemCache), porque a chave inclui a geração: depois de um bump nenhum
+# worker volta a ler as entradas antigas, que expiram sozinhas.
+VERSION_SEQUENCE = 'marketplace_catalog_version'
+HITS_KEY = 'catalog:hits'
+MISSES_KEY = 'catalog:misses'
+
+
+def _incr(key):
+    # incr falha se a chave não existir; add é atómico e não sobrescreve
+    cache.add(key, 0, timeout=None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+        return 1
+
+
+def catalog_version_expression():
+    # Para ler a geração na mesma query que outros valores (ver catalog_etag)
+    return RawSQL(f'(SELECT last_value FROM {VERSION_SEQUENCE})', [], output_field=BigIntegerField())
+
+
+def get_catalog_version(request=None, version=None):
+    """
+    Geração atual, lida uma só vez por pedido: a ETag e a chave do cache
+    usam a mesma. `version` guarda no pedido um valor já lido.
+    """
+    request = getattr(request, '_request', request)
+    version = version or getattr(request, '_catalog_version', None)
+    if version is None:
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT last_value FROM {VERSION_SEQUENCE}')
+            version = cursor.fetchone()[0]
+    if request is not None:
+        request._catalog_version = version
+    return version
+
+
+def _next_catalog_version():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT nextval(%s)', [VERSION_SEQUENCE])
+
+
+def bump_catalog_version():
+    """
+    Invalida todas as respostas em cache do catálogo, em todos os workers. A
+    geração só muda depois do commit (o nextval não é transacional), para que
+    nenhum pedido volte a guardar dados antigos na nova geração.
+    """
+    transaction.on_commit(_next_catalog_version)
+
+
+def catalog_cache_stats():
+    return {
+        'version': get_catalog_version(),
+        'hits': cache.get(HITS_KEY, 0),
+        'misses': cache.get(MISSES_KEY, 0),
+    }
+
+
+def catalog_cache_key(request):
+    query = sorted(request.query_params.lists())
+    raw = f"{request.get_host()}{request.path}?{query}"
+    digest = hashlib.sha1(raw.encode()).hexdigest()
+    return f"catalog:v{get_catalog_version(request)}:{digest}"
+
+
+class CatalogCacheMixin:
+    """
+    Guarda em cache a resposta de GET de endpoints públicos do catálogo, com a
+    chave versionada pela geração atual do catálogo.
+    """
+
+    def get(self, request, *args, **kwargs):
+        key = catalog_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            _incr(HITS_KEY)
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        _incr(MISSES_KEY)
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.CATALOG_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
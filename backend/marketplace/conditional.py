@@ -0,0 +1,63 @@
+# marketplace/conditional.py
+
+import hashlib
+from calendar import timegm
+
+from django.db.models import Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .cache import catalog_version_expression, get_catalog_version
+from .models import Product
+
+
+def product_validators(queryset, pk, request=None):
+    """
+    ETag e Last-Modified de um produto a partir apenas do seu updated_at.
+    Devolve (None, None) se o produto não existir no queryset. Com `request`,
+    a geração do catálogo (chave do cache) é lida na mesma query.
+    """
+    row = queryset.filter(pk=pk).values_list('updated_at', catalog_version_expression()).first()
+    if row is None:
+        return None, None
+    updated_at, version = row
+    if request is not None:
+        get_catalog_version(request, version)
+    return quote_etag(f"{pk}-{updated_at.timestamp()}"), updated_at
+
+
+def catalog_etag(request):
+    """
+    ETag de uma listagem: muda sempre que algum produto é alterado
+    (MAX(updated_at), indexado) ou removido (geração do catálogo).
+    """
+    # A geração vem na mesma query
+    values = Product.objects.aggregate(last=Max('updated_at'), version=Max(catalog_version_expression()))
+    last_update = values['last']
+    raw = ':'.join([
+        str(get_catalog_version(request, values['version'])),
+        last_update.isoformat() if last_update else '',
+        str(request.user.pk or ''),
+        request.get_host() + request.get_full_path(),
+    ])
+    return quote_etag(hashlib.sha1(raw.encode()).hexdigest())
+
+
+def conditional_response(request, respond, etag=None, last_modified=None):
+    """
+    Responde 304 Not Modified sem chamar `respond` quando os validadores do
+    cliente coincidem; caso contrário devolve a resposta com ETag/Last-Modified.
+    """
+    timestamp = timegm(last_modified.utctimetuple()) if last_modified else None
+    if etag or timestamp:
+        not_modified = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if not_modified is not None:
+            return not_modified
+
+    response = respond()
+    if response.status_code == 200:
+        if etag:
+            response['ETag'] = etag
+        if timestamp:
+            response['Last-Modified'] = http_date(timestamp)
+    return response
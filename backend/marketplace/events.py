@@ -0,0 +1,128 @@
+# marketplace/events.py
+
+import asyncio
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+
+import psycopg2
+from django.conf import settings
+from django.db import connection, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+
+CHANNEL = 'codebay_notifications'
+
+
+class NotificationBroker:
+    """
+    Pub/sub em memória: cada ligação SSE espera num asyncio.Event do seu
+    utilizador, por isso uma ligação inativa não custa queries nem CPU.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = defaultdict(set)
+        self.listener = None
+
+    def subscribe(self, user_id):
+        subscription = Subscription(self, user_id)
+        with self.lock:
+            self.subscribers[user_id].add(subscription)
+        if settings.NOTIFICATIONS_STREAM_BACKEND == 'postgres':
+            self.start_listener()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscribers = self.subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.subscribers[subscription.user_id]
+
+    def publish(self, user_id):
+        # Pode ser chamado de qualquer thread (listener do PostgreSQL, pedidos WSGI)
+        with self.lock:
+            subscribers = list(self.subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            subscription.wake()
+
+    def start_listener(self):
+        with self.lock:
+            if self.listener is None or not self.listener.is_alive():
+                self.listener = threading.Thread(target=self.listen, name='notifications-listener', daemon=True)
+                self.listener.start()
+
+    def listen(self):
+        """
+        Uma ligação LISTEN por processo, partilhada por todas as ligações SSE.
+        """
+        params = connections['default'].get_connection_params()
+        while True:
+            try:
+                listener = psycopg2.connect(**params)
+                listener.autocommit = True
+                listener.cursor().execute(f'LISTEN {CHANNEL}')
+                while True:
+                    if select.select([listener], [], [], 60) == ([], [], []):
+                        continue
+                    listener.poll()
+                    while listener.notifies:
+                        payload = listener.notifies.pop(0).payload
+                        self.publish(int(payload))
+            except Exception as e:
+                logger.error(f"Notifications listener error: {e}", exc_info=True)
+                time.sleep(5)
+
+
+class Subscription:
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+
+    def wake(self):
+        self.loop.call_soon_threadsafe(self.event.set)
+
+    async def wait(self, timeout):
+        """
+        Espera por uma notificação nova; devolve False se o tempo esgotar.
+        """
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self.event.clear()
+        return True
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+broker = NotificationBroker()
+
+
+def announce_notifications(user_ids):
+    """
+    Acorda, depois do commit, os streams dos utilizadores com notificações
+    novas: NOTIFY no PostgreSQL (chega a todos os workers) ou, com o backend
+    'local', diretamente no broker deste processo.
+    """
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return
+
+    def send():
+        if settings.NOTIFICATIONS_STREAM_BACKEND == 'postgres':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_notify(%s, user_id::text) FROM unnest(%s::bigint[]) AS user_id', [CHANNEL, user_ids])
+        else:
+            for user_id in user_ids:
+                broker.publish(user_id)
+
+    transaction.on_commit(send)
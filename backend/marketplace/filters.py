@@ -0,0 +1,140 @@
+# marketplace/filters.py
+
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import serializers
+from .models import Product
+
+
+# (valor, label, mínimo inclusivo, máximo exclusivo)
+PRICE_BANDS = [
+    ('under_10', 'Under €10', None, Decimal('10')),
+    ('10_50', '€10 - €50', Decimal('10'), Decimal('50')),
+    ('50_100', '€50 - €100', Decimal('50'), Decimal('100')),
+    ('100_plus', '€100+', Decimal('100'), None),
+]
+
+
+def _price_band_q(low, high):
+    q = Q()
+    if low is not None:
+        q &= Q(price__gte=low)
+    if high is not None:
+        q &= Q(price__lt=high)
+    return q
+
+
+def facet_options():
+    """
+    Opções de cada faceta do catálogo como (valor, label, condição).
+    """
+    return {
+        'category': [(value, label, Q(category=value)) for value, label in Product.CATEGORY_CHOICES],
+        'language': [(value, label, Q(language=value)) for value, label in Product.LANGUAGE_CHOICES],
+        'price': [(value, label, _price_band_q(low, high)) for value, label, low, high in PRICE_BANDS],
+    }
+
+
+def catalog_conditions(params):
+    """
+    Converte os query params (category, language, price) numa condição por
+    faceta. Vários valores do mesmo param são combinados com OR.
+    """
+    conditions = {}
+    errors = {}
+
+    for facet, options in facet_options().items():
+        values = params.getlist(facet)
+        if not values:
+            continue
+        by_value = {value: q for value, label, q in options}
+        invalid = [value for value in values if value not in by_value]
+        if invalid:
+            errors[facet] = f"Invalid choice(s): {', '.join(invalid)}"
+            continue
+        condition = Q()
+        for value in values:
+            condition |= by_value[value]
+        conditions[facet] = condition
+
+    if errors:
+        raise serializers.ValidationError(errors)
+    return conditions
+
+
+def filter_catalog(queryset, params):
+    """
+    Aplica os filtros públicos do catálogo a partir dos query params,
+    validando-os contra as choices do Product e as faixas de preço.
+    """
+    for condition in catalog_conditions(params).values():
+        queryset = queryset.filter(condition)
+    return queryset
+
+
+def catalog_facets(queryset, params):
+    """
+    Calcula as contagens de todas as facetas numa única query agregada.
+    A contagem de cada opção aplica os filtros das outras facetas, mas não o
+    da própria, para que o utilizador veja as alternativas disponíveis.
+    """
+    conditions = catalog_conditions(params)
+    options = facet_options()
+
+    aggregates = {}
+    for facet, choices in options.items():
+        others = Q()
+        for other, condition in conditions.items():
+            if other != facet:
+                others &= condition
+        for index, (value, label, q) in enumerate(choices):
+            aggregates[f'{facet}_{index}'] = Count('pk', filter=q & others)
+
+    counts = queryset.aggregate(**aggregates)
+
+    return {
+        facet: [
+            {'value': value, 'label': label, 'count': counts[f'{facet}_{index}']}
+            for index, (value, label, q) in enumerate(choices)
+        ]
+        for facet, choices in options.items()
+    }
+
+
+def date_range(params):
+    """
+    Lê ?since= e ?until= (YYYY-MM-DD, inclusivos) como limites [início, fim)
+    em datetimes do fuso horário atual.
+    """
+    bounds = {}
+    errors = {}
+    for name in ('since', 'until'):
+        value = params.get(name)
+        if not value:
+            continue
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            errors[name] = "Invalid date. Use YYYY-MM-DD."
+            continue
+        if name == 'until':
+            day += timedelta(days=1)
+        bounds[name] = timezone.make_aware(datetime.combine(day, time.min))
+    if errors:
+        raise serializers.ValidationError(errors)
+    return bounds.get('since'), bounds.get('until')
+
+
+def filter_date_range(queryset, params, field='created_at'):
+    since, until = date_range(params)
+    if since:
+        queryset = queryset.filter(**{f'{field}__gte': since})
+    if until:
+        queryset = queryset.filter(**{f'{field}__lt': until})
+    return queryset
@@ -0,0 +1,178 @@
+# marketplace/imaging.py
+#
+# Ingestão e processamento de imagens com Pillow, sem Django: usado pelo
+# worker de imagens (incluindo os processos do pool de
+# marketplace.media_pipeline), pelo redimensionamento a pedido e pelos
+# avatares dos utilizadores.
+
+from io import BytesIO
+from math import ceil
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+MAX_SIZE = 1200
+THUMBNAIL_SIZE = 300
+
+# Limite por omissão contra bombas de descompressão; os chamadores passam
+# settings.IMAGE_MAX_PIXELS (este módulo não lê settings)
+MAX_PIXELS = 64_000_000
+SUPPORTED_FORMATS = frozenset({'JPEG', 'PNG', 'WEBP'})
+
+# Formato da variante -> (formato do Pillow, extensão, opções do encoder)
+VARIANT_FORMATS = {
+    'avif': ('AVIF', 'avif', {'quality': 55}),
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# Extensão usada nos URLs -> formato da variante
+EXTENSIONS = {extension: name for name, (_, extension, _) in VARIANT_FORMATS.items()}
+EXTENSIONS['jpeg'] = 'jpeg'
+
+
+def can_encode(name):
+    """
+    Se o Pillow instalado tem encoder para o formato `name` de
+    VARIANT_FORMATS (ex: AVIF só existe com o plugin/libavif).
+    """
+    Image.init()
+    return VARIANT_FORMATS[name][0] in Image.SAVE
+
+
+class ImageRejected(ValueError):
+    """
+    Ficheiro que não é uma imagem suportada ou que excede os limites.
+    """
+
+
+def open_image(source, max_pixels=MAX_PIXELS, formats=SUPPORTED_FORMATS):
+    """
+    Abre a imagem lendo só o cabeçalho (o Pillow descodifica os píxeis no
+    primeiro acesso) e rejeita formatos não suportados e imagens com mais
+    de `max_pixels`, antes de qualquer descodificação.
+    """
+    try:
+        img = Image.open(source)
+    except (Image.DecompressionBombError, UnidentifiedImageError, OSError, ValueError, SyntaxError) as e:
+        raise ImageRejected("The uploaded file is not a valid image.") from e
+    if formats and img.format not in formats:
+        error = f"Unsupported image format: {img.format}."
+    elif img.width * img.height > max_pixels:
+        error = f"The image cannot exceed {max_pixels // 1_000_000} megapixels."
+    else:
+        return img
+    # Ao contrário de close(), só fecha o ficheiro se foi o Pillow a abri-lo
+    with img:
+        raise ImageRejected(error)
+
+
+def inspect_image(source, max_pixels=MAX_PIXELS, formats=SUPPORTED_FORMATS):
+    """
+    Valida um upload pelo cabeçalho e devolve (formato, largura, altura).
+    O ficheiro volta ao início para poder ser guardado a seguir.
+    """
+    try:
+        with open_image(source, max_pixels, formats) as img:
+            return img.format, img.width, img.height
+    finally:
+        if hasattr(source, 'seek'):
+            source.seek(0)
+
+
+def draft(img, size):
+    """
+    Em JPEG, pede ao decoder que descodifique já reduzido (1/2, 1/4 ou 1/8,
+    nunca abaixo de `size`): um JPEG de 50 MP reduzido para 1200px ocupa
+    uma fração da memória da descodificação completa. Noutros formatos não
+    faz nada.
+    """
+    if img.format == 'JPEG':
+        img.draft('RGB', size)
+    return img
+
+
+def shrink(img, size):
+    """
+    Reduz por um fator inteiro (Image.reduce, média de blocos) enquanto a
+    imagem tiver pelo menos o dobro de `size`, antes de converter para RGB:
+    nos formatos sem draft (PNG, WebP) evita uma segunda cópia à resolução
+    original. Nunca fica abaixo de `size`.
+    """
+    factor = min(img.width // size[0], img.height // size[1])
+    if factor < 2:
+        return img
+    if img.mode == 'RGBA':
+        # Banda a banda: em RGBA o reduce() pré-multiplica o alfa numa cópia
+        # à resolução original (e o alfa é descartado em _rgb de qualquer forma)
+        return Image.merge('RGB', [img.getchannel(band).reduce(factor) for band in 'RGB'])
+    if img.mode not in ('RGB', 'L', 'CMYK'):
+        img = _rgb(img)
+    return img.reduce(factor)
+
+
+def _scaled(size, scale):
+    width, height = size
+    scale = min(1, scale)
+    return max(1, ceil(width * scale)), max(1, ceil(height * scale))
+
+
+def _rgb(img):
+    return img if img.mode == 'RGB' else img.convert('RGB')
+
+
+def _encode(img, fmt, **options):
+    output = BytesIO()
+    img.save(output, format=fmt, **options)
+    return output.getvalue()
+
+
+def render_variants(img, widths, formats):
+    """
+    Reduz `img` a cada largura (nunca aumenta) e codifica-a em cada formato.
+    Devolve [(formato, largura, altura, bytes)], das larguras maiores para
+    as menores; cada redução parte da anterior, que já é mais pequena.
+    """
+    variants = []
+    current = img
+    for width in sorted({min(width, img.width) for width in widths}, reverse=True):
+        if width < current.width:
+            current = current.resize((width, max(1, round(current.height * width / current.width))), Image.LANCZOS)
+        for name in formats:
+            fmt, _, options = VARIANT_FORMATS[name]
+            variants.append((name, current.width, current.height, _encode(current, fmt, **options)))
+    return variants
+
+
+def optimize_image(data, widths=(), formats=(), max_pixels=MAX_PIXELS):
+    """
+    Devolve (imagem, miniatura, variantes): a imagem em JPEG limitada a
+    1200px, a miniatura a 300px e as variantes responsivas pedidas.
+    """
+    with open_image(BytesIO(data), max_pixels) as img:
+        original = img.size
+        # A maior resolução de que precisamos: 1200px ou a maior variante
+        largest = max(widths) if widths and formats else 0
+        target = _scaled(original, max(MAX_SIZE / max(original), largest / original[0]))
+        # A descodificação acontece aqui, já à escala do draft
+        img = _rgb(shrink(draft(img, target), target))
+        variants = render_variants(img, widths, formats) if largest else []
+        if img.width > MAX_SIZE or img.height > MAX_SIZE:
+            img.thumbnail((MAX_SIZE, MAX_SIZE))
+        thumb = img.copy()
+        thumb.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        image = _encode(img, 'JPEG', quality=85)
+        thumbnail = _encode(thumb, 'JPEG', quality=80)
+    return image, thumbnail, variants
+
+
+def resize_cover(data, width, height, name, max_pixels=MAX_PIXELS):
+    """
+    Recorta e reduz a imagem para exatamente width x height (como
+    object-fit: cover), codificada no formato `name` de VARIANT_FORMATS.
+    """
+    fmt, _, options = VARIANT_FORMATS[name]
+    with open_image(BytesIO(data), max_pixels) as img:
+        target = _scaled(img.size, max(width / img.width, height / img.height))
+        img = _rgb(shrink(draft(img, target), target))
+        return _encode(ImageOps.fit(img, (width, height), Image.LANCZOS), fmt, **options)
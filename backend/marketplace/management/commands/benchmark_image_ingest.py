@@ -0,0 +1,101 @@
+# marketplace/management/commands/benchmark_image_ingest.py
+
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from marketplace.imaging import optimize_image
+
+
+def legacy_optimize(data, widths, formats, max_pixels):
+    # Media._optimize_image antes do worker de imagens (referência)
+    img = Image.open(BytesIO(data))
+    if img.mode in ('RGBA', 'P'):
+        img = img.convert('RGB')
+    if img.width > 1200 or img.height > 1200:
+        img.thumbnail((1200, 1200))
+    thumb = img.copy()
+    thumb.thumbnail((300, 300))
+    output = BytesIO()
+    img.save(output, format='JPEG', quality=85)
+    thumb_output = BytesIO()
+    thumb.save(thumb_output, format='JPEG', quality=80)
+    return output.getvalue(), thumb_output.getvalue()
+
+
+IMPLEMENTATIONS = {
+    'legacy': legacy_optimize,
+    'ingest': optimize_image,
+}
+
+
+def generate(path, fmt, width, height, mode):
+    base = Image.linear_gradient('L').resize((width, height))
+    noise = Image.effect_noise((width, height), 40)
+    channels = {'RGB': 3, 'RGBA': 4, 'CMYK': 4}[mode]
+    bands = [base, noise, base.transpose(Image.Transpose.FLIP_LEFT_RIGHT), noise][:channels]
+    Image.merge(mode, bands).save(path, format=fmt, **({'quality': 90} if fmt == 'JPEG' else {'compress_level': 1}))
+    return os.path.getsize(path)
+
+
+def measure(name, path, widths, formats, max_pixels):
+    """
+    Corre num processo novo: devolve o pico de RSS (KB) e o tempo.
+    """
+    with open(path, 'rb') as source:
+        data = source.read()
+    started = time.perf_counter()
+    if name != 'baseline':
+        IMPLEMENTATIONS[name](data, widths, formats, max_pixels)
+    elapsed = time.perf_counter() - started
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, elapsed
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara o pico de memória (RSS) do processamento de imagens grandes: o "
+        "Media._optimize_image original face ao marketplace.imaging (cabeçalho + draft). "
+        "Cada medição corre num processo novo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--megapixels', type=float, default=50, help="Tamanho das imagens geradas.")
+        parser.add_argument('--formats', default='JPEG:RGB,JPEG:CMYK,PNG:RGBA', help="Entradas geradas (formato:modo).")
+
+    def run(self, *args):
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            return pool.submit(*args).result()
+
+    def handle(self, *args, **options):
+        width = int((options['megapixels'] * 1_000_000 * 3 / 2) ** 0.5)
+        height = int(width * 2 / 3)
+        widths, formats = settings.MEDIA_IMAGE_VARIANT_WIDTHS, settings.MEDIA_IMAGE_VARIANT_FORMATS
+        max_pixels = max(settings.IMAGE_MAX_PIXELS, width * height)
+        directory = tempfile.mkdtemp(prefix='codebay-bench-')
+        try:
+            self.stdout.write(f"{width}x{height} ({width * height / 1e6:.1f} MP), variants {widths} x {formats}")
+            self.stdout.write(f"{'input':<12} {'size':>9} {'implementation':<15} {'peak RSS':>10} {'over baseline':>14} {'time':>8}")
+            for entry in options['formats'].split(','):
+                fmt, mode = entry.split(':')
+                path = os.path.join(directory, f'input-{mode}.{fmt.lower()}')
+                size = self.run(generate, path, fmt, width, height, mode)
+                # Processo que só lê o ficheiro: Python + Pillow + os bytes de entrada
+                baseline = self.run(measure, 'baseline', path, widths, formats, max_pixels)[0]
+                for name in IMPLEMENTATIONS:
+                    peak, elapsed = self.run(measure, name, path, widths, formats, max_pixels)
+                    self.stdout.write(
+                        f"{entry:<12} {size / 1e6:>7.1f}MB {name:<15} {peak / 1024:>8.0f}MB "
+                        f"{(peak - baseline) / 1024:>12.0f}MB {elapsed:>7.2f}s"
+                    )
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
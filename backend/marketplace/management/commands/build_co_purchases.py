@@ -0,0 +1,32 @@
+# marketplace/management/commands/build_co_purchases.py
+
+from django.core.management.base import BaseCommand
+
+from marketplace.cache import bump_catalog_version
+from marketplace.models import Product
+from marketplace.recommendations import rebuild_co_purchases
+
+
+class Command(BaseCommand):
+    help = "Recalcula as recomendações \"customers also bought\" (top-K co-compras por produto)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Produtos processados por query.")
+        parser.add_argument('--top-k', type=int, default=None, help="Vizinhos guardados por produto (default: RECOMMENDATIONS_TOP_K).")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        products = rows = 0
+
+        # Lotes por pk: cada lote é uma query agregada e um delete + bulk_create
+        while True:
+            ids = list(Product.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            rows += rebuild_co_purchases(ids, options['top_k'])
+            products += len(ids)
+            last_id = ids[-1]
+
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f"Co-purchases rebuilt for {products} products ({rows} pairs)."))
@@ -0,0 +1,28 @@
+# marketplace/management/commands/build_similar_products.py
+
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand
+
+from marketplace.models import Product
+from marketplace.similarity import refresh_similar_products, similarity_index
+
+
+class Command(BaseCommand):
+    help = "Constrói o índice de produtos semelhantes (TF-IDF sobre título/descrição + categoria/linguagem)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--changed', action='store_true', help="Recalcula só os produtos alterados desde o último build.")
+        parser.add_argument('--top-k', type=int, default=None, help="Vizinhos guardados por produto (default: SIMILAR_PRODUCTS_TOP_K).")
+
+    def handle(self, *args, **options):
+        changed = None
+        built_at = similarity_index.built_at()
+        if options['changed'] and built_at is not None:
+            since = datetime.fromtimestamp(built_at, tz=timezone.utc)
+            changed = list(Product.objects.filter(updated_at__gt=since).values_list('pk', flat=True))
+
+        refreshed = refresh_similar_products(changed, options['top_k'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Similar products index written to {similarity_index.get_path()} ({refreshed} products recomputed)."
+        ))
@@ -0,0 +1,27 @@
+# marketplace/management/commands/decay_trending_scores.py
+
+from django.core.management.base import BaseCommand
+
+from marketplace.cache import bump_catalog_version
+from marketplace.models import Product, ProductPopularity
+from marketplace.popularity import decay_scores
+
+
+class Command(BaseCommand):
+    help = "Aplica o decaimento temporal às pontuações de tendência (executar periodicamente, ex: de hora a hora)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--half-life', type=float, default=None, help="Meia-vida em horas (default: TRENDING_HALF_LIFE_HOURS).")
+
+    def handle(self, *args, **options):
+        # Garante a linha de popularidade de produtos criados sem Product.save()
+        missing = Product.objects.filter(popularity__isnull=True).values_list('pk', flat=True)
+        created = ProductPopularity.objects.bulk_create(
+            [ProductPopularity(product_id=pk) for pk in missing.iterator()],
+            ignore_conflicts=True,
+        )
+
+        decayed = decay_scores(options['half_life'])
+        # ?ordering=trending fica em cache/ETag até ao próximo decaimento
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f"Trending scores decayed for {decayed} products ({len(created)} rows created)."))
@@ -0,0 +1,38 @@
+# marketplace/management/commands/process_media.py
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from marketplace.media_pipeline import process_pending
+from marketplace.models import Media
+
+
+class Command(BaseCommand):
+    help = "Processa as imagens em fila (otimização + miniatura). Com --loop corre como worker dedicado."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Continua a consultar a fila em vez de terminar.")
+        parser.add_argument('--interval', type=float, default=2, help="Segundos entre consultas com --loop.")
+        parser.add_argument('--batch-size', type=int, default=None, help="Imagens reservadas de cada vez.")
+        parser.add_argument(
+            '--backfill-variants', action='store_true',
+            help="Volta a pôr na fila as imagens prontas sem variantes responsivas.",
+        )
+
+    def handle(self, *args, **options):
+        if options['backfill_variants']:
+            queued = (
+                Media.objects.filter(type=Media.IMAGE, status=Media.READY, variants=[])
+                .exclude(image='').exclude(image__isnull=True)
+                .update(status=Media.PROCESSING, attempts=0, claimed_at=None)
+            )
+            self.stdout.write(f"{queued} images queued for variants.")
+
+        while True:
+            processed = process_pending(options['batch_size'])
+            if processed or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f"{processed} images processed."))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
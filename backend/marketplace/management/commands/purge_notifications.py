@@ -0,0 +1,31 @@
+# marketplace/management/commands/purge_notifications.py
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from marketplace.models import Notification
+
+
+class Command(BaseCommand):
+    help = "Apaga em lotes as notificações lidas mais antigas que o período de retenção."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help="Dias de retenção (default: NOTIFICATIONS_RETENTION_DAYS).")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Notificações apagadas por DELETE.")
+
+    def handle(self, *args, **options):
+        days = options['days'] or settings.NOTIFICATIONS_RETENTION_DAYS
+        cutoff = timezone.now() - timedelta(days=days)
+        # Lotes pequenos: cada DELETE é curto e não bloqueia a tabela
+        expired = Notification.objects.filter(is_read=True, created_at__lt=cutoff).order_by('created_at')
+        total = 0
+        while True:
+            ids = list(expired.values_list('pk', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            total += Notification.objects.filter(pk__in=ids).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f"{total} read notifications older than {days} days deleted."))
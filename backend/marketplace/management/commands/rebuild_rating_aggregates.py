@@ -0,0 +1,65 @@
+# marketplace/management/commands/rebuild_rating_aggregates.py
+
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from marketplace.models import Product, Rating
+
+
+SCORES = range(1, 6)
+FIELDS = ['rating_count', 'rating_sum', 'rating_average'] + [f'rating_{score}_count' for score in SCORES]
+
+
+class Command(BaseCommand):
+    help = "Recalcula os agregados de avaliações (contagem, soma, média e histograma) de todos os produtos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Produtos processados por transação.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        total = 0
+
+        while True:
+            with transaction.atomic():
+                # Bloqueia o lote para não perder deltas de avaliações concorrentes
+                ids = list(
+                    Product.objects.filter(pk__gt=last_id).order_by('pk')
+                    .select_for_update().values_list('pk', flat=True)[:batch_size]
+                )
+                if not ids:
+                    break
+
+                stats = {
+                    row['product_id']: row
+                    for row in Rating.objects.filter(product_id__in=ids).values('product_id').annotate(
+                        count=Count('id'),
+                        total=Sum('score'),
+                        **{f'score_{score}': Count('id', filter=Q(score=score)) for score in SCORES},
+                    )
+                }
+
+                products = [self.build(pk, stats.get(pk, {})) for pk in ids]
+                Product.objects.bulk_update(products, FIELDS)
+
+            last_id = ids[-1]
+            total += len(ids)
+
+        self.stdout.write(self.style.SUCCESS(f"Rating aggregates rebuilt for {total} products."))
+
+    def build(self, pk, row):
+        count = row.get('count', 0)
+        rating_sum = row.get('total') or 0
+        product = Product(
+            pk=pk,
+            rating_count=count,
+            rating_sum=rating_sum,
+            rating_average=(Decimal(rating_sum) / count).quantize(Decimal('0.01')) if count else Decimal(0),
+        )
+        for score in SCORES:
+            setattr(product, f'rating_{score}_count', row.get(f'score_{score}', 0))
+        return product
@@ -0,0 +1,286 @@
+# marketplace/media_pipeline.py
+
+import logging
+import multiprocessing
+import os
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .cache import bump_catalog_version
+from .imaging import VARIANT_FORMATS, ImageRejected, optimize_image
+from .models import Media, Product
+
+logger = logging.getLogger(__name__)
+
+
+VARIANTS_UPLOAD_TO = 'products/variants/%Y/%m/%d/'
+POOL_DIED = "Image worker process died."
+
+# Um único consumidor da fila por processo; o trabalho de Pillow vai para o pool
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='media')
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Pool de processos partilhado pelo worker (o Pillow só liberta o GIL em
+    parte). Com MEDIA_PROCESSING_WORKERS <= 1 as imagens são processadas
+    no próprio processo.
+    """
+    global _pool
+    workers = settings.MEDIA_PROCESSING_WORKERS
+    if workers <= 1:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn: o fork de um processo com threads (servidor, listener) não é seguro
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def discard_pool(pool):
+    """
+    Um processo do pool que morra (ex: OOM) deixa-o partido para sempre: o
+    próximo get_pool() cria um novo.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def fair_share(candidates, limit, per_product):
+    """
+    Escolhe até `limit` linhas (pk, product_id), no máximo `per_product` de
+    cada produto, alternando entre produtos por ordem de chegada.
+    """
+    queues = defaultdict(deque)
+    for pk, product_id in candidates:
+        if len(queues[product_id]) < per_product:
+            queues[product_id].append(pk)
+    chosen = []
+    while queues and len(chosen) < limit:
+        for product_id in list(queues):
+            chosen.append(queues[product_id].popleft())
+            if not queues[product_id]:
+                del queues[product_id]
+            if len(chosen) == limit:
+                break
+    return chosen
+
+
+def claim_media(limit, per_product=None):
+    """
+    Reserva até `limit` imagens por processar, no máximo
+    MEDIA_PROCESSING_PER_PRODUCT do mesmo produto, para que um produto com
+    muitas imagens não atrase os uploads dos outros vendedores. SKIP LOCKED
+    deixa vários workers consumirem a fila em paralelo; uma reserva expira
+    ao fim de MEDIA_PROCESSING_LEASE_SECONDS (worker que morreu a meio).
+    """
+    per_product = per_product or settings.MEDIA_PROCESSING_PER_PRODUCT
+    now = timezone.now()
+    expired = now - timedelta(seconds=settings.MEDIA_PROCESSING_LEASE_SECONDS)
+    claimable = Media.objects.filter(Q(claimed_at__isnull=True) | Q(claimed_at__lt=expired), status=Media.PROCESSING)
+    with transaction.atomic():
+        # Tentativas esgotadas sem passar por fail_media: o worker morreu a
+        # processá-la (ex: OOM) e a reserva expirou. Não volta à fila
+        max_attempts = settings.MEDIA_PROCESSING_MAX_ATTEMPTS
+        exhausted = claimable.filter(attempts__gte=max_attempts).update(
+            status=Media.FAILED,
+            processing_error=f"Processing did not finish after {max_attempts} attempts.",
+            claimed_at=None,
+        )
+        if exhausted:
+            logger.error(f"{exhausted} media failed after {max_attempts} unfinished processing attempts.")
+        candidates = (
+            claimable.select_for_update(skip_locked=True)
+            .order_by('created_at', 'id')
+            .values_list('pk', 'product_id')[:limit * per_product]
+        )
+        ids = fair_share(candidates, limit, per_product)
+        Media.objects.filter(pk__in=ids).update(claimed_at=now, attempts=F('attempts') + 1)
+    return list(Media.objects.filter(pk__in=ids).order_by('created_at', 'id'))
+
+
+def read_original(media):
+    with media.image.open('rb') as source:
+        return source.read()
+
+
+def store_variants(media, variants):
+    """
+    Grava os ficheiros das variantes e devolve o registo compacto guardado em
+    Media.variants: [[formato, largura, altura, nome], ...], pela ordem de
+    preferência dos formatos e por largura crescente.
+    """
+    storage = media.image.storage
+    base = os.path.splitext(os.path.basename(media.image.name))[0]
+    directory = timezone.now().strftime(VARIANTS_UPLOAD_TO)
+    formats = settings.MEDIA_IMAGE_VARIANT_FORMATS
+    record = []
+    for name, width, height, data in variants:
+        extension = VARIANT_FORMATS[name][1]
+        stored = storage.save(f'{directory}{base}_{width}w.{extension}', ContentFile(data))
+        record.append([name, width, height, stored])
+    record.sort(key=lambda entry: (formats.index(entry[0]), entry[1]))
+    return record
+
+
+def delete_variants(storage, record):
+    for _, _, _, name in record:
+        storage.delete(name)
+
+
+def store_processed(media, image, thumbnail, variants=()):
+    """
+    Guarda a imagem otimizada, a miniatura e as variantes de uma Media
+    reservada e marca-a como pronta. O original e as variantes anteriores
+    são apagados depois de substituídos.
+    """
+    original, previous_variants = media.image.name, media.variants
+    base = os.path.splitext(os.path.basename(original))[0]
+    media.image.save(f'{base}.jpg', ContentFile(image), save=False)
+    media.thumbnail.save(f'thumb_{base}.jpg', ContentFile(thumbnail), save=False)
+    media.variants = store_variants(media, variants)
+
+    updated = Media.objects.filter(pk=media.pk, status=Media.PROCESSING).update(
+        image=media.image.name,
+        thumbnail=media.thumbnail.name,
+        variants=media.variants,
+        status=Media.READY,
+        processing_error='',
+        claimed_at=None,
+    )
+    storage = media.image.storage
+    if not updated:
+        # Apagada (ou reprocessada) entretanto
+        storage.delete(media.image.name)
+        storage.delete(media.thumbnail.name)
+        delete_variants(storage, media.variants)
+        return False
+    if original != media.image.name:
+        storage.delete(original)
+    delete_variants(storage, previous_variants)
+    media.status = Media.READY
+    return True
+
+
+def process_batch(batch):
+    """
+    Processa um lote reservado: o Pillow corre em paralelo no pool e os
+    ficheiros/linhas são gravados aqui. Devolve o número de imagens prontas.
+    """
+    pool = get_pool()
+    options = (settings.MEDIA_IMAGE_VARIANT_WIDTHS, settings.MEDIA_IMAGE_VARIANT_FORMATS, settings.IMAGE_MAX_PIXELS)
+    jobs = []
+    broken = False
+    for media in batch:
+        if broken:
+            requeue_media(media)
+            continue
+        try:
+            data = read_original(media)
+            jobs.append((media, pool.submit(optimize_image, data, *options) if pool else data))
+        except BrokenProcessPool:
+            broken = True
+            requeue_media(media)
+        except Exception as e:
+            fail_media(media, e)
+
+    processed = 0
+    products = set()
+    for media, job in jobs:
+        try:
+            image, thumbnail, variants = job.result() if pool else optimize_image(job, *options)
+            if store_processed(media, image, thumbnail, variants):
+                processed += 1
+                products.add(media.product_id)
+        except BrokenProcessPool:
+            broken = True
+            requeue_media(media)
+        except ImageRejected as e:
+            # Repetir não adianta
+            fail_media(media, e, retry=False)
+        except Exception as e:
+            fail_media(media, e)
+    if broken:
+        logger.error("Image worker pool broke; it will be replaced and the batch retried.")
+        discard_pool(pool)
+    if products:
+        Product.objects.filter(pk__in=products).sync_primary_media()
+        bump_catalog_version()
+    return processed
+
+
+def requeue_media(media):
+    """
+    Devolve à fila uma imagem cujo processo do pool morreu. Não se sabe qual
+    das imagens do lote o matou, por isso a primeira vez não conta como
+    tentativa; se voltar a acontecer à mesma imagem, conta.
+    """
+    refund = media.processing_error != POOL_DIED
+    Media.objects.filter(pk=media.pk, status=Media.PROCESSING).update(
+        processing_error=POOL_DIED,
+        claimed_at=None,
+        attempts=F('attempts') - 1 if refund else F('attempts'),
+    )
+
+
+def fail_media(media, error, retry=True):
+    # Volta à fila até esgotar as tentativas; depois fica marcada como falhada
+    failed = not retry or media.attempts >= settings.MEDIA_PROCESSING_MAX_ATTEMPTS
+    Media.objects.filter(pk=media.pk, status=Media.PROCESSING).update(
+        status=Media.FAILED if failed else Media.PROCESSING,
+        processing_error=str(error)[:1000],
+        claimed_at=None,
+    )
+    logger.error(f"Error processing media {media.pk} (attempt {media.attempts}): {error}", exc_info=True)
+
+
+def process_pending(batch_size=None):
+    """
+    Processa a fila até ficar vazia. Devolve o número de imagens prontas.
+    """
+    batch_size = batch_size or max(settings.MEDIA_PROCESSING_WORKERS, 1) * 2
+    processed = 0
+    while True:
+        batch = claim_media(batch_size)
+        if not batch:
+            return processed
+        processed += process_batch(batch)
+
+
+def _run_pending():
+    close_old_connections()
+    try:
+        process_pending()
+    except Exception as e:
+        logger.error(f"Error processing media queue: {e}", exc_info=True)
+    finally:
+        close_old_connections()
+
+
+def schedule_media_processing():
+    """
+    Acorda, depois do commit, o worker de imagens deste processo. Imagens
+    que fiquem na fila (ex: reinício do servidor) são apanhadas pelo
+    comando process_media.
+    """
+    def start():
+        if settings.BACKGROUND_TASKS_ASYNC:
+            _executor.submit(_run_pending)
+        else:
+            process_pending()
+
+    transaction.on_commit(start)
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0005_alter_media_options_remove_media_content_type_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['published', 'created_at', 'id'], name='product_catalog_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:18
+
+from django.core.files.images import get_image_dimensions
+from django.db import migrations, models
+
+
+def populate_primary_media(apps, schema_editor):
+    Product = apps.get_model('marketplace', 'Product')
+    Media = apps.get_model('marketplace', 'Media')
+    # Primeira imagem de cada produto, pela mesma ordem de Media.Meta.ordering
+    primary = (
+        Media.objects.filter(type='image').exclude(image='').exclude(image__isnull=True)
+        .order_by('product_id', '-is_primary', '-created_at')
+        .distinct('product_id')
+    )
+    for media in primary.iterator():
+        width = height = None
+        try:
+            width, height = get_image_dimensions(media.thumbnail or media.image) or (None, None)
+        except (OSError, ValueError):
+            pass
+        Product.objects.filter(pk=media.product_id).update(
+            primary_image=media.image.name,
+            primary_thumbnail=media.thumbnail.name or '',
+            primary_thumbnail_width=width,
+            primary_thumbnail_height=height,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0010_product_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='primary_image',
+            field=models.ImageField(blank=True, editable=False, max_length=255, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='primary_thumbnail',
+            field=models.ImageField(blank=True, editable=False, max_length=255, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='primary_thumbnail_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='primary_thumbnail_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(populate_primary_media, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:19
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_popularity(apps, schema_editor):
+    Product = apps.get_model('marketplace', 'Product')
+    Order = apps.get_model('marketplace', 'Order')
+    ProductPopularity = apps.get_model('marketplace', 'ProductPopularity')
+    # Pontuação inicial a partir das vendas existentes (decaem no próximo decay_trending_scores)
+    sales = dict(
+        Order.objects.filter(payment_status='succeeded').values('product_id')
+        .annotate(count=Count('id')).values_list('product_id', 'count')
+    )
+    ProductPopularity.objects.bulk_create(
+        [
+            ProductPopularity(product_id=pk, sales_count=sales.get(pk, 0), score=10 * sales.get(pk, 0))
+            for pk in Product.objects.values_list('pk', flat=True).iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0011_product_primary_media'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductPopularity',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='marketplace.product')),
+                ('score', models.FloatField(default=0)),
+                ('sales_count', models.PositiveIntegerField(default=0)),
+                ('view_count', models.PositiveIntegerField(default=0)),
+                ('decayed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name_plural': 'Product popularity',
+                'indexes': [models.Index(fields=['-score', '-product'], name='popularity_trending_idx')],
+            },
+        ),
+        migrations.RunPython(populate_popularity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0012_product_popularity'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductCoPurchase',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('payment_status', 'succeeded')), fields=['buyer', 'product'], name='order_purchase_idx'),
+        ),
+        migrations.AddField(
+            model_name='productcopurchase',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='co_purchases', to='marketplace.product'),
+        ),
+        migrations.AddField(
+            model_name='productcopurchase',
+            name='recommended',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='co_purchased_with', to='marketplace.product'),
+        ),
+        migrations.AddIndex(
+            model_name='productcopurchase',
+            index=models.Index(fields=['product', '-count', 'recommended'], name='co_purchase_lookup_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='productcopurchase',
+            constraint=models.UniqueConstraint(fields=('product', 'recommended'), name='unique_co_purchase'),
+        ),
+    ]
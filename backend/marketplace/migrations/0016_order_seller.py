@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def populate_order_seller(apps, schema_editor):
+    Order = apps.get_model('marketplace', 'Order')
+    Product = apps.get_model('marketplace', 'Product')
+    Order.objects.update(
+        seller_id=Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('seller_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0015_notification_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='seller',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sales', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(populate_order_seller, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('payment_status', 'succeeded')), fields=['seller', '-created_at', '-id'], name='order_sales_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0016_order_seller'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductViewDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_views', to='marketplace.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Product daily views',
+                'constraints': [models.UniqueConstraint(fields=('product', 'day'), name='unique_product_view_day')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0018_media_processing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='media',
+            name='variants',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='primary_variants',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+    ]
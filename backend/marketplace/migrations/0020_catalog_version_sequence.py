@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0019_media_variants'),
+    ]
+
+    operations = [
+        # Geração do catálogo partilhada pelos workers (marketplace.cache)
+        # (o primeiro nextval devolve o valor inicial sem mudar last_value)
+        migrations.RunSQL(
+            "CREATE SEQUENCE IF NOT EXISTS marketplace_catalog_version; SELECT nextval('marketplace_catalog_version')",
+            'DROP SEQUENCE IF EXISTS marketplace_catalog_version',
+        ),
+    ]
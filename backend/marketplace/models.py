@@ -1,16 +1,118 @@
 # marketplace/models.py
 
 from django.conf import settings
-from django.db import models
-from django.db.models import Avg
+from django.db import models, transaction
+from django.db.models import DecimalField, F, Value
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.db.models.functions import Cast, Coalesce, NullIf, Now
+from django.utils import timezone
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
 from django.core.validators import URLValidator
-from PIL import Image
-from io import BytesIO
-from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.core.files.images import get_image_dimensions
 import sys
 
+from .cache import bump_catalog_version
+from .events import announce_notifications
+from .imaging import ImageRejected, inspect_image
+
+
+# Configuração de texto do PostgreSQL usada na pesquisa de produtos
+SEARCH_CONFIG = 'english'
+SEARCH_FIELDS = ('title', 'description', 'category', 'language')
+# Colunas mantidas por UPDATEs próprios; Product.save() não as reescreve
+DERIVED_FIELDS = (
+    'search_vector', 'rating_count', 'rating_sum', 'rating_average',
+    'rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count',
+    'primary_image', 'primary_thumbnail', 'primary_thumbnail_width', 'primary_thumbnail_height',
+    'primary_variants',
+)
+
+
+def product_search_vector():
+    # Pesos: título > descrição > categoria/linguagem
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+        + SearchVector('category', 'language', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+class ProductQuerySet(models.QuerySet):
+    def published(self):
+        return self.filter(published=True)
+
+    def for_catalog(self):
+        """
+        Queryset usado nas listagens do catálogo: carrega seller, media e files
+        numa quantidade fixa de queries.
+        """
+        return self.select_related('seller').prefetch_related('media', 'files')
+
+    def apply_rating_change(self, added=None, removed=None):
+        """
+        Atualiza os agregados de avaliações num único UPDATE com F(), somando a
+        nota `added` e/ou retirando a nota `removed`.
+        """
+        count_delta = (added is not None) - (removed is not None)
+        sum_delta = (added or 0) - (removed or 0)
+        new_count = F('rating_count') + count_delta
+        new_sum = F('rating_sum') + sum_delta
+
+        changes = {
+            'updated_at': Now(),
+            'rating_count': new_count,
+            'rating_sum': new_sum,
+            'rating_average': Coalesce(
+                Cast(new_sum, DecimalField(max_digits=12, decimal_places=4)) / NullIf(new_count, 0),
+                Value(0), output_field=DecimalField(max_digits=3, decimal_places=2),
+            ),
+        }
+        if added != removed:
+            if added is not None:
+                changes[f'rating_{added}_count'] = F(f'rating_{added}_count') + 1
+            if removed is not None:
+                changes[f'rating_{removed}_count'] = F(f'rating_{removed}_count') - 1
+        return self.update(**changes)
+
+    def update_search_vector(self):
+        return self.update(search_vector=product_search_vector())
+
+    def touch(self):
+        # Marca os produtos como alterados (ETag/Last-Modified)
+        return self.update(updated_at=timezone.now())
+
+    def sync_primary_media(self):
+        """
+        Copia para cada produto a referência da sua imagem principal (a
+        primeira imagem segundo Media.Meta.ordering), para que os cards não
+        precisem de carregar a galeria.
+        """
+        for pk in self.values_list('pk', flat=True):
+            media = (
+                Media.objects.filter(product_id=pk, type=Media.IMAGE)
+                .exclude(image='').exclude(image__isnull=True)
+                .only('image', 'thumbnail', 'variants')
+                .first()
+            )
+            width = height = None
+            if media is not None:
+                try:
+                    width, height = get_image_dimensions(media.thumbnail or media.image) or (None, None)
+                except (OSError, ValueError):
+                    pass
+            Product.objects.filter(pk=pk).update(
+                primary_image=media.image.name if media else '',
+                primary_thumbnail=(media.thumbnail.name or '') if media else '',
+                primary_thumbnail_width=width,
+                primary_thumbnail_height=height,
+                primary_variants=media.variants if media else [],
+                updated_at=timezone.now(),
+            )
+
 
 class Product(models.Model):
     CATEGORY_CHOICES = [
@@ -49,13 +151,74 @@ class Product(models.Model):
     language = models.CharField(max_length=50, choices=LANGUAGE_CHOICES)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     published = models.BooleanField(default=False)  
     pending_publication = models.BooleanField(default=False)  
-   
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    # Agregados das avaliações, mantidos por Rating.save()/delete()
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_average = models.DecimalField(max_digits=3, decimal_places=2, default=0, editable=False)
+    rating_1_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_2_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_3_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_4_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_5_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # Imagem principal desnormalizada, mantida por Media.save()/delete()
+    primary_image = models.ImageField(max_length=255, blank=True, editable=False)
+    primary_thumbnail = models.ImageField(max_length=255, blank=True, editable=False)
+    primary_thumbnail_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    primary_thumbnail_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    primary_variants = models.JSONField(default=list, blank=True, editable=False)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Suporta a paginação keyset do catálogo público
+            models.Index(fields=['published', 'created_at', 'id'], name='product_catalog_idx'),
+            # Filtros mais comuns do catálogo, na mesma ordem da paginação
+            models.Index(fields=['published', 'category', 'created_at', 'id'], name='product_category_idx'),
+            models.Index(fields=['published', 'language', 'created_at', 'id'], name='product_language_idx'),
+            models.Index(fields=['published', 'rating_average', 'id'], name='product_rating_idx'),
+            # Cobre a query das facetas (index-only scan)
+            models.Index(fields=['published', 'category', 'language', 'price'], name='product_facet_idx'),
+            GinIndex(fields=['search_vector'], name='product_search_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # Evita sobrescrever agregados atualizados em concorrência. O updated_at
+            # entra sempre, mesmo adiado por .only(): é a base do ETag/Last-Modified
+            deferred = self.get_deferred_fields() - {'updated_at'}
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in DERIVED_FIELDS and field.attname not in deferred
+            ]
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if adding:
+            # A ordenação por tendência assume uma linha por produto
+            ProductPopularity.objects.create(product=self)
+        # Mantém o tsvector atualizado quando os campos pesquisáveis mudam
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or set(update_fields) & set(SEARCH_FIELDS):
+            Product.objects.filter(pk=self.pk).update_search_vector()
+        bump_catalog_version()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        bump_catalog_version()
+        return result
 
     def average_rating(self):
-        avg = self.ratings.aggregate(Avg('score'))['score__avg']
-        return round(avg, 2) if avg else None
+        return self.rating_average if self.rating_count else None
+
+    @property
+    def rating_histogram(self):
+        return {score: getattr(self, f'rating_{score}_count') for score in range(1, 6)}
 
     @property
     def main_file(self):
@@ -67,6 +230,72 @@ class Product(models.Model):
 
 
 
+class ProductPopularity(models.Model):
+    """
+    Pontuação de tendência de um produto, numa tabela à parte para que as
+    vendas e visualizações não reescrevam a linha do Product. A pontuação
+    cresce com cada evento e decai periodicamente (decay_trending_scores).
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='popularity')
+    score = models.FloatField(default=0)
+    sales_count = models.PositiveIntegerField(default=0)
+    view_count = models.PositiveIntegerField(default=0)
+    decayed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name_plural = "Product popularity"
+        indexes = [
+            # Suporta ?ordering=trending (paginação keyset por score, id)
+            models.Index(fields=['-score', '-product'], name='popularity_trending_idx'),
+        ]
+
+    def __str__(self):
+        return f"Popularity of product #{self.product_id}: {self.score:.2f}"
+
+
+class ProductViewDaily(models.Model):
+    """
+    Visualizações da página de detalhe por produto e dia. Escrita só pelo
+    flush do buffer de visualizações (marketplace.popularity), nunca por pedido.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_views')
+    day = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Product daily views"
+        constraints = [
+            # Alvo do ON CONFLICT do flush; serve também a série diária por produto
+            models.UniqueConstraint(fields=['product', 'day'], name='unique_product_view_day'),
+        ]
+
+    def __str__(self):
+        return f"Product #{self.product_id} on {self.day}: {self.count} views"
+
+
+class ProductCoPurchase(models.Model):
+    """
+    Top-K de produtos comprados pelos mesmos compradores ("customers also
+    bought"), calculado por build_co_purchases e atualizado pelo webhook.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='co_purchases')
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='co_purchased_with')
+    # Número de compradores que compraram os dois produtos
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'recommended'], name='unique_co_purchase'),
+        ]
+        indexes = [
+            # Uma leitura indexada por página de produto, já pela ordem de exibição
+            models.Index(fields=['product', '-count', 'recommended'], name='co_purchase_lookup_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.product_id} -> #{self.recommended_id} ({self.count})"
+
+
 class Media(models.Model):
     IMAGE = 'image'
     VIDEO = 'video'
@@ -75,6 +304,16 @@ class Media(models.Model):
         (VIDEO, 'Video'),
     ]
 
+    # Estado do processamento da imagem (marketplace.media_pipeline)
+    PROCESSING = 'processing'
+    READY = 'ready'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PROCESSING, 'Processing'),
+        (READY, 'Ready'),
+        (FAILED, 'Failed'),
+    ]
+
     product = models.ForeignKey('Product', on_delete=models.CASCADE, related_name='media')
     type = models.CharField(max_length=10, choices=MEDIA_TYPE_CHOICES)
     image = models.ImageField(
@@ -85,12 +324,25 @@ class Media(models.Model):
     )
     video_url = models.URLField(blank=True, null=True, validators=[URLValidator()])
     thumbnail = models.ImageField(upload_to='products/thumbnails/%Y/%m/%d/', blank=True, null=True)
+    # Variantes responsivas: [[formato, largura, altura, ficheiro], ...] (marketplace.media_pipeline)
+    variants = models.JSONField(default=list, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     is_primary = models.BooleanField(default=False, help_text="Imagem principal do produto")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=READY, editable=False)
+    processing_error = models.TextField(blank=True, editable=False)
+    attempts = models.PositiveSmallIntegerField(default=0, editable=False)
+    claimed_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     class Meta:
         ordering = ['-is_primary', '-created_at']
         verbose_name_plural = "Media"
+        indexes = [
+            # Fila do worker de imagens: só as linhas por processar
+            models.Index(
+                fields=['created_at'], name='media_processing_queue_idx',
+                condition=models.Q(status='processing'),
+            ),
+        ]
 
     def __str__(self):
         return f"{self.get_type_display()} for {self.product.title}"
@@ -102,55 +354,29 @@ class Media(models.Model):
                 raise ValidationError("Uma imagem é necessária para este tipo de mídia.")
             if self.image and not self.image.name.lower().endswith(('.png', '.jpg', '.jpeg', '.webp')):
                 raise ValidationError("Formato de imagem inválido. Aceitos: PNG, JPG, JPEG, WEBP.")
+            if self.image and not self.image._committed:
+                # Upload novo: valida o cabeçalho sem descodificar a imagem
+                try:
+                    inspect_image(self.image, settings.IMAGE_MAX_PIXELS)
+                except ImageRejected as e:
+                    raise ValidationError(str(e))
         if self.type == self.VIDEO and not self.video_url:
             raise ValidationError("Uma URL de vídeo é necessária para este tipo de mídia.")
 
     def save(self, *args, **kwargs):
-        # Otimização automática da imagem
-        if self.image and not self.thumbnail:
-            self._optimize_image()
+        # Guarda o original; a otimização e a miniatura são feitas pelo worker
+        if self.image and not self.thumbnail and self.status == self.READY:
+            self.status = self.PROCESSING
 
         super().save(*args, **kwargs)
+        Product.objects.filter(pk=self.product_id).sync_primary_media()
+        bump_catalog_version()
 
-    def _optimize_image(self):
-        img = Image.open(self.image)
-        
-        if img.mode in ('RGBA', 'P'):
-            img = img.convert('RGB')
-        
-        if img.width > 1200 or img.height > 1200:
-            img.thumbnail((1200, 1200))
-        
-        thumb = img.copy()
-        thumb.thumbnail((300, 300))
-        
-        output = BytesIO()
-        img.save(output, format='JPEG', quality=85)
-        output.seek(0)
-        output_size = output.tell()
-        
-        self.image = InMemoryUploadedFile(
-            output,
-            'ImageField',
-            f"{self.image.name.split('.')[0]}.jpg",
-            'image/jpeg',
-            output_size,
-            None
-        )
-        
-        thumb_output = BytesIO()
-        thumb.save(thumb_output, format='JPEG', quality=80)
-        thumb_output.seek(0)
-        thumb_output_size = thumb_output.tell()
-        
-        self.thumbnail = InMemoryUploadedFile(
-            thumb_output,
-            'ImageField',
-            f"thumb_{self.image.name.split('.')[0]}.jpg",
-            'image/jpeg',
-            thumb_output_size,
-            None
-        )
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        Product.objects.filter(pk=self.product_id).sync_primary_media()
+        bump_catalog_version()
+        return result
 
     @property
     def url(self):
@@ -181,6 +407,8 @@ class Order(models.Model):
     ]
     buyer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='orders')
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='orders')
+    # Vendedor do produto, copiado na criação para as vendas não precisarem de join
+    seller = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, editable=False, related_name='sales')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -189,6 +417,19 @@ class Order(models.Model):
     payment_status = models.CharField(max_length=50, default='pending')  # ex: 'pending', 'succeeded', 'failed'
     paid_at = models.DateTimeField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Compras pagas por comprador (self-join das recomendações)
+            models.Index(fields=['buyer', 'product'], condition=models.Q(payment_status='succeeded'), name='order_purchase_idx'),
+            # Vendas de um vendedor, pela ordem da paginação keyset
+            models.Index(fields=['seller', '-created_at', '-id'], condition=models.Q(payment_status='succeeded'), name='order_sales_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.seller_id is None and self.product_id is not None:
+            self.seller_id = Product.objects.filter(pk=self.product_id).values_list('seller_id', flat=True).first()
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Order #{self.id} by {self.buyer.username} - {self.status}"
 
@@ -196,9 +437,32 @@ class Order(models.Model):
 
 class Notification(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notifications')
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True, related_name='notifications')
     content = models.TextField()
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Identifica o evento de origem; o mesmo evento não gera duas notificações
+    dedup_key = models.CharField(max_length=100, null=True, blank=True, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'dedup_key'], name='unique_notification_event'),
+        ]
+        indexes = [
+            # Feed paginado por keyset (created_at, id)
+            models.Index(fields=['user', '-created_at', '-id'], name='notification_feed_idx'),
+            # Contador de não lidas: índice pequeno, só com as não lidas
+            models.Index(fields=['user'], condition=models.Q(is_read=False), name='notification_unread_idx'),
+            # Limpeza periódica das lidas antigas (purge_notifications)
+            models.Index(fields=['created_at'], condition=models.Q(is_read=True), name='notification_read_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if adding:
+            # Acorda os streams SSE abertos deste utilizador
+            announce_notifications([self.user_id])
 
     def __str__(self):
         return f"Notification for {self.user.username} - Read: {self.is_read}"
@@ -215,3 +479,42 @@ class Rating(models.Model):
 
     def __str__(self):
         return f"Rating {self.score} by {self.user.username} for {self.product.title}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Guarda o estado persistido para calcular o delta dos agregados
+        instance._stored = (instance.__dict__.get('product_id'), instance.__dict__.get('score'))
+        return instance
+
+    def save(self, *args, **kwargs):
+        previous = None if self._state.adding else getattr(self, '_stored', None)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            products = Product.objects.all()
+            if previous is None:
+                products.filter(pk=self.product_id).apply_rating_change(added=self.score)
+            elif previous[0] == self.product_id:
+                if previous[1] != self.score:
+                    products.filter(pk=self.product_id).apply_rating_change(added=self.score, removed=previous[1])
+            else:
+                products.filter(pk=previous[0]).apply_rating_change(removed=previous[1])
+                products.filter(pk=self.product_id).apply_rating_change(added=self.score)
+            bump_catalog_version()
+        self._stored = (self.product_id, self.score)
+
+
+@receiver(post_delete, sender=Rating)
+def remove_rating_from_aggregates(sender, instance, origin=None, **kwargs):
+    """
+    Retira a avaliação apagada dos agregados do produto. Um sinal, e não
+    Rating.delete, para cobrir também QuerySet.delete() e as cascatas (apagar
+    um utilizador), que não chamam o delete() de cada instância. Corre dentro
+    da transação do delete.
+    """
+    if isinstance(origin, Product) or (isinstance(origin, models.QuerySet) and origin.model is Product):
+        # O próprio produto vai ser apagado
+        return
+    product_id, score = getattr(instance, '_stored', (instance.product_id, instance.score))
+    Product.objects.filter(pk=product_id).apply_rating_change(removed=score)
+    bump_catalog_version()
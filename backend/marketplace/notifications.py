@@ -0,0 +1,101 @@
+# marketplace/notifications.py
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .events import announce_notifications
+from .models import Notification, Wishlist
+
+logger = logging.getLogger(__name__)
+
+
+PUBLISHED = 'published'
+PRICE_CHANGED = 'price_changed'
+UPDATED = 'updated'
+
+MESSAGES = {
+    PUBLISHED: '"{title}" from your wishlist is now available.',
+    PRICE_CHANGED: '"{title}" from your wishlist changed price: €{previous_price} → €{price}.',
+    UPDATED: '"{title}" from your wishlist was updated.',
+}
+
+# Um único worker: os eventos são processados por ordem, fora do pedido HTTP
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='notifications')
+
+
+def dedup_key(product, event):
+    # Repetições do mesmo evento no mesmo dia não geram novas notificações
+    day = timezone.localdate().isoformat()
+    if event == PRICE_CHANGED:
+        return f'{event}:{product.pk}:{product.price}:{day}'
+    return f'{event}:{product.pk}:{day}'
+
+
+def fan_out(product_id, content, key, batch_size=None):
+    """
+    Cria uma notificação para cada utilizador com o produto na wishlist. Os
+    utilizadores são lidos em lotes por user_id (keyset), por isso a memória
+    não depende do número de interessados. Devolve o número de lotes.
+    """
+    batch_size = batch_size or settings.NOTIFICATIONS_BATCH_SIZE
+    subscribers = (
+        Wishlist.objects.filter(products=product_id)
+        .order_by('user_id')
+        .values_list('user_id', flat=True)
+    )
+    last_user_id = 0
+    batches = 0
+    while True:
+        user_ids = list(subscribers.filter(user_id__gt=last_user_id)[:batch_size])
+        if not user_ids:
+            return batches
+        Notification.objects.bulk_create(
+            [Notification(user_id=user_id, product_id=product_id, content=content, dedup_key=key) for user_id in user_ids],
+            ignore_conflicts=True,
+        )
+        announce_notifications(user_ids)
+        last_user_id = user_ids[-1]
+        batches += 1
+
+
+def _run_fan_out(product_id, content, key):
+    close_old_connections()
+    try:
+        fan_out(product_id, content, key)
+    except Exception as e:
+        logger.error(f"Error notifying wishlists of product {product_id}: {e}", exc_info=True)
+
+
+def notify_wishlisters(product, event, previous_price=None):
+    """
+    Agenda, depois do commit, as notificações de um evento do produto para
+    quem o tem na wishlist.
+    """
+    content = MESSAGES[event].format(title=product.title, price=product.price, previous_price=previous_price)
+    args = (product.pk, content, dedup_key(product, event))
+
+    def start():
+        if settings.BACKGROUND_TASKS_ASYNC:
+            _executor.submit(_run_fan_out, *args)
+        else:
+            fan_out(*args)
+
+    transaction.on_commit(start)
+
+
+def product_event(previous, product):
+    """
+    Evento a notificar depois de uma alteração, a partir do estado anterior
+    ({'published', 'price'}). Produtos não publicados não notificam.
+    """
+    if not product.published:
+        return None
+    if not previous['published']:
+        return PUBLISHED
+    if previous['price'] != product.price:
+        return PRICE_CHANGED
+    return UPDATED
@@ -0,0 +1,179 @@
+# marketplace/pagination.py
+
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginação por cursor (keyset). O cursor guarda os valores de `ordering`
+    do último item da página, por isso qualquer página custa o mesmo que a
+    primeira e nunca é feito um COUNT(*).
+    """
+    ordering = ('-created_at', '-id')
+    # Ordenações alternativas escolhidas por ?ordering=<nome>
+    ordering_options = {}
+    # Expressões anotadas exigidas por ordenações que não são colunas do modelo
+    ordering_annotations = {}
+    ordering_query_param = 'ordering'
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self):
+        self.page_size = settings.CATALOG_PAGE_SIZE
+        self.max_page_size = settings.CATALOG_MAX_PAGE_SIZE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_page_size(request)
+        self.ordering = self.get_ordering(request)
+
+        annotations = {
+            name: expression() for name, expression in self.ordering_annotations.items()
+            if any(field.lstrip('-') == name for field in self.ordering)
+        }
+        queryset = queryset.annotate(**annotations).order_by(*self.ordering)
+        queryset = self.load_ordering_fields(queryset)
+        position = self.decode_cursor(request, queryset)
+        if position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(position))
+
+        # Pede um item a mais para saber se existe página seguinte
+        results = list(queryset[:self.limit + 1])
+        self.has_next = len(results) > self.limit
+        self.page = results[:self.limit]
+        return self.page
+
+    def load_ordering_fields(self, queryset):
+        # Com .only(), garante que as colunas do cursor vêm na mesma query
+        names, defer = queryset.query.deferred_loading
+        if not names or defer:
+            return queryset
+        concrete = {field.name for field in queryset.model._meta.concrete_fields}
+        ordering = [field.lstrip('-') for field in self.ordering if field.lstrip('-') in concrete]
+        return queryset.only(*names, *ordering)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_ordering(self, request):
+        name = request.query_params.get(self.ordering_query_param)
+        if not name or not self.ordering_options:
+            return self.ordering
+        if name not in self.ordering_options:
+            raise ValidationError({self.ordering_query_param: f"Invalid ordering. Options: {', '.join(self.ordering_options)}"})
+        return self.ordering_options[name]
+
+    def get_keyset_filter(self, position):
+        # (a, b) < (x, y)  ==  a < x OR (a = x AND b < y)
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def encode_cursor(self, instance):
+        position = []
+        for field in self.ordering:
+            value = getattr(instance, field.lstrip('-'))
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            elif isinstance(value, Decimal):
+                value = str(value)
+            position.append(value)
+        raw = json.dumps(position, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def get_ordering_field(self, queryset, name):
+        # Coluna do modelo ou expressão anotada (ex: rank da pesquisa)
+        annotation = queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return queryset.model._meta.get_field(name)
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4))
+            position = json.loads(raw)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering) or None in position:
+            raise NotFound(self.invalid_cursor_message)
+        # Valores com o tipo errado não podem chegar ao ORM (seria um 500)
+        try:
+            return [
+                self.get_ordering_field(queryset, field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, position)
+            ]
+        except (DjangoValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class CatalogPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+    ordering_options = {
+        'newest': ('-created_at', '-id'),
+        'rating': ('-rating_average', '-id'),
+        'trending': ('-trending_score', '-id'),
+    }
+    ordering_annotations = {
+        # Produtos sem linha de ProductPopularity (ex: criados por bulk_create)
+        # contam como 0; um NULL ordenaria primeiro e quebraria o cursor
+        'trending_score': lambda: Coalesce(F('popularity__score'), Value(0.0)),
+    }
+
+
+class SearchPagination(KeysetPagination):
+    ordering = ('-rank', '-id')
+
+
+class NotificationPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+
+
+class SalesPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
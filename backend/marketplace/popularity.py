@@ -0,0 +1,152 @@
+# marketplace/popularity.py
+
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import DateTimeField, DurationField, ExpressionWrapper, F, Value
+from django.db.models.functions import Extract, Power
+from django.utils import timezone
+
+from .models import Product, ProductPopularity, ProductViewDaily
+
+logger = logging.getLogger(__name__)
+
+
+def _add_events(product_ids, score, sales=0, views=0):
+    # Um único UPDATE incremental; nunca lê a pontuação atual
+    return ProductPopularity.objects.filter(product_id__in=product_ids).update(
+        score=F('score') + score,
+        sales_count=F('sales_count') + sales,
+        view_count=F('view_count') + views,
+    )
+
+
+def record_sale(product_id):
+    """
+    Soma uma venda à pontuação de tendência do produto (webhook do Stripe).
+    """
+    if not _add_events([product_id], settings.TRENDING_SALE_WEIGHT, sales=1):
+        # Produto anterior à tabela de popularidade
+        ProductPopularity.objects.get_or_create(product_id=product_id)
+        _add_events([product_id], settings.TRENDING_SALE_WEIGHT, sales=1)
+
+
+def add_views(views, day=None):
+    """
+    Grava {product_id: visualizações} com duas queries, independentemente do
+    número de produtos: um UPDATE ... FROM (VALUES ...) nos contadores de
+    tendência e um upsert na tabela diária.
+    """
+    if not views:
+        return 0
+    day = day or timezone.localdate()
+    rows = sorted(views.items())
+    values = ', '.join(['(%s, %s)'] * len(rows))
+    params = [value for row in rows for value in row]
+    popularity = ProductPopularity._meta.db_table
+    daily = ProductViewDaily._meta.db_table
+    products = Product._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {popularity} AS p
+            SET view_count = p.view_count + v.views, score = p.score + v.views * %s
+            FROM (VALUES {values}) AS v(product_id, views)
+            WHERE p.product_id = v.product_id
+            """,
+            [settings.TRENDING_VIEW_WEIGHT, *params],
+        )
+        # Produtos apagados entretanto são ignorados
+        cursor.execute(
+            f"""
+            INSERT INTO {daily} (product_id, day, count)
+            SELECT v.product_id, %s, v.views
+            FROM (VALUES {values}) AS v(product_id, views)
+            JOIN {products} AS product ON product.id = v.product_id
+            ON CONFLICT (product_id, day) DO UPDATE SET count = {daily}.count + EXCLUDED.count
+            """,
+            [day, *params],
+        )
+    return len(rows)
+
+
+class ViewBuffer:
+    """
+    Acumula visualizações em memória e grava-as em lote quando chegam a
+    TRENDING_VIEW_FLUSH_SIZE ou ao fim de TRENDING_VIEW_FLUSH_SECONDS. Um
+    crash perde no máximo esse intervalo de contagens.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = Counter()
+        self.started = time.monotonic()
+        self.timer = None
+
+    def add(self, product_id):
+        with self.lock:
+            if not self.views:
+                self.started = time.monotonic()
+                self.schedule()
+            self.views[product_id] += 1
+            due = (
+                sum(self.views.values()) >= settings.TRENDING_VIEW_FLUSH_SIZE
+                or time.monotonic() - self.started >= settings.TRENDING_VIEW_FLUSH_SECONDS
+            )
+        if due:
+            self.flush()
+
+    def schedule(self):
+        # Garante o flush periódico mesmo que deixem de chegar visualizações
+        if settings.BACKGROUND_TASKS_ASYNC and (self.timer is None or not self.timer.is_alive()):
+            self.timer = threading.Timer(settings.TRENDING_VIEW_FLUSH_SECONDS, self._flush_in_background)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def _flush_in_background(self):
+        close_old_connections()
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Error flushing product views: {e}", exc_info=True)
+        finally:
+            close_old_connections()
+
+    def flush(self):
+        with self.lock:
+            views, self.views = self.views, Counter()
+        try:
+            return add_views(views)
+        except Exception:
+            # Devolve as contagens ao buffer para o próximo flush
+            with self.lock:
+                self.views.update(views)
+            raise
+
+
+view_buffer = ViewBuffer()
+
+
+def record_view(product_id):
+    view_buffer.add(int(product_id))
+
+
+def decay_scores(half_life_hours=None, now=None):
+    """
+    Aplica o decaimento exponencial a todas as pontuações, proporcional ao
+    tempo decorrido desde o último decaimento de cada linha.
+    """
+    half_life = (half_life_hours or settings.TRENDING_HALF_LIFE_HOURS) * 3600
+    now = now or timezone.now()
+    elapsed = Extract(
+        ExpressionWrapper(Value(now, output_field=DateTimeField()) - F('decayed_at'), output_field=DurationField()),
+        'epoch',
+    )
+    return ProductPopularity.objects.filter(score__gt=0, decayed_at__lt=now).update(
+        score=F('score') * Power(Value(0.5), elapsed / half_life),
+        decayed_at=now,
+    )
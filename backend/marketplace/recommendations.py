@@ -0,0 +1,88 @@
+# marketplace/recommendations.py
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+
+from .models import Order, ProductCoPurchase
+
+
+# Uma compra conta a partir do momento em que o Stripe confirma o pagamento
+PURCHASED = Q(payment_status='succeeded')
+
+
+def co_purchase_counts(product_ids, top_k=None):
+    """
+    Para cada produto de `product_ids`, os `top_k` produtos mais comprados
+    pelos mesmos compradores, como linhas (product_id, neighbor, count).
+    A contagem e o ranking são feitos no PostgreSQL (self-join de Order por
+    comprador + ROW_NUMBER), por isso a memória usada só depende do lote.
+    """
+    top_k = top_k or settings.RECOMMENDATIONS_TOP_K
+    other_product = Q(buyer__orders__product_id__gt=F('product_id')) | Q(buyer__orders__product_id__lt=F('product_id'))
+    return (
+        Order.objects
+        .filter(PURCHASED, Q(product_id__in=product_ids, buyer__orders__payment_status='succeeded') & other_product)
+        .values('product_id', neighbor=F('buyer__orders__product_id'))
+        .annotate(count=Count('buyer_id', distinct=True))
+        .annotate(rank=Window(RowNumber(), partition_by=F('product_id'), order_by=[F('count').desc(), F('neighbor').asc()]))
+        .filter(rank__lte=top_k)
+        .values_list('product_id', 'neighbor', 'count')
+    )
+
+
+def rebuild_co_purchases(product_ids, top_k=None):
+    """
+    Substitui os vizinhos guardados dos produtos do lote pelos calculados.
+    """
+    rows = [
+        ProductCoPurchase(product_id=product_id, recommended_id=neighbor, count=count)
+        for product_id, neighbor, count in co_purchase_counts(product_ids, top_k)
+    ]
+    with transaction.atomic():
+        ProductCoPurchase.objects.filter(product_id__in=product_ids).delete()
+        ProductCoPurchase.objects.bulk_create(rows)
+    return len(rows)
+
+
+def trim_co_purchases(product_ids, top_k=None):
+    # Mantém apenas os top_k vizinhos de cada produto
+    top_k = top_k or settings.RECOMMENDATIONS_TOP_K
+    overflow = (
+        ProductCoPurchase.objects.filter(product_id__in=product_ids)
+        .annotate(rank=Window(RowNumber(), partition_by=F('product_id'), order_by=[F('count').desc(), F('recommended_id').asc()]))
+        .filter(rank__gt=top_k)
+        .values_list('pk', flat=True)
+    )
+    return ProductCoPurchase.objects.filter(pk__in=list(overflow)).delete()[0]
+
+
+def record_co_purchase(buyer_id, product_id):
+    """
+    Atualização incremental a partir de uma nova encomenda paga: soma 1 ao
+    par (produto, outro produto do comprador) nos dois sentidos. O resultado
+    é aproximado para pares fora do top-K; o rebuild periódico
+    (build_co_purchases) repõe as contagens exatas.
+    """
+    purchased = Order.objects.filter(PURCHASED, buyer_id=buyer_id)
+    if buyer_id is None or purchased.filter(product_id=product_id).count() > 1:
+        # Convidado ou recompra: o número de compradores em comum não muda
+        return 0
+    others = list(purchased.exclude(product_id=product_id).values_list('product_id', flat=True).distinct())
+    if not others:
+        return 0
+
+    pairs = {(product_id, other) for other in others} | {(other, product_id) for other in others}
+    with transaction.atomic():
+        existing = ProductCoPurchase.objects.filter(
+            Q(product_id=product_id, recommended_id__in=others) | Q(product_id__in=others, recommended_id=product_id)
+        )
+        found = set(existing.values_list('product_id', 'recommended_id'))
+        existing.update(count=F('count') + 1)
+        ProductCoPurchase.objects.bulk_create(
+            [ProductCoPurchase(product_id=a, recommended_id=b, count=1) for a, b in pairs - found],
+            ignore_conflicts=True,
+        )
+        trim_co_purchases([product_id, *others])
+    return len(pairs)
@@ -0,0 +1,160 @@
+# marketplace/resize.py
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+
+from .imaging import resize_cover
+
+logger = logging.getLogger(__name__)
+
+
+class ResizeCache:
+    """
+    Cache em disco das imagens redimensionadas a pedido, limitada a
+    MEDIA_RESIZE_CACHE_MAX_BYTES. O mtime de cada ficheiro marca o último
+    acesso; quando o total passa o limite, os menos usados são apagados.
+    As escritas são atómicas (ficheiro temporário + os.replace), por isso
+    vários processos podem partilhar o mesmo diretório.
+    """
+
+    # Depois de uma limpeza o total fica abaixo desta fração do limite
+    LOW_WATER = 0.9
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.render_locks = defaultdict(threading.Lock)
+        self.size = None
+        self.measured = None
+        self.hits = 0
+        self.misses = 0
+
+    def get_directory(self):
+        return str(self.directory or settings.MEDIA_RESIZE_CACHE_DIR)
+
+    def get_max_bytes(self):
+        return self.max_bytes or settings.MEDIA_RESIZE_CACHE_MAX_BYTES
+
+    def path(self, key):
+        return os.path.join(self.get_directory(), key)
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, data):
+        path = self.path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=directory, prefix='.resize-')
+        try:
+            with os.fdopen(descriptor, 'wb') as output:
+                output.write(data)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+        with self.lock:
+            if self.size is None or self.measured != self.get_directory():
+                # Primeira escrita deste processo: mede o que já está em disco
+                self.size = self.disk_usage()
+                self.measured = self.get_directory()
+            else:
+                self.size += len(data)
+            over = self.size > self.get_max_bytes()
+        if over:
+            self.evict(keep=path)
+        return path
+
+    def entries(self):
+        for root, _, files in os.walk(self.get_directory()):
+            for name in files:
+                if name.startswith('.resize-'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield stat.st_mtime, stat.st_size, path
+
+    def disk_usage(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep=None):
+        """
+        Apaga os ficheiros menos usados (exceto `keep`, o que acabou de ser
+        escrito) até o total ficar abaixo de LOW_WATER do limite. Lê o
+        diretório de novo, porque outros processos também escrevem nele.
+        """
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.get_max_bytes() * self.LOW_WATER
+        removed = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            if path == keep:
+                continue
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        with self.lock:
+            self.size = total
+        logger.info(f"Resize cache evicted {removed} files; {total} bytes in use.")
+        return removed
+
+    def fetch(self, key, render):
+        """
+        Caminho do ficheiro em cache para `key`, gerado com `render()` se
+        faltar. Pedidos simultâneos do mesmo ficheiro geram-no uma só vez.
+        """
+        path = self.get(key)
+        if path:
+            self.hits += 1
+            return path
+        try:
+            with self.render_locks[key]:
+                path = self.get(key)
+                if path:
+                    self.hits += 1
+                    return path
+                self.misses += 1
+                return self.put(key, render())
+        finally:
+            self.render_locks.pop(key, None)
+
+
+resize_cache = ResizeCache()
+
+
+def allowed_size(width, height):
+    return f'{width}x{height}' in settings.MEDIA_RESIZE_SIZES
+
+
+def cache_key(media, width, height, extension):
+    # O nome do ficheiro muda quando a imagem é reprocessada: a versão antiga deixa de ser servida
+    version = hashlib.sha1(media.image.name.encode()).hexdigest()[:12]
+    return f'{media.pk}/{width}x{height}-{version}.{extension}'
+
+
+def resized_path(media, width, height, extension, name):
+    def render():
+        with media.image.open('rb') as source:
+            return resize_cover(source.read(), width, height, name, settings.IMAGE_MAX_PIXELS)
+
+    return resize_cache.fetch(cache_key(media, width, height, extension), render)
@@ -4,6 +4,8 @@ from rest_framework import serializers
 from rest_framework.reverse import reverse
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db.models import Prefetch
+from django.db.models.functions import Substr
 from .models import Product, Order, Notification, Rating, Media, Wishlist
 from storage.models import ProjectFile
 from storage.serializers import ProjectFileSerializer
@@ -14,6 +16,75 @@ from io import BytesIO
 User = get_user_model()
 
 
+def _split_param(value):
+    return {item.strip() for item in (value or '').split(',') if item.strip()}
+
+
+class SparseFieldsetsMixin:
+    """
+    ?fields=a,b devolve apenas esses campos e ?expand=x,y acrescenta (ou troca)
+    os campos pesados declarados em `expandable_fields`. prepare_queryset()
+    ajusta only/select_related/prefetch_related aos campos escolhidos.
+    """
+    # nome -> callable que devolve o campo expandido
+    expandable_fields = {}
+    # nome -> colunas necessárias, quando o source não é uma coluna do modelo
+    field_columns = {}
+    # nome -> expressão anotada no queryset
+    field_annotations = {}
+    select_related_fields = {}
+    prefetch_related_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None:
+            return
+
+        params = request.query_params
+        for name in _split_param(params.get('expand')) & set(self.expandable_fields):
+            self.fields[name] = self.expandable_fields[name]()
+
+        requested = _split_param(params.get('fields'))
+        if requested:
+            for name in list(self.fields):
+                if name not in requested:
+                    self.fields.pop(name)
+
+    def prepare_queryset(self, queryset):
+        model = queryset.model
+        concrete = {field.name for field in model._meta.concrete_fields}
+        columns = {model._meta.pk.name}
+        annotations = {}
+        select_related = []
+        prefetch_related = {}
+
+        for name, field in self.fields.items():
+            if name in self.field_columns:
+                columns.update(self.field_columns[name])
+            elif field.source in concrete:
+                columns.add(field.source)
+
+            if name in self.field_annotations:
+                annotations[name] = self.field_annotations[name]()
+            if name in self.select_related_fields:
+                select_related.append(self.select_related_fields[name])
+            if name in self.prefetch_related_fields:
+                lookup = self.prefetch_related_fields[name]
+                nested = getattr(field, 'child', field)
+                if isinstance(nested, SparseFieldsetsMixin):
+                    related_model = model._meta.get_field(lookup).related_model
+                    related = nested.prepare_queryset(related_model._default_manager.all())
+                    prefetch_related[lookup] = Prefetch(lookup, queryset=related)
+                else:
+                    prefetch_related.setdefault(lookup, lookup)
+
+        # select_related() sem argumentos seguiria todas as FKs
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        return queryset.prefetch_related(*prefetch_related.values()).only(*columns).annotate(**annotations)
+
+
 class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
@@ -36,13 +107,28 @@ class OrderSerializer(serializers.ModelSerializer):
 
 
 
+def image_srcset(variants, request=None):
+    """
+    srcset de cada formato a partir de Media.variants, do formato preferido
+    para o fallback, ex: {"webp": ".../a_320w.webp 320w, .../a_640w.webp 640w"}.
+    """
+    storage = Media._meta.get_field('image').storage
+    candidates = {}
+    for fmt, width, _, name in variants or ():
+        url = storage.url(name)
+        url = request.build_absolute_uri(url) if request else url
+        candidates.setdefault(fmt, []).append(f'{url} {width}w')
+    return {fmt: ', '.join(entries) for fmt, entries in candidates.items()}
+
+
 class MediaSerializer(serializers.ModelSerializer):
     url = serializers.SerializerMethodField()
     thumbnail_url = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Media
-        fields = ['id', 'type', 'url', 'thumbnail_url', 'is_primary', 'created_at']
+        fields = ['id', 'type', 'url', 'thumbnail_url', 'srcset', 'is_primary', 'status', 'created_at']
         read_only_fields = fields
 
     def get_url(self, obj):
@@ -56,6 +142,9 @@ class MediaSerializer(serializers.ModelSerializer):
         if obj.thumbnail and request:
             return request.build_absolute_uri(obj.thumbnail.url)
         return None
+
+    def get_srcset(self, obj):
+        return image_srcset(obj.variants, self.context.get('request'))
     
     def validate_type(self, value):
         if value not in [Media.IMAGE, Media.VIDEO]:
@@ -99,20 +188,27 @@ class MediaSerializer(serializers.ModelSerializer):
     
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class SellerSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ('full_name', 'username', 'country')
+
+
+class ProductSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     seller = UserSerializer(read_only=True)
     media = serializers.SerializerMethodField()
     rating = serializers.SerializerMethodField()
+    rating_histogram = serializers.ReadOnlyField()
     files = ProjectFileSerializer(many=True, read_only=True)
     
     class Meta:
         model = Product
         fields = [
             'id', 'seller', 'title', 'description', 'category', 'language',
-            'price', 'created_at', 'rating', 'media', 'files',
+            'price', 'created_at', 'rating', 'rating_count', 'rating_histogram', 'media', 'files',
             'published', 'pending_publication'
         ]
-        read_only_fields = ['seller', 'published', 'pending_publication', 'files']
+        read_only_fields = ['seller', 'published', 'pending_publication', 'files', 'rating_count']
         extra_kwargs = {
             'title': {'required': True, 'allow_blank': False, 'min_length': 3},
             'description': {'required': True, 'allow_blank': False, 'min_length': 10},
@@ -121,6 +217,13 @@ class ProductSerializer(serializers.ModelSerializer):
             'price': {'required': True, 'min_value': 0}
         }
 
+    field_columns = {
+        'rating': ['rating_count', 'rating_average'],
+        'rating_histogram': [f'rating_{score}_count' for score in range(1, 6)],
+    }
+    select_related_fields = {'seller': 'seller'}
+    prefetch_related_fields = {'media': 'media', 'files': 'files'}
+
     def validate(self, data):
         """
         Validação mais flexível dos dados do produto
@@ -171,21 +274,128 @@ class ProductSerializer(serializers.ModelSerializer):
         return value
         
 
-class OrderSerializer(serializers.ModelSerializer):
+class ProductCardSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
+    """
+    Representação compacta usada nas listagens (cards): sem descrição
+    completa, galeria, ficheiros nem perfil completo do vendedor.
+    """
+    summary = serializers.CharField(read_only=True)
+    rating = serializers.SerializerMethodField()
+    image_url = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
+    thumbnail_width = serializers.IntegerField(source='primary_thumbnail_width', read_only=True)
+    thumbnail_height = serializers.IntegerField(source='primary_thumbnail_height', read_only=True)
+    srcset = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Product
+        fields = [
+            'id', 'title', 'summary', 'category', 'language', 'price',
+            'rating', 'rating_count', 'image_url', 'thumbnail_url',
+            'thumbnail_width', 'thumbnail_height', 'srcset', 'created_at',
+        ]
+        read_only_fields = fields
+
+    SUMMARY_LENGTH = 160
+
+    expandable_fields = {
+        'seller': lambda: SellerSummarySerializer(read_only=True),
+        'media': lambda: serializers.SerializerMethodField(method_name='get_media'),
+    }
+    field_columns = {
+        'rating': ['rating_count', 'rating_average'],
+        'seller': ['seller__full_name', 'seller__username', 'seller__country'],
+        'image_url': ['primary_image'],
+        'thumbnail_url': ['primary_thumbnail', 'primary_image'],
+        'srcset': ['primary_variants'],
+    }
+    field_annotations = {
+        'summary': lambda: Substr('description', 1, ProductCardSerializer.SUMMARY_LENGTH),
+    }
+    select_related_fields = {'seller': 'seller'}
+    prefetch_related_fields = {'media': 'media'}
+
+    def get_rating(self, obj):
+        return obj.average_rating()
+
+    def _absolute(self, field):
+        # Colunas desnormalizadas do Product: não é preciso carregar a galeria
+        if not field:
+            return None
+        request = self.context.get('request')
+        return request.build_absolute_uri(field.url) if request else field.url
+
+    def get_image_url(self, obj):
+        return self._absolute(obj.primary_image)
+
+    def get_thumbnail_url(self, obj):
+        return self._absolute(obj.primary_thumbnail or obj.primary_image)
+
+    def get_srcset(self, obj):
+        return image_srcset(obj.primary_variants, self.context.get('request'))
+
+    def get_media(self, obj):
+        return MediaSerializer(obj.media.all(), many=True, context=self.context).data
+
+
+class SellerProductCardSerializer(ProductCardSerializer):
+    """
+    Card da listagem do próprio vendedor: acrescenta o estado de publicação
+    e a descrição, usados pelo painel "Os meus produtos" (badge e edição).
+    """
+    class Meta(ProductCardSerializer.Meta):
+        fields = ProductCardSerializer.Meta.fields + ['description', 'published', 'pending_publication']
+        read_only_fields = fields
+
+
+class ProductSearchSerializer(ProductSerializer):
+    rank = serializers.FloatField(read_only=True)
+    headline = serializers.CharField(read_only=True)
+
+    class Meta(ProductSerializer.Meta):
+        fields = ProductSerializer.Meta.fields + ['rank', 'headline']
+
+
+class OrderSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     buyer = UserSerializer(read_only=True)
-    product = ProductSerializer(read_only=True)
+    product = ProductCardSerializer(read_only=True)
 
     class Meta:
         model = Order
         fields = ['id', 'buyer', 'product', 'status', 'created_at']
 
+    expandable_fields = {'product': lambda: ProductSerializer(read_only=True)}
+    select_related_fields = {'buyer': 'buyer'}
+    prefetch_related_fields = {'product': 'product'}
+
+
+class SaleSerializer(serializers.ModelSerializer):
+    """
+    Venda vista pelo vendedor: só o título do produto e o nome do comprador,
+    lidos no mesmo SELECT (select_related + only).
+    """
+    product_title = serializers.CharField(source='product.title', read_only=True)
+    buyer_name = serializers.CharField(source='buyer.full_name', read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ['id', 'product', 'product_title', 'buyer_name', 'status', 'payment_status', 'created_at', 'paid_at']
+        read_only_fields = fields
+
+    @staticmethod
+    def prepare_queryset(queryset):
+        return queryset.select_related('product', 'buyer').only(
+            'id', 'product', 'product__title', 'buyer', 'buyer__full_name',
+            'status', 'payment_status', 'created_at', 'paid_at',
+        )
+
 
 class NotificationSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
 
     class Meta:
         model = Notification
-        fields = ['id', 'user', 'content', 'is_read', 'created_at']
+        fields = ['id', 'user', 'product', 'content', 'is_read', 'created_at']
 
 
 class RatingSerializer(serializers.ModelSerializer):
@@ -198,10 +408,14 @@ class RatingSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'product', 'score', 'comment']
 
 
-class WishlistSerializer(serializers.ModelSerializer):
+class WishlistSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
-    products = ProductSerializer(many=True, read_only=True)
+    products = ProductCardSerializer(many=True, read_only=True)
 
     class Meta:
         model = Wishlist
         fields = ['id', 'user', 'products']
+
+    expandable_fields = {'products': lambda: ProductSerializer(many=True, read_only=True)}
+    select_related_fields = {'user': 'user'}
+    prefetch_related_fields = {'products': 'products'}
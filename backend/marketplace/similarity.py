@@ -0,0 +1,412 @@
+# marketplace/similarity.py
+
+import fcntl
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from heapq import nlargest
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .cache import bump_catalog_version
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+
+# Formato do ficheiro: cabeçalho + um registo de tamanho fixo por produto,
+# ordenados por product_id (pesquisa binária diretamente sobre o mmap).
+MAGIC = b'SIM1'
+HEADER = struct.Struct('<4sIId')  # magic, K, número de registos, timestamp do build
+RECORD_ID = struct.Struct('<Q')   # product_id (BigAutoField)
+NEIGHBOR = struct.Struct('<Qf')   # product_id do vizinho (0 = vazio), cosseno
+
+TOKEN_RE = re.compile(r'[^\W\d_]{2,}')
+STOPWORDS = frozenset(
+    'the and for with that this from your you are can will our not all has have its into more '
+    'uma para com que por dos das nos nas seu sua como mais ser são pelo pela'.split()
+)
+TITLE_WEIGHT = 2
+# Peso das features one-hot (categoria/linguagem) face ao texto normalizado
+FEATURE_WEIGHT = 0.5
+# Termos presentes em mais desta fração dos produtos não distinguem nada
+MAX_DF = 0.5
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+def _normalize(vector):
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    return {term: weight / norm for term, weight in vector.items()} if norm else {}
+
+
+def count_terms(rows):
+    """
+    Documentos {id: (Counter de termos, features)} a partir de (id, title,
+    description, category, language). É a única parte que tokeniza texto,
+    por isso o recálculo incremental só a corre para os produtos alterados.
+    """
+    documents = {}
+    for pk, title, description, category, language in rows:
+        terms = Counter(tokenize(description))
+        for token in tokenize(title):
+            terms[token] += TITLE_WEIGHT
+        documents[pk] = (terms, (f'category:{category}', f'language:{language}'))
+    return documents
+
+
+def vectorize(documents):
+    """
+    Vetores TF-IDF esparsos (dict termo -> peso, norma 1) dos documentos, com
+    as features one-hot de categoria e linguagem acrescentadas ao texto.
+    """
+    document_frequency = Counter()
+    for terms, _ in documents.values():
+        document_frequency.update(terms.keys())
+
+    total = len(documents)
+    idf = {
+        term: math.log((1 + total) / (1 + df)) + 1
+        for term, df in document_frequency.items()
+        if total < 10 or df <= MAX_DF * total
+    }
+
+    vectors = {}
+    for pk, (terms, features) in documents.items():
+        vector = _normalize({
+            term: (1 + math.log(count)) * idf[term]
+            for term, count in terms.items() if term in idf
+        })
+        for feature in features:
+            vector[feature] = FEATURE_WEIGHT
+        vectors[pk] = _normalize(vector)
+    return vectors
+
+
+def is_feature(term):
+    # Features one-hot (category:/language:); os tokens do texto não têm ':'
+    return ':' in term
+
+
+def build_postings(vectors):
+    # Índice invertido: termo -> [(product_id, peso)], só com os termos do
+    # texto. Uma feature juntaria toda a categoria/linguagem numa só lista
+    postings = defaultdict(list)
+    for pk, vector in vectors.items():
+        for term, weight in vector.items():
+            if not is_feature(term):
+                postings[term].append((pk, weight))
+    return postings
+
+
+def similarity_scores(vector, postings, vectors):
+    """
+    Produto esparso vetor x matriz: só percorre produtos com termos do texto
+    em comum. As features de categoria/linguagem só somam a esses candidatos.
+    """
+    scores = defaultdict(float)
+    features = {}
+    for term, weight in vector.items():
+        if is_feature(term):
+            features[term] = weight
+            continue
+        for pk, other in postings.get(term, ()):
+            scores[pk] += weight * other
+    for pk in scores:
+        candidate = vectors[pk]
+        scores[pk] += sum(weight * candidate.get(term, 0) for term, weight in features.items())
+    return scores
+
+
+def catalog_rows(ids=None):
+    queryset = Product.objects.published()
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+    return queryset.values_list('id', 'title', 'description', 'category', 'language').iterator(chunk_size=2000)
+
+
+class SimilarityIndex:
+    """
+    Leitor do ficheiro de vizinhos. O mmap é partilhado entre pedidos e
+    reaberto quando o indexador substitui o ficheiro.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.mapped = None
+        self.stamp = None
+
+    def get_path(self):
+        return self.path or settings.SIMILAR_PRODUCTS_INDEX
+
+    def _open(self):
+        path = self.get_path()
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            if stamp != self.stamp:
+                # O mmap anterior fecha-se sozinho quando nenhum pedido o usar
+                self.mapped = None
+                if stat.st_size >= HEADER.size:
+                    with open(path, 'rb') as index_file:
+                        self.mapped = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+                self.stamp = stamp
+            return self.mapped
+
+    def _layout(self, mapped):
+        magic, top_k, count, built_at = HEADER.unpack_from(mapped, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Invalid similarity index: {self.get_path()}")
+        return top_k, count, RECORD_ID.size + top_k * NEIGHBOR.size, built_at
+
+    def built_at(self):
+        mapped = self._open()
+        return self._layout(mapped)[3] if mapped else None
+
+    def neighbors(self, product_id):
+        """
+        Lista [(product_id, cosseno)] do produto, ou None se não estiver indexado.
+        """
+        mapped = self._open()
+        if mapped is None:
+            return None
+        top_k, count, record_size, _ = self._layout(mapped)
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            offset = HEADER.size + middle * record_size
+            current = RECORD_ID.unpack_from(mapped, offset)[0]
+            if current == product_id:
+                return [
+                    (neighbor, score)
+                    for neighbor, score in NEIGHBOR.iter_unpack(mapped[offset + RECORD_ID.size:offset + record_size])
+                    if neighbor
+                ]
+            if current < product_id:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def read_all(self):
+        mapped = self._open()
+        if mapped is None:
+            return {}
+        top_k, count, record_size, _ = self._layout(mapped)
+        result = {}
+        for index in range(count):
+            offset = HEADER.size + index * record_size
+            product_id = RECORD_ID.unpack_from(mapped, offset)[0]
+            result[product_id] = [
+                (neighbor, score)
+                for neighbor, score in NEIGHBOR.iter_unpack(mapped[offset + RECORD_ID.size:offset + record_size])
+                if neighbor
+            ]
+        return result
+
+    def get_documents_path(self):
+        return f'{self.get_path()}.terms'
+
+    @contextmanager
+    def locked(self):
+        """
+        Lock exclusivo entre processos (flock num ficheiro ao lado do índice):
+        os workers web e o comando nunca recalculam ao mesmo tempo, por isso
+        nenhum escreve o índice a partir de um estado já ultrapassado.
+        """
+        path = f'{self.get_path()}.lock'
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # Fechar o ficheiro liberta o lock
+            yield
+
+    def _replace(self, path, write):
+        # Ficheiro temporário + rename: os leitores nunca veem um ficheiro parcial
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=directory, prefix='.similar-')
+        try:
+            with os.fdopen(descriptor, 'wb') as output:
+                write(output)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def write(self, neighbors, top_k, built_at):
+        """
+        Escreve o índice num ficheiro temporário e substitui-o atomicamente,
+        para que os leitores nunca vejam um ficheiro parcial.
+        """
+        empty = NEIGHBOR.pack(0, 0.0)
+
+        def write(index_file):
+            index_file.write(HEADER.pack(MAGIC, top_k, len(neighbors), built_at))
+            for product_id in sorted(neighbors):
+                items = neighbors[product_id][:top_k]
+                index_file.write(RECORD_ID.pack(product_id))
+                index_file.write(b''.join(NEIGHBOR.pack(pk, score) for pk, score in items))
+                index_file.write(empty * (top_k - len(items)))
+
+        self._replace(self.get_path(), write)
+
+    def read_documents(self):
+        """
+        Termos de cada produto guardados no último recálculo, ou None se não
+        existirem ou não corresponderem ao índice atual (build completo).
+        """
+        try:
+            with open(self.get_documents_path(), 'rb') as documents_file:
+                state = json.load(documents_file)
+        except (FileNotFoundError, ValueError):
+            return None
+        if state.get('built_at') != self.built_at():
+            return None
+        return {
+            int(pk): (Counter(terms), tuple(features))
+            for pk, (terms, features) in state['documents'].items()
+        }
+
+    def write_documents(self, documents, built_at):
+        state = {'built_at': built_at, 'documents': documents}
+        self._replace(self.get_documents_path(), lambda output: output.write(json.dumps(state, separators=(',', ':')).encode()))
+
+
+similarity_index = SimilarityIndex()
+
+
+def refresh_similar_products(changed_ids=None, top_k=None, index=None):
+    """
+    Recalcula os vizinhos TF-IDF. Sem `changed_ids` reconstrói tudo; com uma
+    lista, só tokeniza e pontua esses produtos (os termos dos restantes vêm
+    do ficheiro .terms) e atualiza a sua posição nas listas dos outros (sem
+    reabrir vagas fora do top-K, que o próximo build completo repõe). Sem
+    índice ou sem .terms faz um build completo. Devolve o número de produtos
+    recalculados.
+    """
+    index = index or similarity_index
+    top_k = top_k or settings.SIMILAR_PRODUCTS_TOP_K
+    with index.locked():
+        started = time.time()
+        documents = index.read_documents() if changed_ids is not None else None
+        if documents is None:
+            changed = None
+            documents = count_terms(catalog_rows())
+        else:
+            changed = set(changed_ids)
+            # Só ids: despublicados/apagados saem, publicados em falta entram
+            published = set(Product.objects.published().values_list('pk', flat=True))
+            for pk in set(documents) - published:
+                del documents[pk]
+            changed |= published - set(documents)
+            for pk in changed:
+                documents.pop(pk, None)
+            documents.update(count_terms(catalog_rows(changed & published)))
+
+        vectors = vectorize(documents)
+        postings = build_postings(vectors)
+        if changed is None:
+            neighbors = {}
+            targets = list(vectors)
+        else:
+            neighbors = {
+                pk: [(other, score) for other, score in items if other in vectors and other not in changed]
+                for pk, items in index.read_all().items()
+                if pk in vectors
+            }
+            targets = [pk for pk in changed if pk in vectors]
+
+        for pk in targets:
+            scores = similarity_scores(vectors[pk], postings, vectors)
+            scores.pop(pk, None)
+            best = nlargest(top_k, scores.items(), key=lambda item: (item[1], -item[0]))
+            neighbors[pk] = best
+            if changed is not None:
+                # Similaridade é simétrica: o produto alterado pode entrar nas listas dos outros
+                for other, score in scores.items():
+                    if other not in neighbors or other in changed:
+                        continue
+                    items = neighbors[other]
+                    items.append((pk, score))
+                    items.sort(key=lambda item: (-item[1], item[0]))
+                    del items[top_k:]
+
+        for pk in vectors:
+            neighbors.setdefault(pk, [])
+        index.write(neighbors, top_k, started)
+        index.write_documents(documents, started)
+    bump_catalog_version()
+    logger.info(f"Similar products refreshed for {len(targets)} of {len(vectors)} products in {time.time() - started:.2f}s.")
+    return len(targets)
+
+
+_pending = set()
+_pending_lock = threading.Lock()
+_timer = None
+
+
+def _refresh_pending():
+    global _timer
+    with _pending_lock:
+        changed = sorted(_pending)
+        _pending.clear()
+        _timer = None
+    if not changed:
+        return
+    try:
+        # Serializado com os outros workers e o comando por SimilarityIndex.locked()
+        refresh_similar_products(changed)
+    except Exception as e:
+        logger.error(f"Error refreshing similar products {changed}: {e}", exc_info=True)
+
+
+def _run_pending():
+    close_old_connections()
+    try:
+        _refresh_pending()
+    finally:
+        close_old_connections()
+
+
+def schedule_similarity_refresh(product_id):
+    """
+    Agenda, depois do commit, o recálculo dos vizinhos do produto. As
+    alterações são agrupadas durante SIMILAR_PRODUCTS_REFRESH_DELAY segundos
+    num único recálculo incremental em segundo plano, em vez de um por
+    gravação. Com 0 ficam para build_similar_products --changed.
+    """
+    def start():
+        global _timer
+        delay = settings.SIMILAR_PRODUCTS_REFRESH_DELAY
+        if not settings.BACKGROUND_TASKS_ASYNC:
+            with _pending_lock:
+                _pending.add(product_id)
+            _refresh_pending()
+            return
+        if delay <= 0:
+            return
+        with _pending_lock:
+            _pending.add(product_id)
+            if _timer is None:
+                _timer = threading.Timer(delay, _run_pending)
+                _timer.daemon = True
+                _timer.start()
+
+    transaction.on_commit(start)
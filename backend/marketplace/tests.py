@@ -1,3 +1,1018 @@
-from django.test import TestCase
+import base64
+import fcntl
+import json
+import os
+import shutil
+from datetime import timedelta
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+import asyncio
+
+from accounts.models import User
+from storage.models import ProjectFile
+from .models import Product, ProductPopularity, ProductViewDaily, Media, Rating, Order, Wishlist, Notification
+from .notifications import fan_out
+from .events import broker
+from .media_pipeline import claim_media, get_pool, process_pending
+from .popularity import record_sale, record_view, view_buffer
+from .resize import resize_cache
+from .recommendations import record_co_purchase
+from .similarity import refresh_similar_products, similarity_index, tokenize
+
+
+@override_settings(
+    BACKGROUND_TASKS_ASYNC=False,
+    NOTIFICATIONS_STREAM_BACKEND='local',
+    SIMILAR_PRODUCTS_INDEX=os.path.join(tempfile.gettempdir(), 'codebay-test-similar.idx'),
+)
+class MarketplaceTestCase(TestCase):
+    def setUp(self):
+        # O cache do catálogo não é revertido com a transação do teste
+        cache.clear()
+        self.client = APIClient()
+
+
+def create_user(email, **extra):
+    extra.setdefault('full_name', email.split('@')[0])
+    return User.objects.create_user(email=email, **extra)
+
+
+def create_product(seller, **extra):
+    data = {
+        'title': 'Produto',
+        'description': 'Descrição do produto',
+        'category': 'bot',
+        'language': 'python',
+        'price': '10.00',
+        'published': True,
+    }
+    data.update(extra)
+    return Product.objects.create(seller=seller, **data)
+
+
+class PublicProductListQueryCountTests(MarketplaceTestCase):
+    def setUp(self):
+        super().setUp()
+        raters = [create_user(f'rater{i}@example.com') for i in range(3)]
+        for i in range(100):
+            seller = create_user(f'seller{i}@example.com')
+            product = create_product(seller, title=f'Produto {i}')
+            Media.objects.create(product=product, type=Media.VIDEO, video_url='https://example.com/v')
+            ProjectFile.objects.create(user=seller, product=product, title='main', file_url='https://example.com/f')
+            for score, rater in enumerate(raters, start=3):
+                Rating.objects.create(user=rater, product=product, score=score)
+
+    def test_listing_uses_constant_number_of_queries(self):
+        # MAX(updated_at) para o ETag + produtos; a imagem está no próprio Product
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('public-products'), {'page_size': 100})
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual(len(results), 100)
+        self.assertEqual(results[0]['rating'], 4)
+        self.assertEqual(results[0]['rating_count'], 3)
+
+    def test_expanded_listing_stays_constant(self):
+        # O seller vem no mesmo SELECT (join), os files não são pedidos
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('public-products'), {'page_size': 100, 'expand': 'seller,media'})
+        card = response.data['results'][0]
+        self.assertEqual(set(card['seller']), {'full_name', 'username', 'country'})
+        self.assertEqual(len(card['media']), 1)
+
+
+class CatalogPaginationTests(MarketplaceTestCase):
+    def setUp(self):
+        super().setUp()
+        seller = create_user('seller@example.com')
+        self.products = [create_product(seller, title=f'Produto {i}') for i in range(5)]
+        # Dois produtos com o mesmo created_at para garantir o desempate por id
+        Product.objects.filter(pk=self.products[1].pk).update(created_at=self.products[2].created_at)
+        create_product(seller, title='Rascunho', published=False)
+
+    def test_walks_catalog_in_keyset_order(self):
+        seen = []
+        url = reverse('public-products')
+        params = {'page_size': 2}
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            seen.extend(item['id'] for item in response.data['results'])
+            url, params = response.data['next'], None
+
+        expected = list(
+            Product.objects.filter(published=True).order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_page_size_is_capped(self):
+        with self.settings(CATALOG_MAX_PAGE_SIZE=3):
+            response = self.client.get(reverse('public-products'), {'page_size': 1000})
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get(reverse('public-products'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_with_wrong_types_returns_404(self):
+        for position in (['notadate', 1], ['2024-01-01T00:00:00+00:00', 'x'], [{}, 1], [None, 1]):
+            cursor = base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+            response = self.client.get(reverse('public-products'), {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, position)
+
+
+class PublicProductSearchTests(MarketplaceTestCase):
+    def setUp(self):
+        super().setUp()
+        seller = create_user('seller@example.com')
+        self.title_match = create_product(seller, title='Stripe billing bot', description='Handles subscriptions for you.')
+        self.description_match = create_product(
+            seller, title='Invoice helper', description='Generates invoices and syncs them with Stripe.',
+            category='script', language='javascript',
+        )
+        create_product(seller, title='Stripe draft', description='Not published yet.', published=False)
+        create_product(seller, title='Weather API', description='Forecasts for any city.', category='api')
+
+    def search(self, **params):
+        return self.client.get(reverse('public-product-search'), params)
+
+    def test_ranks_title_matches_first_and_highlights(self):
+        response = self.search(q='stripe')
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([item['id'] for item in results], [self.title_match.id, self.description_match.id])
+        self.assertIn('<mark>Stripe</mark>', results[1]['headline'])
+
+        first = self.search(q='stripe', page_size=1)
+        second = self.client.get(first.data['next'])
+        self.assertEqual(second.data['results'][0]['id'], self.description_match.id)
+        self.assertIsNone(second.data['next'])
+
+    def test_combines_with_category_and_language_filters(self):
+        response = self.search(q='stripe', category='script', language='javascript')
+        self.assertEqual([item['id'] for item in response.data['results']], [self.description_match.id])
+
+    def test_search_vector_follows_title_changes(self):
+        self.title_match.title = 'Subscription bot'
+        self.title_match.save()
+        response = self.search(q='stripe')
+        self.assertEqual([item['id'] for item in response.data['results']], [self.description_match.id])
+
+    def test_requires_query_and_valid_choices(self):
+        self.assertEqual(self.search().status_code, 400)
+        self.assertEqual(self.search(q='stripe', category='nope').status_code, 400)
+
+
+class PublicProductFacetsTests(MarketplaceTestCase):
+    def setUp(self):
+        super().setUp()
+        seller = create_user('seller@example.com')
+        create_product(seller, category='bot', language='python', price='5.00')
+        create_product(seller, category='bot', language='go', price='20.00')
+        create_product(seller, category='api', language='python', price='150.00')
+        create_product(seller, category='api', language='python', price='8.00', published=False)
+
+    @staticmethod
+    def counts(data, facet):
+        return {option['value']: option['count'] for option in data[facet] if option['count']}
+
+    def test_counts_all_facets_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('public-product-facets'), {'category': 'bot'})
+        self.assertEqual(response.status_code, 200)
+        # A faceta filtrada mantém as contagens das alternativas
+        self.assertEqual(self.counts(response.data, 'category'), {'bot': 2, 'api': 1})
+        self.assertEqual(self.counts(response.data, 'language'), {'python': 1, 'go': 1})
+        self.assertEqual(self.counts(response.data, 'price'), {'under_10': 1, '10_50': 1})
+
+    def test_list_filters_by_price_band(self):
+        response = self.client.get(reverse('public-products'), {'price': ['under_10', '100_plus']})
+        self.assertEqual(sorted(item['price'] for item in response.data['results']), ['150.00', '5.00'])
+        self.assertEqual(self.client.get(reverse('public-products'), {'price': 'cheap'}).status_code, 400)
+
+
+class RatingAggregateTests(MarketplaceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.buyer = create_user('buyer@example.com')
+        self.client.force_authenticate(self.buyer)
+        seller = create_user('seller@example.com')
+        self.product = create_product(seller)
+        self.other = create_product(seller, title='Outro')
+        Rating.objects.create(user=seller, product=self.product, score=2)
+
+    def assertAggregates(self, product, count, rating_sum, histogram):
+        product.refresh_from_db()
+        self.assertEqual((product.rating_count, product.rating_sum), (count, rating_sum))
+        self.assertEqual(product.rating_histogram, dict(zip(range(1, 6), histogram)))
+
+    def test_viewset_writes_keep_aggregates_in_sync(self):
+        response = self.client.post('/api/marketplace/ratings/', {'product': self.product.id, 'score': 5})
+        self.assertEqual(response.status_code, 201)
+        self.assertAggregates(self.product, 2, 7, [0, 1, 0, 0, 1])
+        self.assertEqual(str(self.product.rating_average), '3.50')
+
+        rating_url = f"/api/marketplace/ratings/{response.data['id']}/"
+        self.client.patch(rating_url, {'score': 4})
+        self.assertAggregates(self.product, 2, 6, [0, 1, 0, 1, 0])
+
+        self.client.patch(rating_url, {'product': self.other.id})
+        self.assertAggregates(self.product, 1, 2, [0, 1, 0, 0, 0])
+        self.assertAggregates(self.other, 1, 4, [0, 0, 0, 1, 0])
+
+        self.client.delete(rating_url)
+        self.assertAggregates(self.other, 0, 0, [0, 0, 0, 0, 0])
+        self.assertIsNone(self.other.average_rating())
+
+    def test_bulk_and_cascade_deletes_keep_aggregates_in_sync(self):
+        Rating.objects.create(user=self.buyer, product=self.product, score=5)
+        Rating.objects.create(user=self.buyer, product=self.other, score=3)
+        Rating.objects.filter(product=self.product, score=2).delete()
+        self.assertAggregates(self.product, 1, 5, [0, 0, 0, 0, 1])
+
+        self.buyer.delete()
+        self.assertAggregates(self.product, 0, 0, [0, 0, 0, 0, 0])
+        self.assertAggregates(self.other, 0, 0, [0, 0, 0, 0, 0])
+
+    def test_rebuild_command_repairs_drift(self):
+        Product.objects.update(rating_count=9, rating_sum=40, rating_1_count=9)
+        call_command('rebuild_rating_aggregates', batch_size=1, stdout=StringIO())
+        self.assertAggregates(self.product, 1, 2, [0, 1, 0, 0, 0])
+        self.assertAggregates(self.other, 0, 0, [0, 0, 0, 0, 0])
+
+    def test_catalog_can_be_sorted_by_rating(self):
+        Rating.objects.create(user=self.buyer, product=self.other, score=5)
+        response = self.client.get(reverse('public-products'), {'ordering': 'rating'})
+        self.assertEqual([item['id'] for item in response.data['results']], [self.other.id, self.product.id])
+
+
+class CatalogCacheTests(MarketplaceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.seller = create_user('seller@example.com')
+        self.product = create_product(self.seller)
+        self.url = reverse('public-product-detail', args=[self.product.id])
+
+    def test_serves_hits_and_drops_unpublished_product_immediately(self):
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'MISS')
+        # Apenas a leitura do updated_at para o ETag
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+        self.client.force_authenticate(self.seller)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('product-unpublish', args=[self.product.id]))
+        self.client.force_authenticate(None)
+
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_generation_is_shared_between_workers(self):
+        self.client.get(reverse('public-products'))
+        # Outro worker faz o bump: este deixa de servir a entrada antiga do seu cache local
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT nextval('marketplace_catalog_version')")
+        self.assertEqual(self.client.get(reverse('public-products'))['X-Cache'], 'MISS')
+
+    def test_rating_write_invalidates_list(self):
+        self.client.get(reverse('public-products'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Rating.objects.create(user=self.seller, product=self.product, score=5)
+        response = self.client.get(reverse('public-products'))
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['rating'], 5)
+
+
+class ConditionalGetTests(MarketplaceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.seller = create_user('seller@example.com')
+        self.product = create_product(self.seller)
+        self.url = reverse('public-product-detail', args=[self.product.id])
+
+    def test_detail_answers_304_until_product_changes(self):
+        response = self.client.get(self.url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        Rating.objects.create(user=self.seller, product=self.product, score=4)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_seller_patch_invalidates_validators(self):
+        etag = self.client.get(self.url)['ETag']
+
+        # O PATCH carrega o produto com .only(), sem o updated_at
+        self.client.force_authenticate(self.seller)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/marketplace/products/{self.product.pk}/', {'price': '12.00'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.client.force_authenticate(None)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['price'], '12.00')
+
+    def test_list_etag_changes_with_media(self):
+        etag = self.client.get(reverse('public-products'))['ETag']
+        self.assertEqual(self.client.get(reverse('public-products'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Media.objects.create(product=self.product, type=Media.VIDEO, video_url='https://example.com/v')
+        self.assertEqual(self.client.get(reverse('public-products'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class SparseFieldsetTests(MarketplaceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.buyer = create_user('buyer@example.com')
+        self.product = create_product(create_user('seller@example.com'), description='x' * 500)
+        Order.objects.create(buyer=self.buyer, product=self.product)
+        self.client.force_authenticate(self.buyer)
+
+    def test_cards_are_compact(self):
+        card = self.client.get(reverse('public-products')).data['results'][0]
+        self.assertNotIn('seller', card)
+        self.assertNotIn('files', card)
+        self.assertEqual(len(card['summary']), 160)
+
+    def test_seller_list_keeps_dashboard_fields(self):
+        self.client.force_authenticate(self.product.seller)
+        card = self.client.get('/api/marketplace/products/').data['results'][0]
+        self.assertEqual(card['description'], 'x' * 500)
+        self.assertTrue(card['published'])
+        self.assertNotIn('files', card)
+
+    def test_fields_param_narrows_payload_and_sql(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('public-products'), {'fields': 'id,title'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title'})
+        self.assertNotIn('description', queries[-1]['sql'])
+
+    def test_orders_use_cards_unless_expanded(self):
+        order = self.client.get('/api/marketplace/orders/', {'fields': 'id,product'}).data[0]
+        self.assertEqual(set(order), {'id', 'product'})
+        self.assertNotIn('files', order['product'])
+
+        order = self.client.get('/api/marketplace/orders/', {'expand': 'product'}).data[0]
+        self.assertIn('files', order['product'])
+
+
+class PrimaryMediaTests(MarketplaceTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.product = create_product(create_user('seller@example.com'))
+
+    def add_image(self, name, size=(800, 600), **extra):
+        output = BytesIO()
+        Image.new('RGB', size).save(output, format='PNG')
+        upload = SimpleUploadedFile(name, output.getvalue(), content_type='image/png')
+        media = Media.objects.create(product=self.product, type=Media.IMAGE, image=upload, **extra)
+        process_pending()
+        media.refresh_from_db()
+        return media
+
+    def test_follows_primary_flag_and_deletes(self):
+        first = self.add_image('first.png', is_primary=True)
+        second = self.add_image('second.png', size=(600, 800))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.primary_thumbnail.name, first.thumbnail.name)
+        self.assertEqual((self.product.primary_thumbnail_width, self.product.primary_thumbnail_height), (300, 225))
+
+        Media.objects.filter(pk=first.pk).update(is_primary=False)
+        second.is_primary = True
+        second.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.primary_image.name, second.image.name)
+        self.assertEqual(self.product.primary_thumbnail_width, 225)
+
+        second.delete()
+        first.delete()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.primary_image.name, '')
+
+    def test_cards_use_denormalized_image(self):
+        media = self.add_image('card.png')
+        with self.assertNumQueries(2):
+            card = self.client.get(reverse('public-products')).data['results'][0]
+        self.assertTrue(card['thumbnail_url'].endswith(media.thumbnail.url))
+        self.assertEqual(card['thumbnail_width'], 300)
+
+
+class MediaProcessingTests(MarketplaceTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.seller = create_user('seller@example.com')
+        self.client.force_authenticate(self.seller)
+
+    def png(self, name, size=(1600, 900)):
+        output = BytesIO()
+        Image.new('RGBA', size).save(output, format='PNG')
+        return SimpleUploadedFile(name, output.getvalue(), content_type='image/png')
+
+    def test_upload_returns_before_processing(self):
+        data = {
+            'title': 'Com imagens', 'description': 'Descrição do produto', 'category': 'bot',
+            'language': 'python', 'price': '10.00', 'images': [self.png('a.png'), self.png('b.png')],
+        }
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post('/api/marketplace/products/', data, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        media = list(Media.objects.filter(product_id=response.data['id']))
+        self.assertEqual({m.status for m in media}, {Media.PROCESSING})
+        self.assertTrue(all(m.image.name.endswith('.png') and not m.thumbnail for m in media))
+        originals = [m.image.path for m in media]
+
+        for callback in callbacks:
+            callback()
+        for m in media:
+            m.refresh_from_db()
+            self.assertEqual(m.status, Media.READY)
+            self.assertEqual((m.image.width, m.thumbnail.width), (1200, 300))
+        self.assertFalse(any(os.path.exists(path) for path in originals))
+        product = Product.objects.get(pk=response.data['id'])
+        self.assertEqual(product.primary_thumbnail_width, 300)
+
+    @override_settings(MEDIA_PROCESSING_WORKERS=2, MEDIA_PROCESSING_PER_PRODUCT=2)
+    def test_claims_are_shared_between_products_and_run_in_pool(self):
+        big, small = create_product(self.seller), create_product(self.seller)
+        for i in range(5):
+            Media.objects.create(product=big, type=Media.IMAGE, image=self.png(f'big{i}.png', size=(400, 300)))
+        late = Media.objects.create(product=small, type=Media.IMAGE, image=self.png('small.png', size=(400, 300)))
+
+        claimed = claim_media(3)
+        self.assertIn(late, claimed)
+        self.assertEqual(sum(media.product_id == big.pk for media in claimed), 2)
+        Media.objects.update(claimed_at=None)
+
+        self.assertEqual(process_pending(), 6)
+        self.assertFalse(Media.objects.exclude(status=Media.READY).exists())
+
+    @override_settings(MEDIA_PROCESSING_WORKERS=2)
+    def test_broken_pool_is_replaced_without_using_attempts(self):
+        pool = get_pool()
+        # Um processo do pool morre (ex: OOM)
+        with self.assertRaises(BrokenProcessPool):
+            pool.submit(os._exit, 1).result()
+        media = Media.objects.create(product=create_product(self.seller), type=Media.IMAGE, image=self.png('a.png', size=(400, 300)))
+
+        with self.assertLogs('marketplace.media_pipeline', 'ERROR'):
+            self.assertEqual(process_pending(), 1)
+        self.assertIsNot(get_pool(), pool)
+        media.refresh_from_db()
+        self.assertEqual((media.status, media.attempts), (Media.READY, 1))
+
+    @override_settings(MEDIA_IMAGE_VARIANT_WIDTHS=[320, 640, 1200], MEDIA_IMAGE_VARIANT_FORMATS=['webp', 'jpeg'])
+    def test_variants_are_exposed_as_srcset(self):
+        product = create_product(self.seller)
+        media = Media.objects.create(product=product, type=Media.IMAGE, image=self.png('wide.png'), is_primary=True)
+        small = Media.objects.create(product=product, type=Media.IMAGE, image=self.png('small.png', size=(500, 250)))
+        process_pending()
+        media.refresh_from_db()
+        small.refresh_from_db()
+
+        self.assertEqual([entry[:3] for entry in media.variants], [
+            ['webp', 320, 180], ['webp', 640, 360], ['webp', 1200, 675],
+            ['jpeg', 320, 180], ['jpeg', 640, 360], ['jpeg', 1200, 675],
+        ])
+        self.assertEqual([entry[1] for entry in small.variants if entry[0] == 'jpeg'], [320, 500])
+        self.assertTrue(all(os.path.exists(os.path.join(settings.MEDIA_ROOT, entry[3])) for entry in media.variants))
+
+        gallery = self.client.get(reverse('public-product-detail', args=[product.pk])).data['media']
+        srcset = next(item['srcset'] for item in gallery if item['id'] == media.pk)
+        self.assertRegex(srcset['webp'], r'^http://testserver/media/products/variants/.+_320w\.webp 320w, .+ 640w, .+ 1200w$')
+        card = self.client.get(reverse('public-products')).data['results'][0]
+        self.assertEqual(list(srcset), ['webp', 'jpeg'])
+        self.assertEqual(card['srcset'], srcset)
+
+    def test_missing_file_fails_after_retries(self):
+        product = create_product(self.seller)
+        media = Media.objects.create(product=product, type=Media.IMAGE, image=self.png('a.png'))
+        media.image.storage.delete(media.image.name)
+        with self.assertLogs('marketplace.media_pipeline', 'ERROR'):
+            self.assertEqual(process_pending(), 0)
+        media.refresh_from_db()
+        self.assertEqual((media.status, media.attempts), (Media.FAILED, 3))
+        self.assertTrue(media.processing_error)
+        self.assertEqual(claim_media(10), [])
+
+    def test_expired_claims_stop_after_max_attempts(self):
+        product = create_product(self.seller)
+        media = Media.objects.create(product=product, type=Media.IMAGE, image=self.png('a.png'))
+        # Worker que morreu a meio em todas as tentativas: a reserva expirou
+        expired = timezone.now() - timedelta(seconds=settings.MEDIA_PROCESSING_LEASE_SECONDS + 1)
+        Media.objects.filter(pk=media.pk).update(attempts=settings.MEDIA_PROCESSING_MAX_ATTEMPTS, claimed_at=expired)
+        with self.assertLogs('marketplace.media_pipeline', 'ERROR'):
+            self.assertEqual(claim_media(10), [])
+        media.refresh_from_db()
+        self.assertEqual(media.status, Media.FAILED)
+
+    def test_broken_image_fails_without_retries(self):
+        product = create_product(self.seller)
+        upload = SimpleUploadedFile('broken.png', b'not an image', content_type='image/png')
+        media = Media.objects.create(product=product, type=Media.IMAGE, image=upload)
+        with self.assertLogs('marketplace.media_pipeline', 'ERROR'):
+            self.assertEqual(process_pending(), 0)
+        media.refresh_from_db()
+        self.assertEqual((media.status, media.attempts), (Media.FAILED, 1))
+
+    @override_settings(IMAGE_MAX_PIXELS=1_000_000)
+    def test_oversized_image_rejected_before_decoding(self):
+        data = {
+            'title': 'Imagem enorme', 'description': 'Descrição do produto', 'category': 'bot',
+            'language': 'python', 'price': '10.00', 'images': [self.png('big.png', size=(1600, 900))],
+        }
+        response = self.client.post('/api/marketplace/products/', data, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('images', response.data)
+        self.assertFalse(Product.objects.filter(title='Imagem enorme').exists())
+
+
+class MediaResizeTests(MarketplaceTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root, cache_dir = tempfile.mkdtemp(), tempfile.mkdtemp()
+        for directory in (media_root, cache_dir):
+            self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root, MEDIA_RESIZE_CACHE_DIR=cache_dir,
+            MEDIA_RESIZE_SIZES=['320x180', '160x160'], MEDIA_RESIZE_FORMATS=['webp', 'jpg'],
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        output = BytesIO()
+        Image.new('RGB', (800, 600), 'red').save(output, format='PNG')
+        self.media = Media.objects.create(
+            product=create_product(create_user('seller@example.com')), type=Media.IMAGE,
+            image=SimpleUploadedFile('photo.png', output.getvalue(), content_type='image/png'),
+        )
+        process_pending()
+
+    def get(self, size, extension='webp'):
+        response = self.client.get(f'/media/resize/{self.media.pk}/{size}.{extension}')
+        # Consumir o streaming fecha o ficheiro (o cliente de testes chama close() no fim)
+        response.content_bytes = b''.join(response.streaming_content) if response.streaming else response.content
+        return response
+
+    def test_renders_once_then_serves_from_cache(self):
+        misses, hits = resize_cache.misses, resize_cache.hits
+        response = self.get('320x180')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+        with Image.open(BytesIO(response.content_bytes)) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (320, 180)))
+
+        self.get('320x180')
+        self.assertEqual((resize_cache.misses - misses, resize_cache.hits - hits), (1, 1))
+
+        for size, extension in (('321x180', 'webp'), ('320x180', 'png'), ('320x180x', 'webp')):
+            self.assertEqual(self.get(size, extension).status_code, 404)
+
+    def test_undecodable_original_is_marked_failed(self):
+        self.media.refresh_from_db()
+        with open(self.media.image.path, 'wb') as image:
+            image.write(b'not an image')
+        misses = resize_cache.misses
+        with self.assertLogs('marketplace.views', 'WARNING'):
+            self.assertEqual(self.get('320x180').status_code, 404)
+        self.media.refresh_from_db()
+        self.assertEqual(self.media.status, Media.FAILED)
+        self.assertEqual(self.get('160x160').status_code, 404)
+        self.assertEqual(resize_cache.misses - misses, 1)
+        self.assertFalse(resize_cache.render_locks)
+
+    def test_format_without_encoder_returns_404(self):
+        # Como o Pillow 11 sem libavif: a extensão está configurada mas não há encoder
+        with override_settings(MEDIA_RESIZE_FORMATS=['webp', 'avif']), mock.patch.dict(Image.SAVE):
+            Image.SAVE.pop('AVIF', None)
+            self.assertEqual(self.get('320x180', 'avif').status_code, 404)
+        self.media.refresh_from_db()
+        self.assertEqual(self.media.status, Media.READY)
+
+    def test_cache_evicts_least_recently_used(self):
+        self.get('320x180')
+        first = next(resize_cache.entries())[2]
+        os.utime(first, (0, 0))
+        size = os.path.getsize(first)
+        with override_settings(MEDIA_RESIZE_CACHE_MAX_BYTES=size + 1):
+            self.get('160x160', 'jpg')
+        self.assertFalse(os.path.exists(first))
+        self.assertEqual(len(list(resize_cache.entries())), 1)
+
+
+class TrendingTests(MarketplaceTestCase):
+    def setUp(self):
+        super().setUp()
+        seller = create_user('seller@example.com')
+        self.quiet, self.viewed, self.sold = [create_product(seller, title=f'Produto {i}') for i in range(3)]
+        view_buffer.flush()
+
+    def test_sales_and_buffered_views_drive_trending_order(self):
+        record_sale(self.sold.pk)
+        for _ in range(5):
+            self.client.get(reverse('public-product-detail', args=[self.viewed.pk]))
+        self.assertEqual(ProductPopularity.objects.get(pk=self.viewed.pk).view_count, 0)
+        view_buffer.flush()
+
+        cache.clear()
+        response = self.client.get(reverse('public-products'), {'ordering': 'trending', 'page_size': 2})
+        self.assertEqual([p['id'] for p in response.data['results']], [self.sold.pk, self.viewed.pk])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([p['id'] for p in response.data['results']], [self.quiet.pk])
+
+    def test_products_without_popularity_row_sort_last(self):
+        record_sale(self.sold.pk)
+        ProductPopularity.objects.filter(pk=self.quiet.pk).delete()
+
+        seen = []
+        url, params = reverse('public-products'), {'ordering': 'trending', 'page_size': 1}
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(item['id'] for item in response.data['results'])
+            url, params = response.data['next'], None
+        self.assertEqual(seen, [self.sold.pk, self.viewed.pk, self.quiet.pk])
+
+    def test_view_flush_is_batched_and_fills_daily_table(self):
+        for product, count in ((self.viewed, 3), (self.quiet, 1)):
+            for _ in range(count):
+                record_view(str(product.pk))
+        self.assertFalse(ProductViewDaily.objects.exists())
+
+        # SAVEPOINT, UPDATE ... FROM (VALUES ...), upsert diário, RELEASE
+        with self.assertNumQueries(4):
+            self.assertEqual(view_buffer.flush(), 2)
+        record_view(self.viewed.pk)
+        view_buffer.flush()
+
+        daily = dict(ProductViewDaily.objects.filter(day=timezone.localdate()).values_list('product', 'count'))
+        self.assertEqual(daily, {self.viewed.pk: 4, self.quiet.pk: 1})
+        popularity = ProductPopularity.objects.get(pk=self.viewed.pk)
+        self.assertEqual(popularity.view_count, 4)
+        self.assertAlmostEqual(popularity.score, 0.4)
+
+    def test_decay_command_halves_scores_after_one_half_life(self):
+        record_sale(self.sold.pk)
+        ProductPopularity.objects.filter(pk=self.sold.pk).update(decayed_at=timezone.now() - timedelta(hours=72))
+        call_command('decay_trending_scores', half_life=72, stdout=StringIO())
+        popularity = ProductPopularity.objects.get(pk=self.sold.pk)
+        self.assertAlmostEqual(popularity.score, 5, places=2)
+        self.assertEqual(popularity.sales_count, 1)
+
+
+class CoPurchaseTests(MarketplaceTestCase):
+    def setUp(self):
+        super().setUp()
+        seller = create_user('seller@example.com')
+        self.a, self.b, self.c = [create_product(seller, title=f'Produto {i}') for i in range(3)]
+        self.buyers = [create_user(f'buyer{i}@example.com') for i in range(3)]
+
+    def buy(self, buyer, product):
+        return Order.objects.create(buyer=buyer, product=product, payment_status='succeeded')
+
+    def also_bought(self, product):
+        # Geração do catálogo (chave do cache) + cards
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('public-product-also-bought', args=[product.pk]))
+        return [card['id'] for card in response.data]
+
+    def test_batch_job_ranks_neighbours_by_shared_buyers(self):
+        for buyer in self.buyers:
+            self.buy(buyer, self.a)
+            self.buy(buyer, self.b)
+        self.buy(self.buyers[0], self.c)
+        Order.objects.create(buyer=self.buyers[1], product=self.c)  # não pago
+
+        call_command('build_co_purchases', batch_size=2, stdout=StringIO())
+        self.assertEqual(self.also_bought(self.a), [self.b.pk, self.c.pk])
+        self.assertEqual(self.also_bought(self.c), [self.a.pk, self.b.pk])
+
+    def test_webhook_orders_update_incrementally(self):
+        buyer = self.buyers[0]
+        self.buy(buyer, self.a)
+        record_co_purchase(buyer.pk, self.a.pk)
+        self.buy(buyer, self.b)
+        record_co_purchase(buyer.pk, self.b.pk)
+        self.buy(buyer, self.b)
+        record_co_purchase(buyer.pk, self.b.pk)  # recompra não conta
+
+        self.assertEqual(self.also_bought(self.a), [self.b.pk])
+        self.assertEqual(self.a.co_purchases.get().count, 1)
+
+
+class SimilarProductsTests(MarketplaceTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings_override = override_settings(SIMILAR_PRODUCTS_INDEX=f'{directory}/similar.idx')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.seller = create_user('seller@example.com')
+        self.telegram = create_product(self.seller, title='Telegram bot', description='Telegram moderation bot with captcha')
+        self.discord = create_product(self.seller, title='Discord bot', description='Discord moderation bot with captcha and logs')
+        self.invoices = create_product(self.seller, title='Invoice API', description='Generate PDF invoices', category='api')
+        for i in range(8):
+            create_product(self.seller, title=f'Dashboard {i}', description=f'Analytics charts widget{i}', category='dashboard')
+
+    def similar(self, product):
+        response = self.client.get(reverse('public-product-similar', args=[product.pk]))
+        self.assertIn('Server-Timing', response)
+        return [card['id'] for card in response.data]
+
+    def test_ranks_by_content_and_refreshes_changed_products(self):
+        refresh_similar_products()
+        self.assertEqual(self.similar(self.telegram)[0], self.discord.pk)
+        # Mesma linguagem mas sem termos em comum: as features não geram candidatos
+        self.assertNotIn(self.invoices.pk, [pk for pk, _ in similarity_index.neighbors(self.telegram.pk)])
+
+        self.invoices.title = 'Telegram captcha bot'
+        self.invoices.description = 'Telegram moderation bot with captcha'
+        self.invoices.save()
+        refresh_similar_products([self.invoices.pk])
+        self.assertEqual(similarity_index.neighbors(self.invoices.pk)[0][0], self.telegram.pk)
+        self.assertEqual(similarity_index.neighbors(self.telegram.pk)[0][0], self.invoices.pk)
+
+    def test_incremental_refresh_tokenizes_only_changed_products(self):
+        refresh_similar_products()
+        self.invoices.description = 'Telegram moderation bot with captcha'
+        self.invoices.save()
+        with mock.patch('marketplace.similarity.tokenize', wraps=tokenize) as tokenizer:
+            self.assertEqual(refresh_similar_products([self.invoices.pk]), 1)
+        # Título + descrição do produto alterado
+        self.assertEqual(tokenizer.call_count, 2)
+        self.assertIn(self.invoices.pk, [pk for pk, _ in similarity_index.neighbors(self.telegram.pk)])
+
+    def test_incremental_refresh_without_index_builds_everything(self):
+        self.assertEqual(refresh_similar_products([self.invoices.pk]), 11)
+        self.assertEqual(similarity_index.neighbors(self.telegram.pk)[0][0], self.discord.pk)
+
+    def test_refreshes_hold_a_cross_process_lock(self):
+        with similarity_index.locked():
+            with open(f'{similarity_index.get_path()}.lock', 'a') as lock_file:
+                with self.assertRaises(BlockingIOError):
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def test_unindexed_product_falls_back_to_category(self):
+        newest = create_product(self.seller, title='Slack bot')
+        # Geração do catálogo (chave do cache) + cards
+        with self.assertNumQueries(2):
+            ids = self.similar(newest)
+        self.assertEqual(set(ids), {self.telegram.pk, self.discord.pk})
+
+
+class WishlistActionTests(MarketplaceTestCase):
+    def setUp(self):
+        super().setUp()
+        seller = create_user('seller@example.com')
+        self.products = [create_product(seller, title=f'Produto {i}') for i in range(50)]
+        self.hidden = create_product(seller, published=False)
+        self.user = create_user('buyer@example.com')
+        self.client.force_authenticate(self.user)
+
+    def test_add_remove_and_contains_touch_only_ids(self):
+        first, second = self.products[0].pk, self.products[1].pk
+        response = self.client.post('/api/marketplace/wishlist/add/', {'ids': [first, second, self.hidden.pk]}, format='json')
+        self.assertEqual(response.data['ids'], [first, second])
+        self.client.post('/api/marketplace/wishlist/add/', {'product_id': first}, format='json')
+        self.assertEqual(Wishlist.objects.get(user=self.user).products.count(), 2)
+
+        self.client.post('/api/marketplace/wishlist/remove/', {'ids': [second]}, format='json')
+        page = ','.join(str(product.pk) for product in self.products)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/marketplace/wishlist/contains/', {'ids': page})
+        self.assertEqual(response.data['ids'], [first])
+
+        response = self.client.get('/api/marketplace/wishlist/contains/', {'ids': 'a,b'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_products_listing_is_paginated_cards(self):
+        ids = [product.pk for product in self.products[:30]]
+        self.client.post('/api/marketplace/wishlist/add/', {'ids': ids}, format='json')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/marketplace/wishlist/products/', {'page_size': 20})
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertNotIn('files', response.data['results'][0])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 10)
+
+
+class WishlistNotificationTests(MarketplaceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.seller = create_user('seller@example.com')
+        self.product = create_product(self.seller, price='20.00')
+        self.fans = [create_user(f'fan{i}@example.com') for i in range(5)]
+        for fan in self.fans:
+            Wishlist.objects.create(user=fan).products.add(self.product)
+        self.client.force_authenticate(self.seller)
+
+    def update(self, **data):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/marketplace/products/{self.product.pk}/', data, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_price_change_notifies_every_wishlister_once(self):
+        self.update(price='15.00')
+        self.update(price='15.00', title='Produto novo')
+        self.update(title='Produto renovado')
+
+        notifications = Notification.objects.filter(product=self.product)
+        self.assertEqual(notifications.filter(dedup_key__startswith='price_changed').count(), 5)
+        # Duas alterações no mesmo dia: uma notificação de "updated" por utilizador
+        self.assertEqual(notifications.filter(dedup_key__startswith='updated').count(), 5)
+        self.assertIn('€20.00 → €15.00', notifications.first().content)
+
+    def test_fan_out_reads_wishlisters_in_batches(self):
+        self.assertEqual(fan_out(self.product.pk, 'Hello', 'test:1', batch_size=2), 3)
+        self.assertEqual(fan_out(self.product.pk, 'Hello', 'test:1', batch_size=2), 3)
+        self.assertEqual(Notification.objects.filter(dedup_key='test:1').count(), 5)
+
+
+class NotificationFeedTests(MarketplaceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = create_user('user@example.com')
+        other = create_user('other@example.com')
+        self.notifications = Notification.objects.bulk_create(
+            [Notification(user=self.user, content=f'N{i}') for i in range(5)]
+            + [Notification(user=other, content='other')]
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_unread_count_and_bulk_mark_read(self):
+        url = '/api/marketplace/notifications/'
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(f'{url}unread_count/').data['unread_count'], 5)
+
+        first, second = self.notifications[0].pk, self.notifications[1].pk
+        with self.assertNumQueries(1):
+            response = self.client.post(f'{url}mark_read/', {'ids': [first, second, self.notifications[5].pk]}, format='json')
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual(self.client.post(f'{url}mark_all_read/').data['updated'], 3)
+        self.assertEqual(self.client.get(f'{url}unread_count/').data['unread_count'], 0)
+        self.assertFalse(Notification.objects.get(content='other').is_read)
+
+    def test_feed_is_keyset_paginated_newest_first(self):
+        response = self.client.get('/api/marketplace/notifications/', {'page_size': 3})
+        self.assertEqual([n['content'] for n in response.data['results']], ['N4', 'N3', 'N2'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([n['content'] for n in response.data['results']], ['N1', 'N0'])
+
+    def test_purge_deletes_only_old_read_notifications(self):
+        Notification.objects.filter(content__in=['N0', 'N1', 'N2']).update(
+            is_read=True, created_at=timezone.now() - timedelta(days=120),
+        )
+        Notification.objects.filter(content='N3').update(created_at=timezone.now() - timedelta(days=120))
+        call_command('purge_notifications', batch_size=2, stdout=StringIO())
+        self.assertEqual(
+            sorted(Notification.objects.filter(user=self.user).values_list('content', flat=True)),
+            ['N3', 'N4'],
+        )
+
+
+@override_settings(NOTIFICATIONS_STREAM_BACKEND='local')
+class NotificationStreamTests(TransactionTestCase):
+    # A stream lê a base de dados noutras threads (outras ligações): os dados
+    # do teste têm de estar commitados
+    def setUp(self):
+        self.user = create_user('user@example.com')
+        self.old = Notification.objects.create(user=self.user, content='old')
+        self.url = f"{reverse('notification-stream')}?token={AccessToken.for_user(self.user)}"
+
+    async def read_event(self, stream):
+        # Ignora o "retry:" inicial e os keepalives
+        while True:
+            chunk = await asyncio.wait_for(stream.__anext__(), 5)
+            chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+            if chunk.startswith('id:'):
+                return chunk
+
+    async def test_resumes_from_last_event_id_and_wakes_on_publish(self):
+        newer = await Notification.objects.acreate(user=self.user, content='newer')
+        response = await self.async_client.get(self.url, headers={'Last-Event-ID': str(self.old.pk)})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        try:
+            event = await self.read_event(stream)
+            self.assertIn(f'id: {newer.pk}\n', event)
+            self.assertIn('"content": "newer"', event)
+
+            pending = asyncio.ensure_future(self.read_event(stream))
+            await asyncio.sleep(0.05)
+            self.assertFalse(pending.done())
+            latest = await Notification.objects.acreate(user=self.user, content='latest')
+            broker.publish(self.user.pk)
+            self.assertIn(f'id: {latest.pk}\n', await pending)
+        finally:
+            await stream.aclose()
+
+    def other_connections(self):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT count(*) FROM pg_stat_activity WHERE datname = current_database() AND pid <> pg_backend_pid()"
+                )
+                return cursor.fetchone()[0]
+        finally:
+            connection.close()
+
+    def test_holds_no_database_connection_while_waiting(self):
+        count_connections = sync_to_async(self.other_connections, thread_sensitive=False)
+
+        async def scenario():
+            # Como no ASGIHandler: o código síncrono de cada pedido tem a sua thread
+            async with ThreadSensitiveContext():
+                response = await self.async_client.get(self.url, headers={'Last-Event-ID': '0'})
+                stream = response.streaming_content
+                try:
+                    await self.read_event(stream)
+                    pending = asyncio.ensure_future(self.read_event(stream))
+                    await asyncio.sleep(0.1)
+                    waiting = await count_connections()
+                    latest = await sync_to_async(Notification.objects.create, thread_sensitive=False)(user=self.user, content='latest')
+                    broker.publish(self.user.pk)
+                    self.assertIn(f'id: {latest.pk}\n', await pending)
+                finally:
+                    await stream.aclose()
+            return waiting
+
+        before = self.other_connections()
+        # Numa thread nova, fora do async_to_sync do test runner (que mandaria
+        # todo o código síncrono para a thread do teste)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            waiting = executor.submit(asyncio.run, scenario()).result()
+        self.assertEqual(waiting, before)
+
+    def test_requires_a_valid_token(self):
+        self.assertEqual(self.client.get(reverse('notification-stream')).status_code, 401)
+        self.assertEqual(self.client.get(reverse('notification-stream'), {'token': 'x'}).status_code, 401)
+
+
+class SellerSalesTests(MarketplaceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.seller = create_user('seller@example.com')
+        product = create_product(self.seller, title='Bot')
+        other = create_product(create_user('other@example.com'))
+        buyer = create_user('buyer@example.com', full_name='Ana Buyer')
+        self.sales = [Order.objects.create(buyer=buyer, product=product, payment_status='succeeded') for _ in range(5)]
+        Order.objects.create(buyer=buyer, product=product)  # pendente
+        Order.objects.create(buyer=buyer, product=other, payment_status='succeeded')
+        Order.objects.filter(pk=self.sales[0].pk).update(created_at=timezone.now() - timedelta(days=40))
+        self.client.force_authenticate(self.seller)
+
+    def test_sales_are_compact_and_keyset_paginated(self):
+        self.assertEqual(self.sales[0].seller_id, self.seller.pk)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/marketplace/orders/sales/', {'page_size': 3})
+        sale = response.data['results'][0]
+        self.assertEqual(sale['product_title'], 'Bot')
+        self.assertEqual(sale['buyer_name'], 'Ana Buyer')
+        self.assertNotIn('buyer', sale)
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([s['id'] for s in response.data['results']], [self.sales[1].pk, self.sales[0].pk])
+        self.assertIsNone(response.data['next'])
+
+    def test_date_range_filters(self):
+        since = (timezone.localdate() - timedelta(days=7)).isoformat()
+        response = self.client.get('/api/marketplace/orders/sales/', {'since': since})
+        self.assertEqual(len(response.data['results']), 4)
+        until = (timezone.localdate() - timedelta(days=30)).isoformat()
+        response = self.client.get('/api/marketplace/orders/sales/', {'until': until})
+        self.assertEqual([s['id'] for s in response.data['results']], [self.sales[0].pk])
+        self.assertEqual(self.client.get('/api/marketplace/orders/sales/', {'since': '2024-13-01'}).status_code, 400)
@@ -7,6 +7,8 @@ from .views import (
     RatingViewSet, NotificationViewSet, WishlistViewSet,
     ProductFilesView, PublishProductView, CompleteOnboardingView, 
     UnpublishProductView, PublicProductListView, MediaViewSet, PublicProductDetailView, 
+    PublicProductSearchView, PublicProductFacetsView, CatalogCacheStatsView,
+    PublicProductAlsoBoughtView, PublicProductSimilarView, notification_stream,
 )
 
 router = DefaultRouter()
@@ -18,11 +20,18 @@ router.register(r'wishlist', WishlistViewSet, basename='wishlist')
 router.register(r'media', MediaViewSet, basename='media')
 
 urlpatterns = [
+    # Antes do router, senão "stream" seria lido como o pk de uma notificação
+    path('notifications/stream/', notification_stream, name='notification-stream'),
     path('', include(router.urls)),
     path('products/<int:pk>/files/', ProductFilesView.as_view(), name='product-files'),
     path('products/<int:pk>/publish/', PublishProductView.as_view(), name='product-publish'),
     path('products/<int:pk>/unpublish/', UnpublishProductView.as_view(), name='product-unpublish'), 
     path('stripe/onboarding/complete/', CompleteOnboardingView.as_view(), name='stripe_onboarding_complete'),
     path('public/products/', PublicProductListView.as_view(), name='public-products'),
+    path('public/products/search/', PublicProductSearchView.as_view(), name='public-product-search'),
+    path('public/products/facets/', PublicProductFacetsView.as_view(), name='public-product-facets'),
+    path('cache/stats/', CatalogCacheStatsView.as_view(), name='catalog-cache-stats'),
     path('public/products/<int:pk>/', PublicProductDetailView.as_view(), name='public-product-detail'),
+    path('public/products/<int:pk>/also-bought/', PublicProductAlsoBoughtView.as_view(), name='public-product-also-bought'),
+    path('public/products/<int:pk>/similar/', PublicProductSimilarView.as_view(), name='public-product-similar'),
 ]
@@ -10,27 +10,56 @@ from django.shortcuts import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from rest_framework.permissions import AllowAny
+from rest_framework.permissions import IsAdminUser
 from rest_framework.decorators import action
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.reverse import reverse
 from django.conf import settings
-from django.http import HttpResponse, Http404
+from django.http import FileResponse, HttpResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.db.models import Case, F, FloatField, IntegerField, Max, When
+from django.db import connection, transaction
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.functions import Cast
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
 from rest_framework.exceptions import NotFound
 import stripe
 import boto3
 import base64
+import os
+import time
+from functools import partial
 from rest_framework.generics import RetrieveAPIView
-from .models import Product, Order, Notification, Rating, Media, Wishlist
+from .models import Product, Order, Notification, Rating, Media, Wishlist, SEARCH_CONFIG
+from .pagination import CatalogPagination, NotificationPagination, SalesPagination, SearchPagination
+from .filters import filter_catalog, filter_date_range, catalog_facets
+from .cache import CatalogCacheMixin, bump_catalog_version, catalog_cache_stats
+from .conditional import catalog_etag, conditional_response, product_validators
+from .popularity import record_view
+from .media_pipeline import schedule_media_processing
+from .imaging import EXTENSIONS, ImageRejected, can_encode, inspect_image
+from .resize import allowed_size, resize_cache, resized_path
+from .similarity import schedule_similarity_refresh, similarity_index
+from .notifications import PUBLISHED, notify_wishlisters, product_event
+from .events import broker
+from asgiref.sync import sync_to_async
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+import asyncio
+import json
 from storage.models import ProjectFile
 from payments.models import Payment
 from .serializers import (
     ProductSerializer,
+    ProductCardSerializer,
+    SellerProductCardSerializer,
+    ProductSearchSerializer,
     OrderSerializer,
     NotificationSerializer,
     RatingSerializer,
     MediaSerializer,
     WishlistSerializer,
     ProjectFileSerializer,
+    SaleSerializer,
 
 )
 
@@ -41,16 +70,48 @@ stripe.api_key = settings.STRIPE_SECRET_KEY
 
 
 
+def parse_ids(value, limit=100):
+    """
+    Converte uma lista de ids (lista JSON ou "1,2,3") em inteiros únicos.
+    """
+    if isinstance(value, (int, str)):
+        value = str(value).split(',')
+    try:
+        ids = list(dict.fromkeys(int(item) for item in value or [] if str(item).strip()))
+    except (TypeError, ValueError):
+        raise serializers.ValidationError({'ids': "Expected a list of ids."})
+    if not ids:
+        raise serializers.ValidationError({'ids': "At least one id is required."})
+    if len(ids) > limit:
+        raise serializers.ValidationError({'ids': f"At most {limit} ids per request."})
+    return ids
+
+
 class ProductViewSet(viewsets.ModelViewSet):
     serializer_class = ProductSerializer
     permission_classes = [AllowAny] 
+    pagination_class = CatalogPagination
 
     def get_queryset(self):
         # Este método define quais produtos um utilizador pode ver.
         # Vê os seus próprios produtos
             logger.info(f"ProductViewSet: Filtering queryset for authenticated user {self.request.user.email} (ID: {self.request.user.id})")
-            return Product.objects.filter(seller=self.request.user).order_by('-created_at')
+            queryset = Product.objects.filter(seller=self.request.user).order_by('-created_at')
+            return self.get_serializer().prepare_queryset(queryset)
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return SellerProductCardSerializer
+        return ProductSerializer
+
+    def list(self, request, *args, **kwargs):
+        respond = partial(super().list, request, *args, **kwargs)
+        return conditional_response(request, respond, etag=catalog_etag(request))
 
+    def retrieve(self, request, *args, **kwargs):
+        etag, last_modified = product_validators(Product.objects.filter(seller=request.user), kwargs['pk'])
+        respond = partial(super().retrieve, request, *args, **kwargs)
+        return conditional_response(request, respond, etag=etag, last_modified=last_modified)
 
     def perform_create(self, serializer):
         # Esta função é chamada quando um POST (criação) é feito.
@@ -73,6 +134,13 @@ class ProductViewSet(viewsets.ModelViewSet):
             # Se ocorrer um erro ao aceder a self.request.user.products (ex: AnonymousUser)
             raise PermissionDenied("An error occurred while verifying user's product limit. Please ensure you are logged in.")
 
+        # Valida as imagens pelo cabeçalho antes de criar o produto (formato, bombas de descompressão)
+        images = self.request.FILES.getlist('images')
+        for image in images:
+            try:
+                inspect_image(image, settings.IMAGE_MAX_PIXELS)
+            except ImageRejected as e:
+                raise serializers.ValidationError({'images': f"{image.name}: {e}"})
 
         # Cria o produto com o utilizador como vendedor 
         try:
@@ -83,21 +151,45 @@ class ProductViewSet(viewsets.ModelViewSet):
             raise serializers.ValidationError("Could not save product. Please check provided data.")
 
 
-        # Salva as imagens enviadas
-        images = self.request.FILES.getlist('images')
+        # Salva as imagens enviadas num único INSERT; a otimização fica para o worker
         logger.info(f"perform_create: Received {len(images)} images for product {product.id}.")
-        for i, image in enumerate(images):
-            try:
-                Media.objects.create(
+        if images:
+            media = [
+                Media(
                     product=product,
                     type=Media.IMAGE,
                     image=image,
-                    is_primary=(i == 0)  # A primeira imagem será a principal
+                    is_primary=(i == 0),  # A primeira imagem será a principal
+                    status=Media.PROCESSING,
                 )
+                for i, image in enumerate(images)
+            ]
+            try:
+                with transaction.atomic():
+                    Media.objects.bulk_create(media)
             except Exception as e:
-                logger.error(f"perform_create: Error saving image {image.name} for product {product.id}: {e}")
-                raise serializers.ValidationError(f"Failed to save image {image.name}: {e}")
-        logger.info(f"perform_create: All images processed for product {product.id}.")
+                logger.error(f"perform_create: Error saving images for product {product.id}: {e}")
+                raise serializers.ValidationError(f"Failed to save images: {e}")
+            # bulk_create não chama Media.save()
+            Product.objects.filter(pk=product.pk).sync_primary_media()
+            bump_catalog_version()
+            schedule_media_processing()
+        logger.info(f"perform_create: All images stored for product {product.id}.")
+        schedule_similarity_refresh(product.id)
+
+    def perform_update(self, serializer):
+        previous = {'published': serializer.instance.published, 'price': serializer.instance.price}
+        product = serializer.save()
+        # Só este produto é recalculado no índice de semelhantes
+        schedule_similarity_refresh(product.id)
+        event = product_event(previous, product)
+        if event:
+            notify_wishlisters(product, event, previous_price=previous['price'])
+
+    def perform_destroy(self, instance):
+        product_id = instance.id
+        instance.delete()
+        schedule_similarity_refresh(product_id)
 
 
     def get_serializer(self, *args, **kwargs):
@@ -168,12 +260,109 @@ class UnpublishProductView(APIView):
 
 
 
-class PublicProductListView(generics.ListAPIView):
-    serializer_class = ProductSerializer
+class PublicProductListView(CatalogCacheMixin, generics.ListAPIView):
+    serializer_class = ProductCardSerializer
     permission_classes = [permissions.AllowAny]  
+    pagination_class = CatalogPagination
 
     def get_queryset(self):
-        return Product.objects.filter(published=True)
+        queryset = filter_catalog(Product.objects.published(), self.request.query_params)
+        return self.get_serializer().prepare_queryset(queryset)
+
+    def get(self, request, *args, **kwargs):
+        respond = partial(super().get, request, *args, **kwargs)
+        return conditional_response(request, respond, etag=catalog_etag(request))
+
+
+class PublicProductAlsoBoughtView(CatalogCacheMixin, generics.ListAPIView):
+    """
+    "Customers also bought": cards dos vizinhos guardados em ProductCoPurchase,
+    lidos numa única query pelo índice co_purchase_lookup_idx.
+    """
+    serializer_class = ProductCardSerializer
+    permission_classes = [permissions.AllowAny]
+    pagination_class = None
+
+    def get_queryset(self):
+        queryset = (
+            Product.objects.published()
+            .filter(co_purchased_with__product_id=self.kwargs['pk'])
+            .order_by('-co_purchased_with__count', 'id')
+        )
+        return self.get_serializer().prepare_queryset(queryset)[:settings.RECOMMENDATIONS_TOP_K]
+
+
+class PublicProductSimilarView(CatalogCacheMixin, generics.ListAPIView):
+    """
+    Produtos semelhantes pelo conteúdo (TF-IDF), lidos do índice em mmap.
+    Produtos ainda não indexados recebem os mais recentes da mesma categoria.
+    """
+    serializer_class = ProductCardSerializer
+    permission_classes = [permissions.AllowAny]
+    pagination_class = None
+
+    def get_queryset(self):
+        pk = self.kwargs['pk']
+        started = time.perf_counter()
+        neighbors = similarity_index.neighbors(pk)
+        self.lookup_ms = (time.perf_counter() - started) * 1000
+        if self.lookup_ms > settings.SIMILAR_PRODUCTS_BUDGET_MS:
+            logger.warning(f"Similar products lookup for {pk} took {self.lookup_ms:.1f}ms (budget {settings.SIMILAR_PRODUCTS_BUDGET_MS}ms).")
+
+        products = Product.objects.published()
+        if neighbors:
+            ids = [neighbor for neighbor, score in neighbors]
+            position = Case(*[When(pk=product_id, then=index) for index, product_id in enumerate(ids)], output_field=IntegerField())
+            queryset = products.filter(pk__in=ids).order_by(position)
+        else:
+            category = Product.objects.filter(pk=pk).values('category')[:1]
+            queryset = products.filter(category=category).exclude(pk=pk).order_by('-created_at', '-id')
+        return self.get_serializer().prepare_queryset(queryset)[:settings.SIMILAR_PRODUCTS_TOP_K]
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        response['Server-Timing'] = f'similar;dur={self.lookup_ms:.2f}'
+        return response
+
+
+class PublicProductFacetsView(APIView):
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        # Todas as contagens numa única query agregada
+        return Response(catalog_facets(Product.objects.published(), request.query_params))
+
+
+
+class CatalogCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(catalog_cache_stats())
+
+
+class PublicProductSearchView(generics.ListAPIView):
+    serializer_class = ProductSearchSerializer
+    permission_classes = [permissions.AllowAny]
+    pagination_class = SearchPagination
+
+    def get_queryset(self):
+        term = self.request.query_params.get('q', '').strip()
+        if not term:
+            raise serializers.ValidationError({"q": "A search term is required."})
+
+        query = SearchQuery(term, search_type='websearch', config=SEARCH_CONFIG)
+        queryset = Product.objects.published().filter(search_vector=query)
+        queryset = filter_catalog(queryset, self.request.query_params)
+
+        return self.get_serializer().prepare_queryset(queryset).annotate(
+            # ts_rank devolve real; em double precision o valor sobrevive ao cursor
+            rank=Cast(SearchRank(F('search_vector'), query), FloatField()),
+            headline=SearchHeadline(
+                'description', query, config=SEARCH_CONFIG,
+                start_sel='<mark>', stop_sel='</mark>', max_words=35, min_words=15,
+            ),
+        )
 
 
 
@@ -203,6 +392,8 @@ class CompleteOnboardingView(APIView):
         product.published = True
         product.pending_publication = False
         product.save()
+        # As notificações são criadas em segundo plano, depois da resposta
+        notify_wishlisters(product, PUBLISHED)
 
         return Response({"detail": "Product published successfully."})
 
@@ -212,24 +403,31 @@ class OrderViewSet(viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def prepare(self, queryset):
+        # Ajusta only/select_related/prefetch aos campos pedidos (?fields=, ?expand=)
+        return self.get_serializer().prepare_queryset(queryset)
+
     def get_queryset(self):
         # Compras feitas pelo user
-        return self.queryset.filter(buyer=self.request.user)
+        return self.prepare(self.queryset.filter(buyer=self.request.user))
 
     def perform_create(self, serializer):
         serializer.save(buyer=self.request.user)
 
-    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated],
+            serializer_class=SaleSerializer, pagination_class=SalesPagination)
     def sales(self, request):
-        # Orders onde o produto é do user (vendas)
-        sales = self.queryset.filter(product__seller=request.user, payment_status='succeeded')
-        serializer = self.get_serializer(sales, many=True)
-        return Response(serializer.data)
+        # Orders onde o produto é do user (vendas), pelo índice order_sales_idx
+        sales = self.queryset.filter(seller=request.user, payment_status='succeeded')
+        sales = SaleSerializer.prepare_queryset(filter_date_range(sales, request.query_params))
+        page = self.paginate_queryset(sales)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def pending_orders(self, request):
         # Listar apenas os pedidos pendentes
-        pending_orders = self.queryset.filter(buyer=request.user, payment_status='pending')
+        pending_orders = self.prepare(self.queryset.filter(buyer=request.user, payment_status='pending'))
         serializer = self.get_serializer(pending_orders, many=True)
         return Response(serializer.data)
 
@@ -238,9 +436,27 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Notification.objects.all()
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NotificationPagination
 
     def get_queryset(self):
-        return self.queryset.filter(user=self.request.user)
+        return self.queryset.filter(user=self.request.user).select_related('user')
+
+    @action(detail=False, methods=['get'])
+    def unread_count(self, request):
+        # Servido pelo índice parcial notification_unread_idx
+        count = Notification.objects.filter(user=request.user, is_read=False).count()
+        return Response({'unread_count': count})
+
+    @action(detail=False, methods=['post'])
+    def mark_all_read(self, request):
+        updated = Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+        return Response({'updated': updated})
+
+    @action(detail=False, methods=['post'])
+    def mark_read(self, request):
+        ids = parse_ids(request.data.get('ids'), limit=settings.CATALOG_MAX_PAGE_SIZE)
+        updated = Notification.objects.filter(user=request.user, is_read=False, pk__in=ids).update(is_read=True)
+        return Response({'updated': updated})
 
 
 class RatingViewSet(viewsets.ModelViewSet):
@@ -282,6 +498,10 @@ class MediaViewSet(viewsets.ModelViewSet):
         if media_type == Media.IMAGE:
             if 'image' not in request.FILES:
                 return Response({"detail": "No image file was provided."}, status=400)
+            try:
+                inspect_image(request.FILES['image'], settings.IMAGE_MAX_PIXELS)
+            except ImageRejected as e:
+                return Response({"detail": str(e)}, status=400)
         elif media_type == Media.VIDEO:
             if not request.data.get('video_url'):
                 return Response({"detail": "Video URL is required."}, status=400)
@@ -296,7 +516,9 @@ class MediaViewSet(viewsets.ModelViewSet):
         product_id = self.request.data.get('product')
         try:
             product = Product.objects.get(id=product_id, seller=self.request.user)
-            serializer.save(product=product)  # Associando o produto ao media
+            media = serializer.save(product=product)  # Associando o produto ao media
+            if media.status == Media.PROCESSING:
+                schedule_media_processing()
         except Product.DoesNotExist:
             raise serializers.ValidationError("Product does not exist or is not owned by user.")
 
@@ -307,22 +529,123 @@ class MediaViewSet(viewsets.ModelViewSet):
 
 
 
+class MediaResizeView(APIView):
+    """
+    /media/resize/<id>/<w>x<h>.<fmt>: variante gerada no primeiro pedido a
+    partir de Media.image e servida depois da cache em disco. Só tamanhos e
+    formatos da whitelist, para que não se possa encher a cache.
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def get(self, request, pk, width, height, extension):
+        name = EXTENSIONS.get(extension)
+        if name is None or extension not in settings.MEDIA_RESIZE_FORMATS or not allowed_size(width, height):
+            raise Http404("Size or format not allowed.")
+        # Formato configurado mas sem encoder neste Pillow (ex: avif sem libavif)
+        if not can_encode(name):
+            raise Http404("Size or format not allowed.")
+        # Só imagens já processadas: originais por processar ou que falharam não são descodificados aqui
+        media = get_object_or_404(
+            Media.objects.filter(type=Media.IMAGE, status=Media.READY).exclude(image='').exclude(image__isnull=True).only('id', 'image'),
+            pk=pk,
+        )
+
+        try:
+            path = resized_path(media, width, height, extension, name)
+        except ImageRejected as e:
+            # Marcada como falhada, os pedidos seguintes já não a tentam descodificar
+            logger.warning(f"MediaResizeView: media {media.pk} cannot be resized: {e}")
+            Media.objects.filter(pk=media.pk, status=Media.READY).update(status=Media.FAILED, processing_error=str(e)[:1000])
+            raise Http404("Image not available.")
+        except FileNotFoundError:
+            raise Http404("Image not available.")
+        if settings.MEDIA_RESIZE_ACCEL_REDIRECT:
+            # O nginx envia o ficheiro (location internal apontada para a cache)
+            response = HttpResponse(content_type=f'image/{name}')
+            relative = os.path.relpath(path, resize_cache.get_directory())
+            response['X-Accel-Redirect'] = f"{settings.MEDIA_RESIZE_ACCEL_REDIRECT.rstrip('/')}/{relative}"
+        else:
+            try:
+                source = open(path, 'rb')
+            except FileNotFoundError:
+                # Apagado pela limpeza da cache entre o fetch e o open
+                source = open(resized_path(media, width, height, extension, name), 'rb')
+            # FileResponse usa o wsgi.file_wrapper do servidor (sendfile) quando existe
+            response = FileResponse(source, content_type=f'image/{name}')
+        response['Cache-Control'] = f'public, max-age={settings.MEDIA_RESIZE_MAX_AGE}'
+        return response
+
+
 class WishlistViewSet(viewsets.ModelViewSet):  
     queryset = Wishlist.objects.all()
     serializer_class = WishlistSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # Tabela intermédia do M2M: as ações abaixo só tocam nesta tabela
+    WishlistProduct = Wishlist.products.through
 
     def get_queryset(self):
-        return self.queryset.filter(user=self.request.user)
+        return self.get_serializer().prepare_queryset(self.queryset.filter(user=self.request.user))
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-class PublicProductDetailView(RetrieveAPIView):
-    queryset = Product.objects.filter(published=True)
+    def get_serializer_class(self):
+        if self.action == 'products':
+            return ProductCardSerializer
+        return WishlistSerializer
+
+    def request_ids(self, request):
+        return parse_ids(request.data.get('ids', request.data.get('product_id')))
+
+    @action(detail=False, methods=['post'])
+    def add(self, request):
+        ids = self.request_ids(request)
+        wishlist, _ = Wishlist.objects.get_or_create(user=request.user)
+        added = list(Product.objects.published().filter(pk__in=ids).values_list('pk', flat=True))
+        self.WishlistProduct.objects.bulk_create(
+            [self.WishlistProduct(wishlist_id=wishlist.pk, product_id=product_id) for product_id in added],
+            ignore_conflicts=True,
+        )
+        return Response({'ids': sorted(added)})
+
+    @action(detail=False, methods=['post'])
+    def remove(self, request):
+        ids = self.request_ids(request)
+        self.WishlistProduct.objects.filter(wishlist__user=request.user, product_id__in=ids).delete()
+        return Response({'ids': ids})
+
+    @action(detail=False, methods=['get'])
+    def contains(self, request):
+        # Uma query indexada para marcar os corações de uma página de produtos
+        ids = parse_ids(request.query_params.get('ids'), limit=settings.CATALOG_MAX_PAGE_SIZE)
+        found = self.WishlistProduct.objects.filter(
+            wishlist__user=request.user, product_id__in=ids,
+        ).values_list('product_id', flat=True)
+        return Response({'ids': sorted(found)})
+
+    @action(detail=False, methods=['get'], pagination_class=CatalogPagination)
+    def products(self, request):
+        queryset = Product.objects.published().filter(wishlisted_by__user=request.user)
+        page = self.paginate_queryset(self.get_serializer().prepare_queryset(queryset))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+class PublicProductDetailView(CatalogCacheMixin, RetrieveAPIView):
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
 
+    def get_queryset(self):
+        return self.get_serializer().prepare_queryset(Product.objects.published())
+
+    def get(self, request, *args, **kwargs):
+        # 304 a partir do updated_at, sem serializar nem consultar o cache
+        etag, last_modified = product_validators(Product.objects.published(), kwargs['pk'], request)
+        if etag:
+            record_view(kwargs['pk'])
+        respond = partial(super().get, request, *args, **kwargs)
+        return conditional_response(request, respond, etag=etag, last_modified=last_modified)
+
 
 class ProductFilesView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -369,4 +692,82 @@ class ProductFilesView(APIView):
         return Response(file_urls)
 
 
+# ------------------ Stream de notificações (SSE) ------------------
 
+async def _release_after(function, *args):
+    """
+    Corre `function` numa thread do pool e fecha logo a ligação à base de
+    dados. Com thread_sensitive, cada stream teria a sua thread e a sua
+    ligação até ao fim do pedido, mesmo parada à espera de notificações.
+    """
+    def call():
+        try:
+            return function(*args)
+        finally:
+            connection.close()
+    return await sync_to_async(call, thread_sensitive=False)()
+
+
+async def _stream_user(request):
+    # O EventSource do browser não envia headers: aceita também ?token=
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else request.GET.get('token')
+    if not raw_token:
+        return None
+    try:
+        validated = authentication.get_validated_token(raw_token)
+        return await _release_after(authentication.get_user, validated)
+    except (InvalidToken, TokenError):
+        return None
+
+
+async def notification_stream(request):
+    """
+    Server-Sent Events com as notificações novas do utilizador. Cada ligação
+    fica parada num asyncio.Event até o broker a acordar (LISTEN/NOTIFY), por
+    isso só consulta a base de dados quando há notificações. Retoma a partir
+    do header Last-Event-ID (ou ?last_event_id=). Requer o servidor ASGI.
+    """
+    user = await _stream_user(request)
+    if user is None or not user.is_active:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    notifications = Notification.objects.filter(user=user).select_related('user')
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        last_id = int(last_event_id)
+    except (TypeError, ValueError):
+        # Sem Last-Event-ID só são enviadas as notificações a partir de agora
+        last_id = (await _release_after(notifications.aggregate, Max('pk')))['pk__max'] or 0
+
+    def fetch(last_id):
+        return [
+            (notification.pk, json.dumps(NotificationSerializer(notification).data, cls=DjangoJSONEncoder))
+            for notification in notifications.filter(pk__gt=last_id).order_by('pk')[:100]
+        ]
+
+    async def events(last_id):
+        subscription = broker.subscribe(user.pk)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.NOTIFICATIONS_STREAM_TIMEOUT
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                for pk, data in await _release_after(fetch, last_id):
+                    yield f"id: {pk}\nevent: notification\ndata: {data}\n\n"
+                    last_id = pk
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    # O cliente volta a ligar com o Last-Event-ID
+                    break
+                if not await subscription.wait(min(settings.NOTIFICATIONS_STREAM_HEARTBEAT, remaining)):
+                    yield ": keepalive\n\n"
+        finally:
+            subscription.close()
+
+    return StreamingHttpResponse(
+        events(last_id),
+        content_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
@@ -0,0 +1,87 @@
+# payments/management/commands/backfill_revenue_rollups.py
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+
+from payments.models import Payment, SellerRevenueDaily
+from payments.rollups import add_revenue, aggregate_payments
+
+
+STAGING_TABLE = 'payments_sellerrevenuedaily_staging'
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstrói os rollups diários de receita a partir de todo o histórico de pagamentos. "
+        "O histórico é agregado numa tabela de staging sem bloquear os webhooks; só a troca "
+        "final (curta, limitada por --lock-timeout) os faz esperar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help="Pagamentos agregados por query.")
+        parser.add_argument('--lock-timeout', default='5s', help="Espera máxima pelos locks da troca final.")
+
+    def payment_boundary(self):
+        """
+        Maior pk de Payment com todas as inserções anteriores já commitadas:
+        o lock SHARE espera pelos webhooks a meio e impede novos durante a
+        leitura. Pagamentos com pk acima deste valor entram depois.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE {Payment._meta.db_table} IN SHARE MODE')
+        return Payment.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+    def stage(self, first_id, last_id, batch_size):
+        # Agrega (first_id, last_id] em lotes de pagamentos, cada um no seu próprio commit
+        groups = payments = 0
+        while first_id < last_id:
+            ids = list(
+                Payment.objects.filter(pk__gt=first_id, pk__lte=last_id).order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            groups += add_revenue(
+                aggregate_payments(Payment.objects.filter(pk__gte=ids[0], pk__lte=ids[-1])),
+                table=STAGING_TABLE,
+            )
+            payments += len(ids)
+            first_id = ids[-1]
+        return payments, groups
+
+    def handle(self, *args, **options):
+        table = SellerRevenueDaily._meta.db_table
+        columns = 'seller_id, product_id, day, count, gross_cents, fee_cents'
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {STAGING_TABLE}')
+            cursor.execute(f'CREATE TEMPORARY TABLE {STAGING_TABLE} AS SELECT {columns} FROM {table} WITH NO DATA')
+            cursor.execute(f'ALTER TABLE {STAGING_TABLE} ADD UNIQUE (seller_id, product_id, day)')
+        try:
+            with transaction.atomic():
+                boundary = self.payment_boundary()
+            payments, groups = self.stage(0, boundary, options['batch_size'])
+
+            # Troca: os pagamentos que chegaram entretanto entram no staging e
+            # o staging substitui os rollups. Os webhooks (que só esperam aqui)
+            # somam aos rollups novos depois do commit.
+            try:
+                with transaction.atomic():
+                    with connection.cursor() as cursor:
+                        cursor.execute('SET LOCAL lock_timeout = %s', [options['lock_timeout']])
+                    latest = self.payment_boundary()
+                    with connection.cursor() as cursor:
+                        cursor.execute(f'LOCK TABLE {table} IN EXCLUSIVE MODE')
+                    caught_up, caught_up_groups = self.stage(boundary, latest, options['batch_size'])
+                    with connection.cursor() as cursor:
+                        cursor.execute(f'DELETE FROM {table}')
+                        cursor.execute(f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {STAGING_TABLE}')
+            except OperationalError as e:
+                raise CommandError(f"Could not swap the revenue rollups ({e}). Nothing was changed; run it again.")
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP TABLE IF EXISTS {STAGING_TABLE}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Revenue rollups rebuilt from {payments + caught_up} payments "
+            f"({groups + caught_up_groups} rows merged, {caught_up} received during the rebuild)."
+        ))
@@ -22,3 +22,32 @@ class Payment(models.Model):
 
 
 
+
+
+class SellerRevenueDaily(models.Model):
+    """
+    Receita diária por vendedor e produto, mantida incrementalmente pelo
+    webhook do Stripe (payments.rollups) e reconstruída por
+    backfill_revenue_rollups. O dashboard de analytics só lê esta tabela.
+    """
+    seller = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='revenue_rollups')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='revenue_rollups')
+    day = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+    gross_cents = models.BigIntegerField(default=0)
+    fee_cents = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['seller', 'product', 'day'], name='unique_revenue_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['seller', 'day'], name='revenue_seller_day_idx'),
+        ]
+
+    @property
+    def net_cents(self):
+        return self.gross_cents - self.fee_cents
+
+    def __str__(self):
+        return f"{self.day} #{self.product_id}: {self.count} sales, {self.gross_cents} cents"
@@ -0,0 +1,73 @@
+# payments/rollups.py
+
+from itertools import islice
+
+from django.db import connection
+from django.db.models import Count, ExpressionWrapper, F, IntegerField, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import SellerRevenueDaily
+
+
+# Comissão da plataforma (application_fee_amount do checkout), em percentagem
+PLATFORM_FEE_PERCENT = 10
+
+
+def platform_fee_cents(amount_cents):
+    return amount_cents * PLATFORM_FEE_PERCENT // 100
+
+
+def add_revenue(rows, batch_size=1000, table=None):
+    """
+    Soma linhas (seller_id, product_id, day, count, gross_cents, fee_cents)
+    aos rollups com INSERT ... ON CONFLICT, atómico face a webhooks
+    concorrentes para o mesmo dia. `table` permite somar a uma tabela de
+    staging com a mesma chave. Devolve o número de linhas somadas.
+    """
+    table = table or SellerRevenueDaily._meta.db_table
+    rows = iter(rows)
+    total = 0
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return total
+        values = ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(batch))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (seller_id, product_id, day, count, gross_cents, fee_cents)
+                VALUES {values}
+                ON CONFLICT (seller_id, product_id, day) DO UPDATE SET
+                    count = {table}.count + EXCLUDED.count,
+                    gross_cents = {table}.gross_cents + EXCLUDED.gross_cents,
+                    fee_cents = {table}.fee_cents + EXCLUDED.fee_cents
+                """,
+                [value for row in batch for value in row],
+            )
+        total += len(batch)
+
+
+def record_payment(payment):
+    # Chamado pelo webhook, na mesma transação que cria o Payment
+    if not payment.succeeded or payment.product_id is None:
+        return 0
+    day = timezone.localdate(payment.succeeded_at or payment.created_at or timezone.now())
+    return add_revenue([(
+        payment.product.seller_id, payment.product_id, day,
+        1, payment.amount_cents, platform_fee_cents(payment.amount_cents),
+    )])
+
+
+def aggregate_payments(payments):
+    """
+    Agrega um queryset de Payment por (vendedor, produto, dia) no PostgreSQL.
+    """
+    fee = ExpressionWrapper(F('amount_cents') * PLATFORM_FEE_PERCENT / 100, output_field=IntegerField())
+    return (
+        payments.filter(succeeded=True, product__isnull=False)
+        .annotate(day=TruncDate(Coalesce('succeeded_at', 'created_at')))
+        .values_list('product__seller_id', 'product_id', 'day')
+        .annotate(count=Count('id'), gross=Sum('amount_cents'), fee=Sum(fee))
+        .order_by()
+    )
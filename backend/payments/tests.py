@@ -1,3 +1,84 @@
+# payments/tests.py
+
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from marketplace.models import Product
+from accounts.models import User
+from .models import Payment, SellerRevenueDaily
+from .rollups import record_payment
+
+
+def create_payment(product, amount_cents, succeeded_at=None, **extra):
+    return Payment.objects.create(
+        product=product,
+        stripe_payment_intent_id=f'pi_{Payment.objects.count()}_{product.pk}',
+        amount_cents=amount_cents,
+        succeeded=True,
+        succeeded_at=succeeded_at or timezone.now(),
+        **extra,
+    )
+
+
+class SellerRevenueRollupTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.seller = User.objects.create_user(email='seller@example.com', full_name='Seller')
+        self.other = User.objects.create_user(email='other@example.com', full_name='Other')
+        self.product = Product.objects.create(seller=self.seller, title='Bot', description='Bot', category='bot', language='python', price='10.00', published=True)
+        self.second = Product.objects.create(seller=self.seller, title='Script', description='Script', category='bot', language='python', price='5.00', published=True)
+        self.foreign = Product.objects.create(seller=self.other, title='Alheio', description='Alheio', category='bot', language='python', price='5.00', published=True)
+
+    def test_record_payment_accumulates_per_day(self):
+        for amount in (1000, 1500):
+            record_payment(create_payment(self.product, amount))
+
+        rollup = SellerRevenueDaily.objects.get(seller=self.seller, product=self.product)
+        self.assertEqual((rollup.count, rollup.gross_cents, rollup.fee_cents), (2, 2500, 250))
+        self.assertEqual(rollup.net_cents, 2250)
+        self.assertEqual(rollup.day, timezone.localdate())
+
+    def test_backfill_matches_incremental_rollups(self):
+        yesterday = timezone.now() - timedelta(days=1)
+        for product, amount, when in [
+            (self.product, 1000, yesterday), (self.product, 1000, None),
+            (self.second, 500, None), (self.foreign, 700, None),
+        ]:
+            record_payment(create_payment(product, amount, when))
+        Payment.objects.create(product=self.product, stripe_payment_intent_id='pi_failed', amount_cents=999)
+        incremental = set(SellerRevenueDaily.objects.values_list('seller', 'product', 'day', 'count', 'gross_cents', 'fee_cents'))
+
+        call_command('backfill_revenue_rollups', batch_size=2, stdout=StringIO())
+
+        rebuilt = set(SellerRevenueDaily.objects.values_list('seller', 'product', 'day', 'count', 'gross_cents', 'fee_cents'))
+        self.assertEqual(rebuilt, incremental)
+        self.assertEqual(len(rebuilt), 4)
+
+    def test_analytics_endpoints_are_scoped_to_seller(self):
+        yesterday = timezone.now() - timedelta(days=1)
+        record_payment(create_payment(self.product, 1000, yesterday))
+        record_payment(create_payment(self.product, 1000))
+        record_payment(create_payment(self.second, 3000))
+        record_payment(create_payment(self.foreign, 9000))
+        self.client.force_authenticate(self.seller)
+
+        response = self.client.get(reverse('revenue_time_series'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['gross_cents'] for row in response.data], [1000, 4000])
+        self.assertEqual(response.data[1]['net_cents'], 3600)
+
+        today = timezone.localdate().isoformat()
+        response = self.client.get(reverse('revenue_time_series'), {'since': today, 'product': self.product.pk})
+        self.assertEqual([(row['sales'], row['gross_cents']) for row in response.data], [(1, 1000)])
+
+        response = self.client.get(reverse('revenue_top_products'), {'limit': 1})
+        self.assertEqual([row['product_id'] for row in response.data], [self.second.pk])
 
-# Create your tests here.
+        response = self.client.get(reverse('revenue_time_series'), {'since': 'ontem'})
+        self.assertEqual(response.status_code, 400)
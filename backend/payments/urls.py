@@ -9,7 +9,9 @@ from .views import (
     StripeOnboardingRefreshView,
     StripeOnboardingReturnView,
     CreateCheckoutSessionView,
-    StripePublishableKeyView
+    StripePublishableKeyView,
+    RevenueTimeSeriesView,
+    TopProductsView,
 )
 
 urlpatterns = [
@@ -21,5 +23,7 @@ urlpatterns = [
     path('stripe/onboarding/refresh/', StripeOnboardingRefreshView.as_view(), name='stripe_onboarding_refresh'),
     path('stripe/onboarding/return/', StripeOnboardingReturnView.as_view(), name='stripe_onboarding_return'),
     path('stripe/publishable-key/', StripePublishableKeyView.as_view(), name='stripe_publishable_key'),
+    path('analytics/revenue/', RevenueTimeSeriesView.as_view(), name='revenue_time_series'),
+    path('analytics/top-products/', TopProductsView.as_view(), name='revenue_top_products'),
 ]
 
@@ -6,16 +6,26 @@ from rest_framework import status
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.generics import RetrieveAPIView
 from rest_framework.decorators import api_view
+from rest_framework.exceptions import ValidationError
 from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
+from django.db import transaction
+from django.db.models import Sum
 from django.http import HttpResponse
 from django.shortcuts import redirect
 import stripe
 import logging
+from datetime import timedelta
 
 from marketplace.models import Product, Order
-from payments.models import Payment
+from marketplace.pagination import CatalogPagination
+from marketplace.conditional import catalog_etag, conditional_response
+from marketplace.popularity import record_sale
+from marketplace.recommendations import record_co_purchase
+from payments.models import Payment, SellerRevenueDaily
+from marketplace.filters import date_range
+from .rollups import platform_fee_cents, record_payment
 from .serializers import ProductSerializer, PaymentSerializer
 
 logger = logging.getLogger(__name__)
@@ -27,18 +37,80 @@ class ProductListView(APIView):
     permission_classes = [AllowAny]
 
     def get(self, request):
-        products = Product.objects.filter(published=True)
-        serializer = ProductSerializer(products, many=True)
-        return Response(serializer.data)
+        return conditional_response(request, lambda: self.list(request), etag=catalog_etag(request))
+
+    def list(self, request):
+        products = Product.objects.published().select_related('seller')
+        paginator = CatalogPagination()
+        page = paginator.paginate_queryset(products, request, view=self)
+        serializer = ProductSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
 
 class ProductDetailView(RetrieveAPIView):
-    queryset = Product.objects.filter(published=True)
+    queryset = Product.objects.published().select_related('seller')
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
 
 
 
+# ------------------ Analytics ------------------
+
+class RevenueAnalyticsMixin:
+    permission_classes = [IsAuthenticated]
+    default_days = 30
+
+    def get_rollups(self, request):
+        """
+        Rollups do vendedor autenticado no intervalo ?since=/?until= (por
+        omissão os últimos 30 dias), opcionalmente de um só ?product=.
+        """
+        since, until = date_range(request.query_params)
+        since = since.date() if since else timezone.localdate() - timedelta(days=self.default_days - 1)
+        rollups = SellerRevenueDaily.objects.filter(seller=request.user, day__gte=since)
+        if until:
+            rollups = rollups.filter(day__lt=until.date())
+        product = request.query_params.get('product')
+        if product:
+            if not product.isdigit():
+                raise ValidationError({'product': "Invalid product id."})
+            rollups = rollups.filter(product_id=product)
+        return rollups
+
+    def totals(self, rollups):
+        return rollups.annotate(
+            sales=Sum('count'), gross_cents=Sum('gross_cents'), fee_cents=Sum('fee_cents'),
+        )
+
+    def with_net(self, rows):
+        return [{**row, 'net_cents': row['gross_cents'] - row['fee_cents']} for row in rows]
+
+
+class RevenueTimeSeriesView(RevenueAnalyticsMixin, APIView):
+    def get(self, request):
+        # Uma linha por dia, agregada a partir dos rollups (revenue_seller_day_idx)
+        rows = self.totals(self.get_rollups(request).values('day')).order_by('day')
+        return Response(self.with_net(rows))
+
+
+class TopProductsView(RevenueAnalyticsMixin, APIView):
+    def get(self, request):
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 10)), 50))
+        except ValueError:
+            raise ValidationError({'limit': "Invalid limit."})
+        rows = (
+            self.totals(self.get_rollups(request).values('product_id', 'product__title'))
+            .order_by('-gross_cents', 'product_id')[:limit]
+        )
+        return Response(self.with_net(
+            {'product_id': row['product_id'], 'title': row['product__title'], 'sales': row['sales'],
+             'gross_cents': row['gross_cents'], 'fee_cents': row['fee_cents']}
+            for row in rows
+        ))
+
+
+
 # ------------------ Stripe Checkout ------------------
 
 class CreateCheckoutSessionView(APIView):
@@ -86,7 +158,7 @@ class CreateCheckoutSessionView(APIView):
                 }],
                 customer=customer_id,
                 payment_intent_data={
-                    'application_fee_amount': int(price_cents * 0.10),
+                    'application_fee_amount': platform_fee_cents(price_cents),
                     'transfer_data': {
                         'destination': product.seller.stripe_account_id,
                     },
@@ -162,23 +234,28 @@ def stripe_webhook(request):
                 logger.info(f"Payment with intent {payment_intent} already exists. Skipping.")
                 return HttpResponse(status=200)
 
-            # Create Payment
-            Payment.objects.create(
-                user_id=actual_user_id, 
-                product=product,
-                stripe_payment_intent_id=payment_intent,
-                amount_cents=int(float(product.price) * 100), 
-                succeeded=True,
-                succeeded_at=timezone.now(),
-            )
-
-            # Create Order
-            Order.objects.create(
-                product=product,
-                buyer_id=actual_user_id, 
-                payment_status='succeeded',
-                payment_reference=payment_intent,
-            )
+            with transaction.atomic():
+                # Create Payment
+                payment = Payment.objects.create(
+                    user_id=actual_user_id, 
+                    product=product,
+                    stripe_payment_intent_id=payment_intent,
+                    amount_cents=int(float(product.price) * 100), 
+                    succeeded=True,
+                    succeeded_at=timezone.now(),
+                )
+                # Rollup diário do vendedor, na mesma transação que o pagamento
+                record_payment(payment)
+
+                # Create Order
+                Order.objects.create(
+                    product=product,
+                    buyer_id=actual_user_id, 
+                    payment_status='succeeded',
+                    stripe_payment_intent=payment_intent,
+                )
+                record_sale(product.id)
+                record_co_purchase(actual_user_id, product.id)
 
             logger.info(f"Webhook: Payment and Order created for user {user_id_from_metadata}, product {product_id}.")
 
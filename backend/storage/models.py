@@ -4,6 +4,7 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from marketplace.models import Product  
+from marketplace.cache import bump_catalog_version
 
 User = get_user_model()
 
@@ -21,4 +22,16 @@ class ProjectFile(models.Model):
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Os ficheiros aparecem no payload público do produto
+        Product.objects.filter(pk=self.product_id).touch()
+        bump_catalog_version()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        Product.objects.filter(pk=self.product_id).touch()
+        bump_catalog_version()
+        return result
+
 
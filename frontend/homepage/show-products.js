@@ -5,7 +5,7 @@
 async function initProductRender() {
     console.log("Initializing product render...");
 
-    const products = await fetchSellerProducts();
+    const { products, next } = await fetchSellerProducts();
 
     const cardResponse = await fetch('../components/card.html');
     const cardHTML = await cardResponse.text();
@@ -20,12 +20,37 @@ async function initProductRender() {
     for (const product of products) {
         renderProductCard(gridContainer, cardHTML, product);
     }
+    renderLoadMore(gridContainer, cardHTML, next);
 }
 
-// Fetch products 
-export async function fetchSellerProducts() { 
+// The catalog is paginated by cursor: "Load more" fetches the page in `next`
+function renderLoadMore(gridContainer, cardHTML, next) {
+    let button = document.querySelector('.load-more');
+    if (!next) {
+        if (button) button.remove();
+        return;
+    }
+    if (!button) {
+        button = document.createElement('button');
+        button.className = 'load-more';
+        button.textContent = 'Load more';
+        gridContainer.after(button);
+    }
+    button.disabled = false;
+    button.onclick = async () => {
+        button.disabled = true;
+        const page = await fetchSellerProducts(next);
+        for (const product of page.products) {
+            renderProductCard(gridContainer, cardHTML, product);
+        }
+        renderLoadMore(gridContainer, cardHTML, page.next);
+    };
+}
+
+// Fetch one page of products: { products, next } (next is the URL of the following page or null)
+export async function fetchSellerProducts(url = `http://localhost:8000/api/marketplace/public/products/`) { 
     try {
-        const response = await fetch(`http://localhost:8000/api/marketplace/public/products/`, {
+        const response = await fetch(url, {
             method: 'GET', 
             headers: { 
                 "Accept": "application/json" 
@@ -34,7 +59,7 @@ export async function fetchSellerProducts() {
 
         if (response.status === 404) {
             console.warn("No products found for this user.");
-            return [];
+            return { products: [], next: null };
         }
 
         if (!response.ok) {
@@ -44,11 +69,12 @@ export async function fetchSellerProducts() {
         }
 
         const products = await response.json();
-        return Array.isArray(products) ? products : (products ? [products] : []);
+        if (products && Array.isArray(products.results)) return { products: products.results, next: products.next || null };
+        return { products: Array.isArray(products) ? products : (products ? [products] : []), next: null };
 
     } catch (error) {
         console.error("Error fetching products:", error);
-        return [];
+        return { products: [], next: null };
     }
 }
 
@@ -62,7 +88,9 @@ export function renderProductCard(gridContainer, cardHTML, product) {
     // Image 
     const img = cardWrapper.querySelector('.preview img');
     if (img) {
-        const primaryMedia = Array.isArray(product.media)
+        const primaryMedia = product.image_url
+            ? { url: product.image_url }
+            : Array.isArray(product.media)
             ? product.media.find(m => m.is_primary === true) || product.media.find(m => m.type === 'image')
             : null;
 
@@ -89,7 +117,7 @@ export function renderProductCard(gridContainer, cardHTML, product) {
     const heading = cardWrapper.querySelector('.details .heading');
     if (heading) heading.textContent = product.title || 'Untitled';
     const description = cardWrapper.querySelector('.details .description');
-    if (description) description.textContent = product.description || 'No description';
+    if (description) description.textContent = product.summary || product.description || 'No description';
     const tech = cardWrapper.querySelector('.details .tech');
     if (tech) {
         if (typeof product.category === 'string') {
@@ -136,28 +136,40 @@ initProductRender();
 
 
 export async function fetchSellerProducts(sellerId) { 
+    // A lista é paginada por cursor: o painel do vendedor precisa de todos os produtos, segue o `next` até ao fim
+    const products = [];
+    let url = `http://localhost:8000/api/marketplace/products/?seller_id=${sellerId}`;
     try {
-        const response = await authFetch(`http://localhost:8000/api/marketplace/products/?seller_id=${sellerId}`, {
-            headers: { "Accept": "application/json" }
-        });
-
-        if (response.status === 404) {
-            console.warn("No products found for this user.");
-            return [];
-        }
+        while (url) {
+            const response = await authFetch(url, {
+                headers: { "Accept": "application/json" }
+            });
 
-        if (!response.ok) {
-            const errorData = await response.json().catch(() => ({}));
-            console.error(`Erro ${response.status} ao buscar produtos:`, errorData);
-            throw new Error(`Erro ao buscar produtos: ${errorData.detail || response.statusText}`);
+            if (response.status === 404) {
+                console.warn("No products found for this user.");
+                return products;
+            }
+
+            if (!response.ok) {
+                const errorData = await response.json().catch(() => ({}));
+                console.error(`Erro ${response.status} ao buscar produtos:`, errorData);
+                throw new Error(`Erro ao buscar produtos: ${errorData.detail || response.statusText}`);
+            }
+
+            const page = await response.json();
+            if (page && Array.isArray(page.results)) {
+                products.push(...page.results);
+                url = page.next || null;
+            } else {
+                products.push(...(Array.isArray(page) ? page : (page ? [page] : [])));
+                url = null;
+            }
         }
-
-        const products = await response.json();
-        return Array.isArray(products) ? products : (products ? [products] : []);
+        return products;
 
     } catch (error) {
         console.error("Erro ao buscar produtos:", error);
-        return [];
+        return products;
     }
 }
 
@@ -189,7 +201,9 @@ if (mainButton) {
     // Imagem 
     const img = cardWrapper.querySelector('.preview img');
     if (img) {
-        const primaryMedia = Array.isArray(product.media)
+        const primaryMedia = product.image_url
+            ? { url: product.image_url }
+            : Array.isArray(product.media)
             ? product.media.find(m => m.is_primary === true) || product.media.find(m => m.type === 'image')
             : null;
 
@@ -209,7 +223,7 @@ if (mainButton) {
     const heading = cardWrapper.querySelector('.details .heading');
     if (heading) heading.textContent = product.title || 'Untitled';
     const description = cardWrapper.querySelector('.details .description');
-    if (description) description.textContent = product.description || 'No description';
+    if (description) description.textContent = product.summary || product.description || 'No description';
     const tech = cardWrapper.querySelector('.details .tech');
     if (tech) {
         if (typeof product.category === 'string') {
@@ -88,7 +88,7 @@ async function initProductRender() {
         return;
     }
 
-    const products = await fetchSellerProducts(userId);
+    const { products, next } = await fetchSellerProducts(userId);
 
 
     const topProducts = products.slice(0, 5);
@@ -106,6 +106,15 @@ async function initProductRender() {
     for (const product of topProducts) {
         renderProductCard(gridContainer, cardHTML, product);
     }
+
+    // Só mostra os 5 primeiros: se houver mais, liga para a lista completa
+    if (next && !document.querySelector('.view-all-products')) {
+        const viewAll = document.createElement('a');
+        viewAll.className = 'view-all-products';
+        viewAll.href = '../my_products/index.html';
+        viewAll.textContent = 'View all products';
+        gridContainer.after(viewAll);
+    }
 }
 
 
@@ -114,15 +123,16 @@ initProductRender();
 
 
 // produtos 
+// Primeira página dos produtos do utilizador: { products, next }
 export async function fetchSellerProducts(sellerId) {
     try {
-        const response = await authFetch(`http://localhost:8000/api/marketplace/products/?seller_id=${sellerId}`, {
+        const response = await authFetch(`http://localhost:8000/api/marketplace/products/?seller_id=${sellerId}&page_size=5`, {
             headers: { "Accept": "application/json" }
         });
 
         if (response.status === 404) {
             console.warn("No products found for this user.");
-            return [];
+            return { products: [], next: null };
         }
 
         if (!response.ok) {
@@ -132,11 +142,12 @@ export async function fetchSellerProducts(sellerId) {
         }
 
         const products = await response.json();
-        return Array.isArray(products) ? products : (products ? [products] : []);
+        if (products && Array.isArray(products.results)) return { products: products.results, next: products.next || null };
+        return { products: Array.isArray(products) ? products : (products ? [products] : []), next: null };
 
     } catch (error) {
         console.error("Erro ao buscar produtos:", error);
-        return [];
+        return { products: [], next: null };
     }
 }
 
@@ -153,7 +164,9 @@ export function renderProductCard(gridContainer, cardHTML, product) {
     // Imagem 
     const img = cardWrapper.querySelector('.preview img');
     if (img) {
-        const primaryMedia = Array.isArray(product.media)
+        const primaryMedia = product.image_url
+            ? { url: product.image_url }
+            : Array.isArray(product.media)
             ? product.media.find(m => m.is_primary === true) || product.media.find(m => m.type === 'image')
             : null;
 
@@ -181,7 +194,7 @@ export function renderProductCard(gridContainer, cardHTML, product) {
     const heading = cardWrapper.querySelector('.details .heading');
     if (heading) heading.textContent = product.title || 'Untitled';
     const description = cardWrapper.querySelector('.details .description');
-    if (description) description.textContent = product.description || 'No description';
+    if (description) description.textContent = product.summary || product.description || 'No description';
     const tech = cardWrapper.querySelector('.details .tech');
     if (tech) {
         if (typeof product.category === 'string') {
@@ -31,7 +31,7 @@ initProductRender();
 // produtos
 export async function fetchSellerProducts() { 
     try {
-        const response = await authFetch(`http://localhost:8000/api/marketplace/public/products/`, {
+        const response = await authFetch(`http://localhost:8000/api/marketplace/public/products/?page_size=5`, {
             headers: { "Accept": "application/json" }
         });
 
@@ -47,6 +47,7 @@ export async function fetchSellerProducts() {
         }
 
         const products = await response.json();
+        if (products && Array.isArray(products.results)) return products.results;
         return Array.isArray(products) ? products : (products ? [products] : []);
 
     } catch (error) {
@@ -68,7 +69,9 @@ export function renderProductCard(gridContainer, cardHTML, product) {
     // Imagem 
     const img = cardWrapper.querySelector('.preview img');
     if (img) {
-        const primaryMedia = Array.isArray(product.media)
+        const primaryMedia = product.image_url
+            ? { url: product.image_url }
+            : Array.isArray(product.media)
             ? product.media.find(m => m.is_primary === true) || product.media.find(m => m.type === 'image')
             : null;
 
@@ -96,7 +99,7 @@ export function renderProductCard(gridContainer, cardHTML, product) {
     const heading = cardWrapper.querySelector('.details .heading');
     if (heading) heading.textContent = product.title || 'Untitled';
     const description = cardWrapper.querySelector('.details .description');
-    if (description) description.textContent = product.description || 'No description';
+    if (description) description.textContent = product.summary || product.description || 'No description';
     const tech = cardWrapper.querySelector('.details .tech');
     if (tech) {
         if (typeof product.category === 'string') {